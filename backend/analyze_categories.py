@@ -1,32 +1,9 @@
 """Script to analyze products and improve categorization"""
-from database import get_db
-
-# Current category keywords (to identify what's missing)
-category_keywords = {
-    'Electronics': ['battery', 'charger', 'headphone', 'earbud', 'cable', 'wireless', 'led', 'display', 'screen'],
-    'Clothing': ['shirt', 'jacket', 'hoodie', 'pants', 'dress', 'shoes', 'socks', 'clothing', 'apparel'],
-    'Home & Kitchen': ['kitchen', 'cabinet', 'organizer', 'storage', 'container', 'home', 'household'],
-    'Books & Media': ['book', 'dvd', 'cd', 'movie', 'music'],
-    'Beauty & Personal Care': ['makeup', 'cosmetic', 'beauty', 'skincare', 'shampoo', 'soap'],
-    'Sports & Outdoors': ['sport', 'outdoor', 'camping', 'hiking', 'tent', 'backpack'],
-    'Toys & Games': ['toy', 'game', 'lego', 'puzzle', 'board game'],
-    'Health & Wellness': ['vitamin', 'supplement', 'health', 'wellness', 'fitness', 'electrolyte']
-}
-
-def categorize_product(product_name, categories):
-    """Categorize a product based on keywords"""
-    if not product_name:
-        return None
-    
-    product_lower = product_name.lower()
-    
-    for category, keywords in categories.items():
-        if any(keyword in product_lower for keyword in keywords):
-            return category
-    return None
+from categories import classify_retail_many, RETAIL_OTHER
+from database import get_read_db
 
 # Get sample products that aren't categorized
-with get_db() as conn:
+with get_read_db() as conn:
     cursor = conn.cursor()
     
     # Get products by spending
@@ -48,18 +25,18 @@ with get_db() as conn:
     print("Top 100 products by spending:\n")
     uncategorized = []
     
-    for row in cursor.fetchall():
+    rows = cursor.fetchall()
+    categories = classify_retail_many([row['product_name'] for row in rows])
+    for row, category in zip(rows, categories):
         product_name = row['product_name']
         spending = row['spending']
         count = row['count']
         
-        category = categorize_product(product_name, category_keywords)
-        
-        if category:
+        if category != RETAIL_OTHER:
             print(f"✓ [{category:20s}] ${spending:8.2f} ({count:3d}x) {product_name[:80]}")
         else:
             uncategorized.append((product_name, spending, count))
-            print(f"✗ [{'Other':20s}] ${spending:8.2f} ({count:3d}x) {product_name[:80]}")
+            print(f"✗ [{RETAIL_OTHER:20s}] ${spending:8.2f} ({count:3d}x) {product_name[:80]}")
     
     print(f"\n\nUncategorized products (top 50 by spending):")
     print("=" * 100)
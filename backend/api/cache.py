@@ -0,0 +1,82 @@
+"""LRU cache of API responses, invalidated whenever the importer bumps the data generation"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+from database import get_data_generation
+from .wire import negotiate_encoding, encode_body
+
+MAX_ENTRIES = 256
+
+class ResponseCache:
+    """Bounded LRU map of (generation, path, query args) -> (body, mimetype, etag, compressed bodies)"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            generation = key[0]
+            if generation != self.generation:
+                # Every entry from an older import is stale
+                self.entries.clear()
+                self.generation = generation
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+response_cache = ResponseCache()
+
+def cached(view):
+    """Serve a GET view from the response cache, compressed, answering If-None-Match with 304"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (get_data_generation(), request.path, tuple(sorted(request.args.items(multi=True))))
+        entry = response_cache.get(key)
+        if entry is None:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            entry = (body, response.mimetype, hashlib.sha256(body).hexdigest(), {})
+            response_cache.put(key, entry)
+        body, mimetype, etag, compressed = entry
+
+        # Each content coding is compressed once per entry and gets its own
+        # strong ETag, since the bytes differ
+        encoding = negotiate_encoding(len(body))
+        if encoding:
+            if encoding not in compressed:
+                compressed[encoding] = encode_body(body, encoding)
+            body = compressed[encoding]
+            etag = f'{etag}-{encoding}'
+
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(body, mimetype=mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        # Let browsers keep the body but revalidate it on every load
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
@@ -0,0 +1,45 @@
+"""Streamed CSV and NDJSON bodies for the order exports"""
+import csv
+import io
+import json
+
+from flask import Response
+
+# Rows serialized into each chunk of the response body
+EXPORT_CHUNK_ROWS = 1000
+
+def csv_chunks(rows, fields):
+    """CSV text for an iterable of dicts: the header, then EXPORT_CHUNK_ROWS rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def ndjson_chunks(rows, fields):
+    """Newline-delimited JSON for an iterable of dicts, EXPORT_CHUNK_ROWS lines per chunk"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({field: row[field] for field in fields}))
+        if len(lines) == EXPORT_CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', csv_chunks),
+    'ndjson': ('application/x-ndjson', ndjson_chunks),
+}
+
+def export_response(rows, fields, name, export_format):
+    """Response streaming rows as an attachment; without a Content-Length it goes out chunked"""
+    mimetype, chunks = EXPORT_FORMATS[export_format]
+    response = Response(chunks(rows, fields), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{export_format}'
+    return response
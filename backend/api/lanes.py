@@ -0,0 +1,16 @@
+"""Serving lanes: views marked slow get their own thread pool under the ASGI server"""
+from werkzeug.exceptions import HTTPException
+
+def slow_lane(view):
+    """Mark a view whose queries can run long enough to hold up cheap requests"""
+    view.slow_lane = True
+    return view
+
+def is_slow(app, path, method):
+    """Whether the view that would serve a request is marked slow"""
+    try:
+        endpoint, _ = app.url_map.bind('').match(path, method)
+    except HTTPException:
+        # 404s, 405s and redirects are cheap
+        return False
+    return getattr(app.view_functions.get(endpoint), 'slow_lane', False)
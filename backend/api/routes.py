@@ -1,51 +1,118 @@
-from flask import jsonify, request
+from flask import g, jsonify, request
 from . import api_bp
 import sys
 import os
+import time
 # Add parent directory to path to import data_processor
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if backend_dir not in sys.path:
     sys.path.insert(0, backend_dir)
-from data_processor import DataProcessor
+from data_processor import DataProcessor, RETAIL_ORDER_FIELDS, DIGITAL_ORDER_FIELDS
+from columnar import ColumnarProcessor
+from profiling import profiler
+from .cache import cached
+from .lanes import slow_lane
+from .export import EXPORT_FORMATS, export_response
+from .wire import shaped
 
-processor = DataProcessor()
+# Aggregation engine, chosen with AMAZON_DATA_ENGINE: 'sql' queries SQLite on
+# every request, 'columnar' answers from NumPy arrays loaded once per import
+ENGINES = {'sql': DataProcessor, 'columnar': ColumnarProcessor}
+engine = os.environ.get('AMAZON_DATA_ENGINE', 'sql')
+if engine not in ENGINES:
+    raise ValueError(f"AMAZON_DATA_ENGINE must be one of {', '.join(ENGINES)}, not {engine!r}")
+processor = ENGINES[engine]()
+
+@api_bp.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@api_bp.after_request
+def record_route_time(response):
+    """Record the wall time of the request's route; a streamed body is still being produced here"""
+    start = g.pop('request_start', None)
+    if start is not None and request.url_rule is not None:
+        profiler.observe_route(request.url_rule.rule, (time.perf_counter() - start) * 1000)
+    return response
 
 @api_bp.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'ok'})
 
 @api_bp.route('/stats/summary', methods=['GET'])
+@cached
 def get_summary():
     """Get overall statistics summary"""
-    return jsonify(processor.get_summary())
+    return jsonify(shaped(processor.get_summary()))
 
 @api_bp.route('/stats/spending-over-time', methods=['GET'])
+@cached
 def get_spending_over_time():
-    """Get spending over time (monthly/yearly)"""
-    period = request.args.get('period', 'monthly')  # monthly or yearly
-    return jsonify(processor.get_spending_over_time(period))
+    """Get spending over time at any granularity, optionally between two dates"""
+    period = request.args.get('period', 'monthly')  # daily, weekly, monthly, quarterly or yearly
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    try:
+        return jsonify(shaped(processor.get_spending_over_time(period, start_date=start_date, end_date=end_date)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api_bp.route('/stats/spending-trends', methods=['GET'])
+@cached
+def get_spending_trends():
+    """Get monthly spending with running total, rolling averages and year-over-year change"""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    try:
+        return jsonify(shaped(processor.get_spending_trends(start_date=start_date, end_date=end_date)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api_bp.route('/stats/dashboard', methods=['GET'])
+@slow_lane
+@cached
+def get_dashboard():
+    """Get every dashboard payload in one response"""
+    period = request.args.get('period', 'monthly')  # spending over time: monthly or yearly
+    return jsonify(shaped(processor.get_dashboard(period)))
+
+@api_bp.route('/stats/top-products', methods=['GET'])
+@cached
+def get_top_products():
+    """Get top retail products"""
+    limit = int(request.args.get('limit', 20))
+    by = request.args.get('by', 'spending')  # quantity or spending
+    return jsonify(shaped(processor.get_top_products(limit, by)))
 
 @api_bp.route('/stats/returns', methods=['GET'])
+@cached
 def get_returns():
     """Get return statistics"""
-    return jsonify(processor.get_return_stats())
+    return jsonify(shaped(processor.get_return_stats()))
 
 @api_bp.route('/stats/digital-vs-retail', methods=['GET'])
+@cached
 def get_digital_vs_retail():
     """Compare digital vs retail orders"""
-    return jsonify(processor.get_digital_vs_retail())
+    return jsonify(shaped(processor.get_digital_vs_retail()))
 
 @api_bp.route('/stats/retail-breakdown', methods=['GET'])
+@slow_lane
+@cached
 def get_retail_breakdown():
     """Get retail-specific breakdowns"""
-    return jsonify(processor.get_retail_breakdown())
+    return jsonify(shaped(processor.get_retail_breakdown()))
 
 @api_bp.route('/stats/digital-breakdown', methods=['GET'])
+@slow_lane
+@cached
 def get_digital_breakdown():
     """Get digital-specific breakdowns"""
-    return jsonify(processor.get_digital_breakdown())
+    return jsonify(shaped(processor.get_digital_breakdown()))
 
 @api_bp.route('/orders/by-category', methods=['GET'])
+@slow_lane
+@cached
 def get_orders_by_category():
     """Get retail orders filtered by category with optional price and date filters"""
     category = request.args.get('category', '')
@@ -57,12 +124,19 @@ def get_orders_by_category():
     limit = int(request.args.get('limit', 100))
     sort_by = request.args.get('sort_by', 'order_date')
     sort_order = request.args.get('sort_order', 'desc')
+    # Continuation token from the previous page's nextCursor
+    page_token = request.args.get('cursor')
     
-    return jsonify(processor.get_orders_by_category(
-        category, min_price, max_price, start_date, end_date, page, limit, sort_by, sort_order
-    ))
+    try:
+        return jsonify(processor.get_orders_by_category(
+            category, min_price, max_price, start_date, end_date, page, limit, sort_by, sort_order, page_token
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 @api_bp.route('/digital-orders/by-category', methods=['GET'])
+@slow_lane
+@cached
 def get_digital_orders_by_category():
     """Get digital orders filtered by category with optional price and date filters"""
     category = request.args.get('category', '')
@@ -74,7 +148,84 @@ def get_digital_orders_by_category():
     limit = int(request.args.get('limit', 100))
     sort_by = request.args.get('sort_by', 'order_date')
     sort_order = request.args.get('sort_order', 'desc')
+    # Continuation token from the previous page's nextCursor
+    page_token = request.args.get('cursor')
     
-    return jsonify(processor.get_digital_orders_by_category(
-        category, min_price, max_price, start_date, end_date, page, limit, sort_by, sort_order
-    ))
+    try:
+        return jsonify(processor.get_digital_orders_by_category(
+            category, min_price, max_price, start_date, end_date, page, limit, sort_by, sort_order, page_token
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+def export_filter_args():
+    """Filter and sort arguments of an order export, the same as the category drill-downs take"""
+    return {
+        'category': request.args.get('category', ''),
+        'min_price': request.args.get('min_price', type=float),
+        'max_price': request.args.get('max_price', type=float),
+        'start_date': request.args.get('start_date'),
+        'end_date': request.args.get('end_date'),
+        'sort_by': request.args.get('sort_by', 'order_date'),
+        'sort_order': request.args.get('sort_order', 'desc'),
+    }
+
+def export_format_error(export_format):
+    """400 response for an unknown export format, or None"""
+    if export_format in EXPORT_FORMATS:
+        return None
+    return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+@api_bp.route('/orders/export', methods=['GET'])
+@slow_lane
+def export_orders():
+    """Stream every retail order matching the drill-down filters as CSV or NDJSON"""
+    export_format = request.args.get('format', 'csv')  # csv or ndjson
+    error = export_format_error(export_format)
+    if error:
+        return error
+    rows = processor.export_orders(**export_filter_args())
+    return export_response(rows, RETAIL_ORDER_FIELDS, 'orders', export_format)
+
+@api_bp.route('/digital-orders/export', methods=['GET'])
+@slow_lane
+def export_digital_orders():
+    """Stream every digital order matching the drill-down filters as CSV or NDJSON"""
+    export_format = request.args.get('format', 'csv')  # csv or ndjson
+    error = export_format_error(export_format)
+    if error:
+        return error
+    rows = processor.export_digital_orders(**export_filter_args())
+    return export_response(rows, DIGITAL_ORDER_FIELDS, 'digital-orders', export_format)
+
+@api_bp.route('/orders/search', methods=['GET'])
+@slow_lane
+@cached
+def search_orders():
+    """Search retail and digital orders by product name, with the same filters as the category drill-downs"""
+    text = request.args.get('q', '')
+    channel = request.args.get('channel', 'all')  # all, retail or digital
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    page = int(request.args.get('page', 1))
+    limit = int(request.args.get('limit', 100))
+    sort_by = request.args.get('sort_by', 'relevance')
+    sort_order = request.args.get('sort_order', 'desc')
+    page_token = request.args.get('cursor')
+    
+    try:
+        return jsonify(processor.search_orders(
+            text, channel, min_price, max_price, start_date, end_date, page, limit, sort_by, sort_order, page_token
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api_bp.route('/debug/metrics', methods=['GET', 'DELETE'])
+def debug_metrics():
+    """Get latency and row histograms per route and SQL statement; DELETE resets them"""
+    if request.method == 'DELETE':
+        profiler.reset()
+        return jsonify({'status': 'reset'})
+    return jsonify(profiler.snapshot())
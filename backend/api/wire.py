@@ -0,0 +1,86 @@
+"""Wire format of the API: JSON encoding, response compression and the columnar payload shape"""
+import gzip
+import time
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from profiling import profiler
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content codings in order of preference. Bodies are compressed once per
+# cache entry, so brotli can afford a better level than a per-request encoder.
+ENCODERS = {'gzip': lambda body: gzip.compress(body, compresslevel=6, mtime=0)}
+if brotli is not None:
+    ENCODERS = {'br': lambda body: brotli.compress(body, quality=6), **ENCODERS}
+
+# Bodies smaller than this go out uncompressed
+MIN_COMPRESS_SIZE = 512
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, encoding with orjson when it is installed.
+
+    Keys stay sorted as with the default provider, so a body and its ETag
+    only change when the data does. Calls with json.dumps keyword
+    arguments fall back to the standard library.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_SORT_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        start = time.perf_counter()
+        if orjson is None:
+            response = super().response(*args, **kwargs)
+        else:
+            obj = self._prepare_response_obj(args, kwargs)
+            body = orjson.dumps(obj, default=self.default, option=orjson.OPT_SORT_KEYS)
+            response = self._app.response_class(body, mimetype=self.mimetype)
+        if has_request_context() and request.url_rule is not None:
+            profiler.observe_serialization(request.url_rule.rule, (time.perf_counter() - start) * 1000)
+        return response
+
+def negotiate_encoding(size):
+    """The preferred content coding the current request accepts for a body of this size, or None"""
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    for encoding in ENCODERS:
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+def encode_body(body, encoding):
+    """body compressed with a content coding from ENCODERS"""
+    return ENCODERS[encoding](body)
+
+def columnar(payload):
+    """payload with every list of records turned into one array per field, and floats rounded to cents"""
+    if isinstance(payload, dict):
+        return {key: columnar(value) for key, value in payload.items()}
+    if isinstance(payload, list):
+        if payload and all(isinstance(item, dict) for item in payload):
+            return {key: columnar([item.get(key) for item in payload]) for key in payload[0]}
+        return [columnar(item) if isinstance(item, (dict, list)) else
+                round(item, 2) if isinstance(item, float) else item for item in payload]
+    return round(payload, 2) if isinstance(payload, float) else payload
+
+def shaped(payload):
+    """payload in the shape the request asked for: ?shape=columnar, or the default list of records"""
+    if request.args.get('shape') == 'columnar':
+        return columnar(payload)
+    return payload
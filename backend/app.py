@@ -2,8 +2,10 @@ from flask import Flask, jsonify, send_from_directory
 from flask_cors import CORS
 import os
 from api import api_bp
+from api.wire import FastJSONProvider
 
 app = Flask(__name__, static_folder='../frontend/build', static_url_path='')
+app.json = FastJSONProvider(app)
 CORS(app)
 
 app.register_blueprint(api_bp, url_prefix='/api')
@@ -25,7 +27,12 @@ if __name__ == '__main__':
         print(f"  - Local: http://localhost:5001")
         print(f"  - Network: http://192.168.86.41:5001 (or your machine's IP)")
         print("\nStarting server...\n")
-        app.run(debug=True, port=5001, host='0.0.0.0')
+        if '--asgi' in sys.argv:
+            # Async serving mode: uvicorn with bounded thread pools (see asgi.py)
+            import uvicorn
+            uvicorn.run('asgi:app', port=5001, host='0.0.0.0')
+        else:
+            app.run(debug=True, port=5001, host='0.0.0.0')
     except OSError as e:
         if 'Address already in use' in str(e) or e.errno == 48:
             print(f"\n❌ ERROR: Port 5001 is already in use!")
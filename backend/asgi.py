@@ -0,0 +1,26 @@
+"""ASGI entry point: `uvicorn asgi:app` (or `python app.py --asgi`) from the backend directory.
+
+The Flask app runs on two bounded thread pools. Views marked with
+slow_lane (the breakdowns, the dashboard, drill-downs and search) queue
+for their own few workers, so a burst of dashboard loads cannot take the
+threads that health checks and the rollup-backed endpoints need.
+"""
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from app import app as flask_app
+from api.lanes import is_slow
+
+FAST_WORKERS = 8
+# At most half the cores run slow queries, leaving the rest for the fast lane
+SLOW_WORKERS = max(2, (os.cpu_count() or 2) // 2)
+
+fast_lane = WSGIMiddleware(flask_app, workers=FAST_WORKERS)
+slow_lane = WSGIMiddleware(flask_app, workers=SLOW_WORKERS)
+
+async def app(scope, receive, send):
+    if scope['type'] == 'http' and is_slow(flask_app, scope['path'], scope['method']):
+        await slow_lane(scope, receive, send)
+    else:
+        await fast_lane(scope, receive, send)
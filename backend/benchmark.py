@@ -0,0 +1,349 @@
+"""Benchmark suite: times the importer, every DataProcessor method and the API routes on synthetic exports.
+
+    python benchmark.py --scale 100k --output before.json
+    python benchmark.py --scale 100k --output after.json --compare before.json
+
+Results are written as JSON so runs can be compared; --compare exits
+non-zero when a benchmark's median got slower than the threshold allows.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import database
+from database import init_database, close_read_connections
+from generate_data import SCALES, generate_exports, parse_rows
+import import_data
+from import_data import DATASETS
+
+# The row-at-a-time importer is only timed up to this many retail rows
+ROW_IMPORT_LIMIT = 100_000
+# A median must grow by more than this many milliseconds, as well as by the
+# threshold, to count as a regression, so timer noise on fast calls is ignored
+MIN_REGRESSION_MS = 1.0
+DEFAULT_THRESHOLD = 0.20
+
+# (benchmark name, DataProcessor method, keyword arguments)
+AGGREGATE_CALLS = [
+    ('get_summary', 'get_summary', {}),
+    ('get_spending_over_time[monthly]', 'get_spending_over_time', {'period': 'monthly'}),
+    ('get_spending_over_time[yearly]', 'get_spending_over_time', {'period': 'yearly'}),
+    ('get_spending_over_time[weekly, 2 years]', 'get_spending_over_time',
+     {'period': 'weekly', 'start_date': '2019-01-01', 'end_date': '2020-12-31'}),
+    ('get_spending_trends', 'get_spending_trends', {}),
+    ('get_return_stats', 'get_return_stats', {}),
+    ('get_digital_vs_retail', 'get_digital_vs_retail', {}),
+    ('get_retail_breakdown', 'get_retail_breakdown', {}),
+    ('get_top_products[quantity]', 'get_top_products', {'by': 'quantity'}),
+    ('get_digital_breakdown', 'get_digital_breakdown', {}),
+    ('get_dashboard', 'get_dashboard', {}),
+]
+# Drill-downs, exports and search always run in SQLite, so they are timed on the SQL engine only
+ORDER_CALLS = [
+    ('get_orders_by_category', 'get_orders_by_category', {'category': 'Electronics'}),
+    ('get_orders_by_category[total_owed]', 'get_orders_by_category',
+     {'category': 'Electronics', 'sort_by': 'total_owed', 'sort_order': 'desc'}),
+    ('get_orders_by_category[page 20]', 'get_orders_by_category', {'category': 'Electronics', 'page': 20}),
+    ('get_orders_by_category[filtered]', 'get_orders_by_category',
+     {'category': 'Electronics', 'min_price': 20, 'max_price': 200, 'start_date': '2020-01-01'}),
+    ('get_digital_orders_by_category', 'get_digital_orders_by_category', {'category': 'Movies'}),
+    ('export_orders', 'export_orders', {'category': 'Electronics'}),
+    ('export_digital_orders', 'export_digital_orders', {'category': ''}),
+    ('search_orders', 'search_orders', {'text': 'cable'}),
+    ('search_orders[retail, price]', 'search_orders', {'text': 'black', 'channel': 'retail', 'sort_by': 'total'}),
+]
+ROUTES = [
+    '/api/stats/summary',
+    '/api/stats/spending-over-time?period=monthly',
+    '/api/stats/spending-trends',
+    '/api/stats/dashboard',
+    '/api/stats/dashboard?shape=columnar',
+    '/api/stats/returns',
+    '/api/stats/digital-vs-retail',
+    '/api/stats/retail-breakdown',
+    '/api/stats/digital-breakdown',
+    '/api/orders/by-category?category=Electronics',
+    '/api/digital-orders/by-category?category=Movies',
+    '/api/orders/search?q=cable',
+    '/api/orders/export?category=Electronics&format=csv',
+    '/api/digital-orders/export?format=ndjson',
+]
+
+class Results:
+    """Timings of every benchmark in a run, in milliseconds"""
+
+    def __init__(self, meta):
+        self.meta = meta
+        self.benchmarks = {}
+
+    def add(self, group, name, runs, cold=None, rows=None):
+        runs = [run * 1000 for run in runs]
+        entry = {
+            'group': group,
+            'runs': [round(run, 3) for run in runs],
+            'min': round(min(runs), 3),
+            'median': round(statistics.median(runs), 3),
+            'max': round(max(runs), 3),
+        }
+        if cold is not None:
+            entry['cold'] = round(cold * 1000, 3)
+        if rows is not None:
+            entry['rows'] = rows
+            entry['rowsPerSec'] = round(rows / (entry['median'] / 1000)) if entry['median'] else None
+        self.benchmarks[name] = entry
+        print(f"  {name:<58} median {entry['median']:>10.2f} ms  min {entry['min']:>10.2f} ms")
+
+    def to_dict(self):
+        return {'meta': self.meta, 'benchmarks': self.benchmarks}
+
+def timed(call):
+    """(seconds, result) of one call"""
+    start = time.perf_counter()
+    result = call()
+    return time.perf_counter() - start, result
+
+def repeated(call, repeat):
+    """(cold run, warm runs): the first call is timed apart, then the call is repeated"""
+    cold, _ = timed(call)
+    return cold, [timed(call)[0] for _ in range(repeat)]
+
+@contextlib.contextmanager
+def quiet(verbose):
+    """Swallow the importer's progress output unless verbose"""
+    if verbose:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def fresh_database(db_path, verbose=False):
+    """Delete the benchmark database and create an empty schema in its place"""
+    close_read_connections()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    with quiet(verbose):
+        init_database(db_path)
+
+def retail_rows(data_dir):
+    """Number of rows in the retail order history exports under data_dir"""
+    rows = 0
+    for csv_path in import_data.find_dataset_files(data_dir, 'retail'):
+        with open(csv_path, encoding='utf-8', errors='replace') as csv_file:
+            rows += sum(1 for _ in csv_file) - 1
+    return rows
+
+def bench_imports(results, data_dir, db_path, chunk_size, verbose):
+    """Time every import mode on a fresh database; leaves the database fully imported"""
+    names = list(DATASETS)
+    row_importers = {
+        'retail': import_data.import_retail_orders,
+        'digital': import_data.import_digital_items,
+        'returns': import_data.import_returns,
+        'cart': import_data.import_cart_items,
+    }
+
+    def each(mode, run):
+        for name in names:
+            with quiet(verbose):
+                elapsed, imported = timed(lambda: run(name))
+            results.add('import', f'import.{mode}.{name}', [elapsed], rows=imported)
+
+    if retail_rows(data_dir) <= ROW_IMPORT_LIMIT:
+        fresh_database(db_path, verbose)
+        each('row', lambda name: row_importers[name](data_dir))
+    else:
+        print(f"  (row-at-a-time import skipped above {ROW_IMPORT_LIMIT:,} retail rows)")
+
+    fresh_database(db_path, verbose)
+    each('incremental', lambda name: import_data.incremental_import_dataset(data_dir, name))
+    # Nothing changed on disk, so a second pass only fingerprints the files
+    each('incremental-unchanged', lambda name: import_data.incremental_import_dataset(data_dir, name))
+
+    fresh_database(db_path, verbose)
+    each('stream', lambda name: import_data.bulk_import_dataset(data_dir, name, chunk_size))
+
+    fresh_database(db_path, verbose)
+    with quiet(verbose):
+        elapsed, imported = timed(lambda: import_data.parallel_import(data_dir, names))
+    results.add('import', 'import.parallel', [elapsed], rows=sum(imported.values()))
+
+    fresh_database(db_path, verbose)
+    each('bulk', lambda name: import_data.bulk_import_dataset(data_dir, name))
+    with quiet(verbose):
+        elapsed, _ = timed(import_data.finalize_import)
+    results.add('import', 'import.finalize', [elapsed])
+
+def bench_processors(results, repeat):
+    """Time every DataProcessor method on each engine"""
+    from data_processor import DataProcessor
+    from columnar import ColumnarProcessor
+    engines = {
+        'sql': DataProcessor(),
+        'sql-scan': DataProcessor(use_rollups=False),
+        'columnar': ColumnarProcessor(),
+    }
+    for engine, processor in engines.items():
+        calls = AGGREGATE_CALLS + (ORDER_CALLS if engine == 'sql' else [])
+        for name, method, kwargs in calls:
+            def call(method=getattr(processor, method), kwargs=kwargs):
+                result = method(**kwargs)
+                # Exports are generators; time producing every row
+                return list(result) if method.__name__.startswith('export_') else result
+            cold, runs = repeated(call, repeat)
+            results.add('processor', f'processor.{engine}.{name}', runs, cold=cold)
+
+def bench_routes(results, repeat):
+    """Time the API routes through the Flask test client, with the response cache cleared before each request"""
+    from app import app
+    from api.cache import response_cache
+    client = app.test_client()
+    for url in ROUTES:
+        def call(url=url):
+            response_cache.clear()
+            response = client.get(url, headers={'Accept-Encoding': 'br, gzip'})
+            body = response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f'GET {url} returned {response.status_code}: {body[:200]!r}')
+            return body
+        cold, runs = repeated(call, repeat)
+        results.add('route', f'route.GET {url}', runs, cold=cold)
+
+def git_commit():
+    """Commit hash of the working tree, or None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, baseline, threshold):
+    """Print how each benchmark's median moved against a baseline run; returns the regressed names"""
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'} "
+          f"(scale {baseline['meta'].get('rows'):,} rows, threshold {threshold:.0%}):")
+    for name, entry in current['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is None:
+            continue
+        old, new = before['median'], entry['median']
+        change = (new - old) / old if old else 0
+        regressed = change > threshold and new - old > MIN_REGRESSION_MS
+        improved = change < -threshold and old - new > MIN_REGRESSION_MS
+        if regressed:
+            regressions.append(name)
+        mark = 'REGRESSION' if regressed else 'faster' if improved else ''
+        print(f"  {name:<58} {old:>10.2f} -> {new:>10.2f} ms {change:>+8.1%} {mark}")
+    if baseline['meta'].get('rows') != current['meta'].get('rows'):
+        print("  (warning: the runs used different scales)")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the importer, DataProcessor and API routes')
+    parser.add_argument('--scale', type=parse_rows, default=SCALES['10k'],
+                        help=f"retail rows to generate: {', '.join(SCALES)} or a number (default 10k)")
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the generated exports')
+    parser.add_argument('--data-dir', help='benchmark these exports instead of generating them')
+    parser.add_argument('--database', help='benchmark queries against this existing database (skips the imports)')
+    parser.add_argument('--groups', default='import,processor,route',
+                        help='comma-separated benchmark groups to run (default import,processor,route)')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per query benchmark (default 5)')
+    parser.add_argument('--chunk-size', type=int, default=import_data.DEFAULT_CHUNK_SIZE,
+                        help='rows per chunk for the streaming import')
+    parser.add_argument('--output', help='write results to this JSON file (default benchmark-<rows>.json)')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare with the results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'slowdown of a median that counts as a regression (default {DEFAULT_THRESHOLD})')
+    parser.add_argument('--keep', action='store_true', help='keep the generated exports and database')
+    parser.add_argument('--verbose', action='store_true', help="show the importer's progress output")
+    args = parser.parse_args()
+    args.groups = [group.strip() for group in args.groups.split(',') if group.strip()]
+    unknown = set(args.groups) - {'import', 'processor', 'route'}
+    if unknown:
+        parser.error(f"unknown benchmark groups: {', '.join(sorted(unknown))}")
+    if args.database and 'import' in args.groups:
+        args.groups.remove('import')
+    return args
+
+def main():
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix='amazon_benchmark_')
+    try:
+        data_dir = args.data_dir or os.path.join(work_dir, 'data')
+        if args.database:
+            db_path = os.path.abspath(args.database)
+            with sqlite3.connect(db_path) as conn:
+                rows = conn.execute('SELECT COUNT(*) FROM retail_orders').fetchone()[0]
+        else:
+            db_path = os.path.join(work_dir, 'benchmark.db')
+            if args.data_dir:
+                rows = retail_rows(data_dir)
+            else:
+                rows = args.scale
+                generate_exports(data_dir, rows, args.seed)
+        # Every get_db()/get_read_db() call below, including the API's, uses this database
+        database.DATABASE_PATH = db_path
+
+        results = Results({
+            'rows': rows,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'routeEngine': os.environ.get('AMAZON_DATA_ENGINE', 'sql'),
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        })
+
+        if 'import' in args.groups:
+            print("\nImport:")
+            bench_imports(results, data_dir, db_path, args.chunk_size, args.verbose)
+        elif not args.database:
+            print("\nImporting...")
+            fresh_database(db_path, args.verbose)
+            with quiet(args.verbose):
+                import_data.parallel_import(data_dir, list(DATASETS))
+                import_data.finalize_import()
+
+        if 'processor' in args.groups:
+            print(f"\nDataProcessor ({args.repeat} runs each, after one cold run):")
+            bench_processors(results, args.repeat)
+        if 'route' in args.groups:
+            print(f"\nRoutes ({args.repeat} runs each, uncached):")
+            bench_routes(results, args.repeat)
+        close_read_connections()
+
+        output = args.output or f'benchmark-{rows}.json'
+        with open(output, 'w') as out:
+            json.dump(results.to_dict(), out, indent=2)
+        print(f"\nWrote {len(results.benchmarks)} results to {output}")
+
+        if args.compare:
+            with open(args.compare) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = compare(results.to_dict(), baseline, args.threshold)
+            if regressions:
+                print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+                sys.exit(1)
+            print("\nNo regressions")
+    finally:
+        if args.keep:
+            print(f"Kept the generated exports and database in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""Product category rules and the keyword classifier that applies them at import time"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# Keywords matched as lowercase substrings of the product name
+RETAIL_CATEGORY_KEYWORDS = {
+    'Electronics': ['battery', 'charger', 'headphone', 'earbud', 'cable', 'wireless', 'led', 'display', 'screen',
+                   'monitor', 'keyboard', 'mouse', 'router', 'wifi', 'ethernet', 'speaker', 'amplifier',
+                   'kindle', 'e-reader', 'chromebook', 'laptop', 'computer', 'hard drive', 'external drive',
+                   'smart lock', 'smart home', 'security camera', 'nvr', 'camera system'],
+    'Mobile Devices': ['iphone', 'ipad', 'smartphone', 'tablet', 'apple watch', 'smartwatch',
+                      'smart watch', 'huawei watch', 'samsung phone', 'google pixel', 'oura ring'],
+    'Photography': ['lens', 'canon ef', 'canon ef-', 'canon ef-m', 'sigma', 'photography',
+                   'dslr', 'mirrorless', 'camcorder', 'vixia', 'powershot', 'eos',
+                   'viewfinder', 'camera lens'],
+    'Gaming': ['playstation', 'nintendo', 'xbox', 'switch', 'ps4', 'ps5', 'wii', 'game console',
+              'gamepad', 'controller', 'video game', 'gaming'],
+    'Clothing': ['shirt', 'jacket', 'hoodie', 'pants', 'dress', 'shoes', 'socks', 'clothing', 'apparel',
+                'slipper', 'boot', 'sunglasses', 'glasses', 'rain jacket', 'raincoat'],
+    'Home & Kitchen': ['cabinet', 'organizer', 'storage', 'container', 'mattress', 'bedding',
+                      'curtain', 'drape', 'coffee maker', 'coffee brewer', 'nespresso',
+                      'moccamaster', 'blender', 'vitamix', 'pasta maker', 'smoker',
+                      'air conditioner', 'vacuum', 'roomba', 'dyson', 'air purifier',
+                      'hepa', 'popcorn machine', 'aerogarden', 'chicken coop door'],
+    'Tools & Garden': ['lawn mower', 'lawn sweepr', 'string trimmer', 'chipper', 'shredder',
+                      'fence', 'mesh', 'generator', 'tool', 'garden', 'yard', 'landscaping',
+                      'arborist', 'utility cart', 'garden cart'],
+    'Pet Supplies': ['dog food', 'cat food', 'pet food', 'chicken feed', 'layer pellets', 'layer pellet',
+                    'mixed grains scratch', 'goat feed', 'goat snax', 'pet treat', 'bully stick',
+                    'dog chew', 'dog treat', 'animal feed', 'feed for', 'dog chews'],
+    'Food & Groceries': ['pancake mix', 'food', 'grocery', 'ingredient', 'spice', 'seasoning'],
+    'Fitness Equipment': ['elliptical', 'treadmill', 'walking pad', 'exercise', 'fitness', 'gym',
+                         'weights', 'yoga', 'workout', 'dumbbell'],
+    'Beauty & Personal Care': ['makeup', 'cosmetic', 'beauty', 'skincare', 'shampoo', 'soap',
+                               'hair mask', 'hair growth', 'toothbrush', 'sonicare', 'oral-b',
+                               'laser hair', 'jewelry polisher'],
+    'Sports & Outdoors': ['sport', 'outdoor', 'camping', 'hiking', 'tent', 'backpack', 'paddle',
+                         'sup', 'paddleboard', 'volleyball', 'badminton', 'trampoline'],
+    'Toys & Games': ['toy', 'game', 'lego', 'puzzle', 'board game', 'building kit', 'playset'],
+    'Health & Wellness': ['vitamin', 'supplement', 'health', 'wellness', 'fitness', 'electrolyte',
+                         'multivitamin', 'gummy vitamin', 'dna test', '23andme', 'protein'],
+    'Baby & Kids': ['car seat', 'booster seat', 'booster', 'baby', 'infant', 'toddler', 'stroller', 'diaper'],
+    'Automotive': ['truck', 'vehicle', 'automotive', 'auto tire', 'auto oil', 'car tire', 'car oil'],
+    'Services': ['hire', 'service', 'arborist']
+}
+
+# Categories are tried in this order and the first match wins, so more
+# specific categories come before broad ones like Electronics
+RETAIL_CATEGORY_ORDER = [
+    'Baby & Kids', 'Pet Supplies', 'Mobile Devices', 'Photography', 'Gaming',
+    'Fitness Equipment', 'Tools & Garden', 'Food & Groceries', 'Services', 'Automotive',
+    'Electronics', 'Home & Kitchen', 'Clothing', 'Beauty & Personal Care',
+    'Sports & Outdoors', 'Toys & Games', 'Health & Wellness', 'Books & Media'
+]
+
+RETAIL_OTHER = 'Other'
+
+RETAIL_CATEGORIES = list(RETAIL_CATEGORY_KEYWORDS) + [RETAIL_OTHER]
+
+# Digital items: subscriptions are split by service, everything else by
+# the kind of item. Each list is in priority order, first match wins.
+SUBSCRIPTION_RULES = [
+    ('Prime Membership', ['prime']),
+    ('Paramount+', ['paramount']),
+    ('STACK TV', ['stacktv', 'stack tv']),
+    ('Video Streaming', ['video', 'streaming']),
+]
+SUBSCRIPTION_OTHER = 'Other Subscriptions'
+
+DIGITAL_ITEM_RULES = [
+    ('Movies', ['movie', 'film']),
+    ('Books & eBooks', ['book', 'kindle']),
+    ('Music', ['music', 'song', 'album']),
+    ('Apps & Software', ['app', 'software']),
+    ('Games', ['game']),
+]
+DIGITAL_OTHER = 'Other Digital'
+
+DIGITAL_CATEGORIES = ([category for category, _ in SUBSCRIPTION_RULES] + [SUBSCRIPTION_OTHER] +
+                      [category for category, _ in DIGITAL_ITEM_RULES] + [DIGITAL_OTHER])
+
+def trie_pattern(words):
+    """Regex alternation of words factored into a prefix trie"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+class KeywordClassifier:
+    """Priority-ordered keyword rules compiled once into a single regex.
+
+    A name gets the first category in rule order with any keyword as a
+    lowercase substring, or the default. Batches are matched per distinct
+    space-separated token rather than per name: single-word keywords are
+    found in one regex pass over the vocabulary, and multi-word keywords
+    are only checked against names holding a token with their longest word.
+    """
+
+    def __init__(self, rules, default):
+        self.labels = [category for category, _ in rules] + [default]
+        self.default_rank = len(rules)
+        self.word_ranks = {}
+        self.phrases = {}
+        for rank, (_, keywords) in enumerate(rules):
+            for keyword in keywords:
+                keyword = keyword.lower()
+                if ' ' in keyword:
+                    anchor = max(keyword.split(' '), key=len)
+                    self.phrases.setdefault(anchor, []).append((rank, keyword))
+                else:
+                    self.word_ranks.setdefault(keyword, rank)
+        atoms = set(self.word_ranks) | set(self.phrases)
+        # The regex reports the longest keyword at each position, so every
+        # keyword that is a prefix of it matched there too
+        self.prefixes = {atom: [other for other in atoms if atom.startswith(other)] for atom in atoms}
+        self.pattern = re.compile(f'(?=({trie_pattern(atoms)}))')
+
+    def classify(self, name):
+        """Category of one name, or None for a missing name"""
+        return self.classify_many([name])[0]
+
+    def classify_many(self, names):
+        """Categories for a list of names, with None for missing names"""
+        present = [i for i, name in enumerate(names) if name is not None]
+        lowered = [names[i].lower() for i in present]
+        results = [None] * len(names)
+        if not lowered:
+            return results
+
+        # Tokens of every name, flattened; offsets mark where each name starts
+        counts = np.fromiter((name.count(' ') + 1 for name in lowered), dtype=np.int64, count=len(lowered))
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        codes, vocab = pd.factorize(np.array(' '.join(lowered).split(' '), dtype=object))
+
+        token_ranks = np.full(len(vocab), self.default_rank)
+        anchors = {}
+        buffer = '\n'.join(vocab)
+        matches = [(match.start(), match.group(1)) for match in self.pattern.finditer(buffer)]
+        if matches:
+            starts = np.cumsum([0] + [len(token) + 1 for token in vocab[:-1]])
+            owners = np.searchsorted(starts, [position for position, _ in matches], side='right') - 1
+            for token, (_, matched) in zip(owners.tolist(), matches):
+                for atom in self.prefixes[matched]:
+                    rank = self.word_ranks.get(atom)
+                    if rank is not None and rank < token_ranks[token]:
+                        token_ranks[token] = rank
+                    if atom in self.phrases:
+                        anchors.setdefault(token, set()).add(atom)
+        ranks = np.minimum.reduceat(token_ranks[codes], offsets).tolist()
+
+        if anchors:
+            has_anchor = np.zeros(len(vocab), dtype=bool)
+            has_anchor[list(anchors)] = True
+            positions = np.flatnonzero(has_anchor[codes])
+            holders = np.searchsorted(offsets, positions, side='right') - 1
+            for i, token in zip(holders.tolist(), codes[positions].tolist()):
+                for anchor in anchors[token]:
+                    for rank, phrase in self.phrases[anchor]:
+                        if rank < ranks[i] and phrase in lowered[i]:
+                            ranks[i] = rank
+
+        for i, rank in zip(present, ranks):
+            results[i] = self.labels[rank]
+        return results
+
+RETAIL_CLASSIFIER = KeywordClassifier(
+    [(category, RETAIL_CATEGORY_KEYWORDS[category]) for category in RETAIL_CATEGORY_ORDER
+     if category in RETAIL_CATEGORY_KEYWORDS],
+    RETAIL_OTHER)
+SUBSCRIPTION_CLASSIFIER = KeywordClassifier(SUBSCRIPTION_RULES, SUBSCRIPTION_OTHER)
+DIGITAL_ITEM_CLASSIFIER = KeywordClassifier(DIGITAL_ITEM_RULES, DIGITAL_OTHER)
+
+def classify_retail_many(product_names):
+    """Categories for a list of retail product names"""
+    return RETAIL_CLASSIFIER.classify_many(product_names)
+
+def classify_digital_many(product_names, subscription_infos):
+    """Categories for digital items given their names and subscription info"""
+    subscription = [name is not None and ('subscription' in (info or '').lower() or 'subscription' in name.lower())
+                    for name, info in zip(product_names, subscription_infos)]
+    results = [None] * len(product_names)
+    for classifier, wanted in ((SUBSCRIPTION_CLASSIFIER, True), (DIGITAL_ITEM_CLASSIFIER, False)):
+        rows = [i for i, flag in enumerate(subscription) if flag == wanted]
+        for i, category in zip(rows, classifier.classify_many([product_names[i] for i in rows])):
+            results[i] = category
+    return results
+
+def classify_retail(product_name):
+    """Category of a retail product name, or None for a missing name"""
+    return classify_retail_many([product_name])[0]
+
+def classify_digital(product_name, subscription_info=None):
+    """Category of a digital item, or None for a missing name"""
+    return classify_digital_many([product_name], [subscription_info])[0]
@@ -1,12 +1,239 @@
-from database import get_db
-from collections import defaultdict
+from database import get_read_db, read_data_generation, VALID_RETAIL_ORDER, VALID_DIGITAL_ITEM
+from categories import RETAIL_CATEGORIES, DIGITAL_CATEGORIES
+from search import fts_query
+from rollups import daily_rollup_query, ROLLUP_SOURCES
+from timeseries import DailyCube, CUBE_CHANNELS, PERIODS, day_number
+from profiling import ProfiledCursor
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+
+# Filtered row counts kept for the drill-down tables, per data generation
+COUNT_CACHE_SIZE = 256
+
+# Columns and sortable fields of the order drill-downs and exports
+RETAIL_ORDER_COLUMNS = ('order_id, order_date, product_name, total_owed, quantity, '
+                        'order_status, payment_instrument_type, asin')
+RETAIL_ORDER_FIELDS = ['orderId', 'date', 'productName', 'total', 'quantity', 'status', 'paymentMethod', 'asin']
+RETAIL_SORT_COLUMNS = {
+    'order_date': 'order_date',
+    'product_name': 'product_name',
+    'total_owed': 'total_owed',
+    'quantity': 'quantity',
+    'order_id': 'order_id'
+}
+DIGITAL_ORDER_COLUMNS = ('order_id, order_date, product_name, our_price as total, quantity_ordered as quantity, '
+                         'subscription_order_info')
+DIGITAL_ORDER_FIELDS = ['orderId', 'date', 'productName', 'total', 'quantity', 'status', 'paymentMethod',
+                        'subscriptionInfo']
+DIGITAL_SORT_COLUMNS = {
+    'order_date': 'order_date',
+    'product_name': 'product_name',
+    'our_price': 'our_price',
+    'quantity': 'quantity_ordered',
+    'order_id': 'order_id'
+}
+
+# Quantity column of each channel's line items, summed for the top products
+QUANTITY_COLUMNS = {'retail': 'quantity', 'digital': 'quantity_ordered'}
+
+# Dashboard sections queried concurrently, one connection per batch. The
+# rollup-backed sections share one batch so they share their rollup reads;
+# each breakdown runs its own product-level GROUP BYs alongside.
+DASHBOARD_BATCHES = [
+    ('summary', 'spendingOverTime', 'returns', 'digitalVsRetail'),
+    ('retailBreakdown',),
+    ('digitalBreakdown',),
+]
+DASHBOARD_WORKERS = 6
+
+dashboard_pool = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix='dashboard')
+
+def filter_fingerprint(table, where_clause, query_params):
+    """Short hash of the rows a drill-down is filtered to, so tokens cannot cross filters"""
+    raw = json.dumps([table, where_clause, list(query_params)], default=str).encode()
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+def encode_page_token(sort_column, sort_dir, filters, value, row_id):
+    """Opaque continuation token for the row a page ended on"""
+    raw = json.dumps([sort_column, sort_dir, filters, value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_page_token(token, sort_column, sort_dir, filters):
+    """Sort value and id a token resumes after; ValueError if it is malformed or for another sort or filter"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        column, direction, token_filters, value, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if (column, direction) != (sort_column, sort_dir) or not isinstance(row_id, int):
+        raise ValueError('Cursor does not match the requested sort order')
+    if token_filters != filters:
+        raise ValueError('Cursor does not match the requested filters')
+    return value, row_id
+
+def keyset_segments(sort_column, sort_dir, value, row_id):
+    """WHERE terms that together select the rows after (value, id), in order.
+
+    SQLite sorts NULLs first ascending and last descending. Keeping the NULL
+    run in its own term keeps every term a plain index range.
+    """
+    if sort_dir == 'ASC':
+        if value is None:
+            return [(f'{sort_column} IS NULL AND id > ?', [row_id]), (f'{sort_column} IS NOT NULL', [])]
+        return [(f'({sort_column}, id) > (?, ?)', [value, row_id])]
+    if value is None:
+        return [(f'{sort_column} IS NULL AND id < ?', [row_id])]
+    return [(f'({sort_column}, id) < (?, ?)', [value, row_id]), (f'{sort_column} IS NULL', [])]
+
+class SharedCursor(ProfiledCursor):
+    """Cursor for a batch of related queries, remembering intermediate results they share"""
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.memo = {}
 
 class DataProcessor:
-    def __init__(self):
-        # Database is initialized, no need to load CSV files
-        pass
+    def __init__(self, use_rollups=True):
+        # Database is initialized, no need to load CSV files.
+        # With use_rollups, unfiltered aggregates are read from the rollup
+        # tables the importer maintains instead of the line-item tables.
+        self.use_rollups = use_rollups
+        self._counts = OrderedDict()
+        self._counts_lock = threading.Lock()
+        # (data generation, DailyCube) behind the spending series
+        self._cube = None
+        self._cube_lock = threading.Lock()
+    
+    @contextmanager
+    def _cursor(self, cursor=None):
+        """The caller's cursor, or a new one on a pooled read connection"""
+        if cursor is not None:
+            yield cursor
+            return
+        with get_read_db() as conn:
+            yield conn.cursor()
+    
+    def _shared(self, cursor, key, compute):
+        """compute(), remembered on a SharedCursor so a batch runs it only once"""
+        memo = getattr(cursor, 'memo', None)
+        if memo is None:
+            return compute()
+        if key not in memo:
+            memo[key] = compute()
+        return memo[key]
+    
+    def _rollups_ready(self, cursor):
+        """Whether rollup tables exist and have been built for this database"""
+        if not self.use_rollups:
+            return False
+        
+        def check():
+            try:
+                cursor.execute('SELECT 1 FROM period_rollup LIMIT 1')
+            except sqlite3.OperationalError:
+                # Database created before rollups existed
+                return False
+            return cursor.fetchone() is not None
+        
+        return self._shared(cursor, 'rollups_ready', check)
+    
+    def _rollup_periods(self, cursor, channel, grain):
+        """Rollup rows for one channel and grain, in period order"""
+        def fetch():
+            cursor.execute('''
+                SELECT period, spending, items, orders, first_date, last_date
+                FROM period_rollup
+                WHERE channel = ? AND grain = ?
+                ORDER BY period
+            ''', (channel, grain))
+            return cursor.fetchall()
+        
+        return self._shared(cursor, ('periods', channel, grain), fetch)
+    
+    def _rollup_total(self, cursor, channel):
+        """The overall rollup row for one channel, or None"""
+        rows = self._rollup_periods(cursor, channel, 'all')
+        return rows[0] if rows else None
+    
+    def _filtered_count(self, cursor, table, where_clause, query_params):
+        """COUNT(*) for a filter, cached until the next import"""
+        key = (read_data_generation(cursor), table, where_clause, tuple(query_params))
+        with self._counts_lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+        cursor.execute(f'SELECT COUNT(*) as count FROM {table} WHERE {where_clause}', query_params)
+        count = cursor.fetchone()['count']
+        with self._counts_lock:
+            self._counts[key] = count
+            while len(self._counts) > COUNT_CACHE_SIZE:
+                self._counts.popitem(last=False)
+        return count
+    
+    def _fetch_page(self, cursor, table, columns, where_clause, query_params, sort_column, sort_dir,
+                    page, limit, page_token):
+        """One page of rows plus the token for the next page (None on the last page).
+
+        With a page token the page starts right after the row it names, so
+        every page is an index seek instead of an OFFSET scan. Without one,
+        page falls back to OFFSET for direct access.
+        """
+        segments = [('1', [])]
+        offset = (page - 1) * limit
+        filters = filter_fingerprint(table, where_clause, query_params)
+        if page_token:
+            value, row_id = decode_page_token(page_token, sort_column, sort_dir, filters)
+            segments = keyset_segments(sort_column, sort_dir, value, row_id)
+            offset = 0
+        
+        # One extra row tells whether there is a next page
+        rows = []
+        for condition, condition_params in segments:
+            if len(rows) > limit:
+                break
+            # Note: sort_column and sort_dir are safe because they're validated against a whitelist
+            cursor.execute(f'''
+                SELECT id, {sort_column} as sort_value, {columns}
+                FROM {table}
+                WHERE {where_clause} AND {condition}
+                ORDER BY {sort_column} {sort_dir}, id {sort_dir}
+                LIMIT ? OFFSET ?
+            ''', list(query_params) + condition_params + [limit + 1 - len(rows), offset])
+            rows += cursor.fetchall()
+        if len(rows) <= limit:
+            return rows, None
+        last = rows[limit - 1]
+        return rows[:limit], encode_page_token(sort_column, sort_dir, filters, last['sort_value'], last['id'])
     
-    def get_summary(self):
+    def _stream_rows(self, table, columns, where_clause, query_params, sort_column, sort_dir, convert):
+        """Generator of convert(row) for every matching row, in drill-down order.
+
+        Rows are stepped out of SQLite one at a time, so memory stays flat
+        however many rows match. The pooled connection is held until the
+        generator is exhausted or closed.
+        """
+        with get_read_db() as conn:
+            cursor = conn.cursor()
+            try:
+                # Note: sort_column and sort_dir are safe because they're validated against a whitelist
+                cursor.execute(f'''
+                    SELECT {columns}
+                    FROM {table}
+                    WHERE {where_clause}
+                    ORDER BY {sort_column} {sort_dir}, id {sort_dir}
+                ''', query_params)
+                for row in cursor:
+                    yield convert(row)
+            finally:
+                # Resets the statement if the client stopped reading part way
+                cursor.close()
+    
+    def get_summary(self, cursor=None):
         """Get overall summary statistics"""
         summary = {
             'totalRetailOrders': 0,
@@ -19,12 +246,26 @@ class DataProcessor:
             'averageOrderValue': 0
         }
         
-        with get_db() as conn:
-            cursor = conn.cursor()
+        with self._cursor(cursor) as cursor:
+            
+            if self._rollups_ready(cursor):
+                retail = self._rollup_total(cursor, 'retail')
+                if retail:
+                    summary['totalRetailOrders'] = retail['orders'] or 0
+                    summary['totalRetailSpending'] = float(retail['spending'] or 0)
+                    if retail['first_date']:
+                        summary['dateRange']['start'] = retail['first_date']
+                    if retail['last_date']:
+                        summary['dateRange']['end'] = retail['last_date']
+                digital = self._rollup_total(cursor, 'digital')
+                if digital:
+                    summary['totalDigitalOrders'] = digital['orders'] or 0
+                    summary['totalDigitalSpending'] = float(digital['spending'] or 0)
+                return self._finish_summary(summary)
             
             # Retail orders (excluding cancelled)
             cursor.execute('''
-                SELECT COUNT(*) as count, 
+                SELECT COUNT(DISTINCT order_id) as count, 
                        COALESCE(SUM(total_owed), 0) as spending,
                        MIN(order_date) as min_date,
                        MAX(order_date) as max_date
@@ -44,7 +285,7 @@ class DataProcessor:
             
             # Digital orders
             cursor.execute('''
-                SELECT COUNT(*) as count, 
+                SELECT COUNT(DISTINCT order_id) as count, 
                        COALESCE(SUM(our_price), 0) as spending
                 FROM digital_items
                 WHERE our_price IS NOT NULL AND our_price > 0
@@ -54,6 +295,10 @@ class DataProcessor:
                 summary['totalDigitalOrders'] = row['count']
                 summary['totalDigitalSpending'] = float(row['spending'] or 0)
         
+        return self._finish_summary(summary)
+    
+    def _finish_summary(self, summary):
+        """Fill in the combined totals of a summary"""
         summary['totalOrders'] = summary['totalRetailOrders'] + summary['totalDigitalOrders']
         summary['totalSpending'] = summary['totalRetailSpending'] + summary['totalDigitalSpending']
         
@@ -62,169 +307,100 @@ class DataProcessor:
         
         return summary
     
-    def get_spending_over_time(self, period='monthly'):
-        """Get spending aggregated by time period"""
-        result = {'labels': [], 'values': [], 'orderCounts': []}
+    def get_spending_over_time(self, period='monthly', cursor=None, start_date=None, end_date=None):
+        """Get spending aggregated by time period (see PERIODS), optionally between two dates"""
+        if period not in PERIODS:
+            return {'labels': [], 'values': [], 'orderCounts': []}
+        start_day, end_day = day_number(start_date), day_number(end_date)
         
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            if period == 'monthly':
-                # Retail orders
-                cursor.execute('''
-                    SELECT 
-                        strftime('%Y-%m', order_date) as period,
-                        SUM(total_owed) as spending,
-                        COUNT(DISTINCT order_id) as order_count
-                    FROM retail_orders
-                    WHERE order_status != 'Cancelled'
-                      AND total_owed IS NOT NULL
-                      AND total_owed > 0
-                      AND order_date IS NOT NULL
-                    GROUP BY period
-                    ORDER BY period
-                ''')
-                for row in cursor.fetchall():
-                    result['labels'].append(row['period'])
-                    result['values'].append(float(row['spending'] or 0))
-                    result['orderCounts'].append(row['order_count'])
-                
-                # Digital orders
-                cursor.execute('''
-                    SELECT 
-                        strftime('%Y-%m', order_date) as period,
-                        SUM(our_price) as spending,
-                        COUNT(DISTINCT order_id) as order_count
-                    FROM digital_items
-                    WHERE our_price IS NOT NULL
-                      AND our_price > 0
-                      AND order_date IS NOT NULL
-                    GROUP BY period
-                    ORDER BY period
-                ''')
-                # Merge with retail data
-                digital_data = {row['period']: {'spending': float(row['spending'] or 0), 'count': row['order_count']} 
-                               for row in cursor.fetchall()}
-                
-                for period_key, data in digital_data.items():
-                    if period_key in result['labels']:
-                        idx = result['labels'].index(period_key)
-                        result['values'][idx] += data['spending']
-                        result['orderCounts'][idx] += data['count']
-                    else:
-                        result['labels'].append(period_key)
-                        result['values'].append(data['spending'])
-                        result['orderCounts'].append(data['count'])
-                
-                # Sort by period
-                sorted_data = sorted(zip(result['labels'], result['values'], result['orderCounts']))
-                result['labels'] = [x[0] for x in sorted_data]
-                result['values'] = [x[1] for x in sorted_data]
-                result['orderCounts'] = [x[2] for x in sorted_data]
-            
-            elif period == 'yearly':
-                # Retail orders
-                cursor.execute('''
-                    SELECT 
-                        strftime('%Y', order_date) as period,
-                        SUM(total_owed) as spending,
-                        COUNT(DISTINCT order_id) as order_count
-                    FROM retail_orders
-                    WHERE order_status != 'Cancelled'
-                      AND total_owed IS NOT NULL
-                      AND total_owed > 0
-                      AND order_date IS NOT NULL
-                    GROUP BY period
-                    ORDER BY period
-                ''')
-                for row in cursor.fetchall():
-                    result['labels'].append(row['period'])
-                    result['values'].append(float(row['spending'] or 0))
-                    result['orderCounts'].append(row['order_count'])
-                
-                # Digital orders
-                cursor.execute('''
-                    SELECT 
-                        strftime('%Y', order_date) as period,
-                        SUM(our_price) as spending,
-                        COUNT(DISTINCT order_id) as order_count
-                    FROM digital_items
-                    WHERE our_price IS NOT NULL
-                      AND our_price > 0
-                      AND order_date IS NOT NULL
-                    GROUP BY period
-                    ORDER BY period
-                ''')
-                digital_data = {row['period']: {'spending': float(row['spending'] or 0), 'count': row['order_count']} 
-                               for row in cursor.fetchall()}
-                
-                for period_key, data in digital_data.items():
-                    if period_key in result['labels']:
-                        idx = result['labels'].index(period_key)
-                        result['values'][idx] += data['spending']
-                        result['orderCounts'][idx] += data['count']
-                    else:
-                        result['labels'].append(period_key)
-                        result['values'].append(data['spending'])
-                        result['orderCounts'].append(data['count'])
-                
-                sorted_data = sorted(zip(result['labels'], result['values'], result['orderCounts']))
-                result['labels'] = [x[0] for x in sorted_data]
-                result['values'] = [x[1] for x in sorted_data]
-                result['orderCounts'] = [x[2] for x in sorted_data]
-        
-        return result
+        with self._cursor(cursor) as cursor:
+            cube = self._daily_cube(cursor)
+        return cube.series(period, start_day, end_day)
     
-        """Get top products by quantity or spending"""
-        products = []
+    def get_spending_trends(self, cursor=None, start_date=None, end_date=None):
+        """Get monthly spending with its running total, trailing averages and year-over-year change"""
+        start_day, end_day = day_number(start_date), day_number(end_date)
         
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            if by == 'quantity':
-                cursor.execute('''
-                    SELECT 
-                        product_name as name,
-                        SUM(quantity) as total_quantity,
-                        SUM(total_owed) as total_spending,
-                        COUNT(DISTINCT order_id) as order_count
-                    FROM retail_orders
-                    WHERE order_status != 'Cancelled'
-                      AND total_owed IS NOT NULL
-                      AND total_owed > 0
-                      AND product_name IS NOT NULL
-                    GROUP BY product_name
-                    ORDER BY total_quantity DESC
-                    LIMIT ?
-                ''', (limit,))
-            else:  # by spending
-                cursor.execute('''
-                    SELECT 
-                        product_name as name,
-                        SUM(quantity) as total_quantity,
-                        SUM(total_owed) as total_spending,
-                        COUNT(DISTINCT order_id) as order_count
-                    FROM retail_orders
-                    WHERE order_status != 'Cancelled'
-                      AND total_owed IS NOT NULL
-                      AND total_owed > 0
-                      AND product_name IS NOT NULL
-                    GROUP BY product_name
-                    ORDER BY total_spending DESC
-                    LIMIT ?
-                ''', (limit,))
-            
-            for row in cursor.fetchall():
-                products.append({
-                    'name': row['name'] or 'Unknown',
-                    'quantity': row['total_quantity'] or 0,
-                    'spending': float(row['total_spending'] or 0),
-                    'orders': row['order_count'] or 0
-                })
+        with self._cursor(cursor) as cursor:
+            cube = self._daily_cube(cursor)
+        return cube.trends(start_day, end_day)
+    
+    def _daily_cube(self, cursor):
+        """The daily spending cube, loaded from daily_rollup once per data generation"""
+        if not self._rollups_ready(cursor):
+            return self._scan_daily_cube(cursor)
+        
+        def current():
+            generation = read_data_generation(cursor)
+            cube = self._cube
+            if cube is None or cube[0] != generation:
+                with self._cube_lock:
+                    if self._cube is None or self._cube[0] != generation:
+                        self._cube = (generation, self._load_daily_cube(cursor))
+                    cube = self._cube
+            return cube[1]
+        
+        return self._shared(cursor, 'daily_cube', current)
+    
+    def _load_daily_cube(self, cursor):
+        """Read daily_rollup into a DailyCube, or aggregate the line items if it has not been built"""
+        columns = ', '.join(f'{channel}_{measure}' for channel in CUBE_CHANNELS
+                            for measure in ('spending', 'items', 'orders'))
+        try:
+            cursor.execute(f'SELECT day, {columns} FROM daily_rollup ORDER BY day')
+            rows = [tuple(row) for row in cursor.fetchall()]
+        except sqlite3.OperationalError:
+            # Database imported before the daily cube existed
+            rows = []
+        if rows:
+            return DailyCube.from_rows(rows)
+        return self._scan_daily_cube(cursor)
+    
+    def _scan_daily_cube(self, cursor):
+        """A DailyCube aggregated from the line items, the same way daily_rollup is built"""
+        channel_rows = {}
+        for channel in CUBE_CHANNELS:
+            cursor.execute(daily_rollup_query(channel))
+            channel_rows[channel] = [tuple(row) for row in cursor.fetchall()]
+        return DailyCube.from_channel_rows(channel_rows)
+    
+    def get_top_products(self, limit=20, by='spending', cursor=None):
+        """Get top retail products by quantity or spending"""
+        with self._cursor(cursor) as cursor:
+            return {'products': self._top_product_rows(cursor, 'retail', limit, by)}
+    
+    def _top_product_rows(self, cursor, channel, limit, by='spending'):
+        """Top products of a channel's counted line items, grouped on product_id and named from products"""
+        table, amount, valid = ROLLUP_SOURCES[channel]
+        order = 'total_quantity' if by == 'quantity' else 'total_spending'
+        # Ties stay in product_id order, as the columnar engine ranks them
+        cursor.execute(f'''
+            SELECT p.name, t.total_quantity, t.total_spending, t.order_count
+            FROM (
+                SELECT 
+                    product_id,
+                    SUM({QUANTITY_COLUMNS[channel]}) as total_quantity,
+                    SUM({amount}) as total_spending,
+                    COUNT(DISTINCT order_id) as order_count
+                FROM {table}
+                WHERE {valid}
+                  AND product_id IS NOT NULL
+                GROUP BY product_id
+                ORDER BY {order} DESC, product_id
+                LIMIT ?
+            ) t
+            JOIN products p USING (product_id)
+            ORDER BY t.{order} DESC, t.product_id
+        ''', (limit,))
         
-        return {'products': products}
+        return [{
+            'name': row['name'] or 'Unknown',
+            'quantity': row['total_quantity'] or 0,
+            'spending': float(row['total_spending'] or 0),
+            'orders': row['order_count'] or 0
+        } for row in cursor.fetchall()]
     
-    def get_return_stats(self):
+    def get_return_stats(self, cursor=None):
         """Get return statistics"""
         stats = {
             'totalReturns': 0,
@@ -232,8 +408,21 @@ class DataProcessor:
             'returnsOverTime': {'labels': [], 'values': []}
         }
         
-        with get_db() as conn:
-            cursor = conn.cursor()
+        with self._cursor(cursor) as cursor:
+            
+            if self._rollups_ready(cursor):
+                returns = self._rollup_total(cursor, 'returns')
+                stats['totalReturns'] = returns['items'] if returns else 0
+                # Rollups built before the orders table have no returned order count
+                returned = returns['orders'] if returns and returns['orders'] is not None else stats['totalReturns']
+                retail = self._rollup_total(cursor, 'retail')
+                total_orders = retail['orders'] if retail else 0
+                if total_orders > 0:
+                    stats['returnRate'] = (returned / total_orders) * 100
+                for row in self._rollup_periods(cursor, 'returns', 'month'):
+                    stats['returnsOverTime']['labels'].append(row['period'])
+                    stats['returnsOverTime']['values'].append(row['items'])
+                return stats
             
             # Total returns
             cursor.execute('SELECT COUNT(*) as count FROM returns')
@@ -241,9 +430,11 @@ class DataProcessor:
             if row:
                 stats['totalReturns'] = row['count']
             
-            # Calculate return rate
+            # Return rate: share of orders with at least one return
             cursor.execute('''
-                SELECT COUNT(DISTINCT order_id) as count
+                SELECT COUNT(DISTINCT order_id) as count,
+                       COUNT(DISTINCT CASE WHEN order_id IN (SELECT order_id FROM returns)
+                                           THEN order_id END) as returned
                 FROM retail_orders
                 WHERE order_status != 'Cancelled'
                   AND total_owed IS NOT NULL
@@ -253,17 +444,17 @@ class DataProcessor:
             total_orders = row['count'] if row else 0
             
             if total_orders > 0:
-                stats['returnRate'] = (stats['totalReturns'] / total_orders) * 100
+                stats['returnRate'] = (row['returned'] / total_orders) * 100
             
             # Returns over time
             cursor.execute('''
                 SELECT 
-                    strftime('%Y-%m', return_creation_date) as period,
+                    printf('%04d-%02d', return_month / 100, return_month % 100) as period,
                     COUNT(*) as count
                 FROM returns
-                WHERE return_creation_date IS NOT NULL
-                GROUP BY period
-                ORDER BY period
+                WHERE return_month IS NOT NULL
+                GROUP BY return_month
+                ORDER BY return_month
             ''')
             
             for row in cursor.fetchall():
@@ -272,15 +463,22 @@ class DataProcessor:
         
         return stats
     
-    def get_digital_vs_retail(self):
+    def get_digital_vs_retail(self, cursor=None):
         """Compare digital vs retail orders"""
         comparison = {
             'retail': {'orders': 0, 'spending': 0},
             'digital': {'orders': 0, 'spending': 0}
         }
         
-        with get_db() as conn:
-            cursor = conn.cursor()
+        with self._cursor(cursor) as cursor:
+            
+            if self._rollups_ready(cursor):
+                for channel in ('retail', 'digital'):
+                    row = self._rollup_total(cursor, channel)
+                    if row:
+                        comparison[channel]['orders'] = row['orders'] or 0
+                        comparison[channel]['spending'] = float(row['spending'] or 0)
+                return comparison
             
             # Retail
             cursor.execute('''
@@ -313,120 +511,84 @@ class DataProcessor:
         
         return comparison
     
-    def get_digital_orders_by_category(self, category, min_price=None, max_price=None, start_date=None, end_date=None, page=1, limit=100, sort_by='order_date', sort_order='desc'):
+    def _digital_order_filters(self, category, min_price, max_price, start_date, end_date):
+        """WHERE clause and parameters for the digital order filters"""
+        where_conditions = [
+            "our_price IS NOT NULL",
+            "our_price > 0",
+            "product_name IS NOT NULL"
+        ]
+        
+        query_params = []
+        
+        if category in DIGITAL_CATEGORIES:
+            where_conditions.append("category = ?")
+            query_params.append(category)
+        
+        if min_price is not None:
+            where_conditions.append("our_price >= ?")
+            query_params.append(float(min_price))
+        if max_price is not None:
+            where_conditions.append("our_price <= ?")
+            query_params.append(float(max_price))
+        
+        if start_date:
+            where_conditions.append("order_date >= ?")
+            query_params.append(start_date)
+        if end_date:
+            where_conditions.append("order_date <= ?")
+            query_params.append(end_date)
+        
+        return " AND ".join(where_conditions), query_params
+    
+    def _digital_order(self, row):
+        """API representation of a digital order row"""
+        return {
+            'orderId': row['order_id'] or '',
+            'date': row['order_date'] or '',
+            'productName': row['product_name'] or '',
+            'total': float(row['total'] or 0),
+            'quantity': row['quantity'] or 0,
+            'status': 'Completed',
+            'paymentMethod': 'Digital Purchase',
+            'subscriptionInfo': row['subscription_order_info'] or '',
+        }
+    
+    def get_digital_orders_by_category(self, category, min_price=None, max_price=None, start_date=None, end_date=None, page=1, limit=100, sort_by='order_date', sort_order='desc', page_token=None):
         """Get digital orders filtered by category with price and date filters"""
-        orders = []
+        where_clause, query_params = self._digital_order_filters(category, min_price, max_price, start_date, end_date)
+        sort_column = DIGITAL_SORT_COLUMNS.get(sort_by, 'order_date')
+        sort_dir = 'DESC' if sort_order == 'desc' else 'ASC'
         
-        with get_db() as conn:
+        with get_read_db() as conn:
             cursor = conn.cursor()
             
-            where_conditions = [
-                "our_price IS NOT NULL",
-                "our_price > 0",
-                "product_name IS NOT NULL"
-            ]
-            
-            query_params = []
-            
-            if category == 'Prime Membership':
-                where_conditions.append("LOWER(product_name) LIKE ?")
-                query_params.append('%prime%')
-            elif category == 'Paramount+':
-                where_conditions.append("(LOWER(product_name) LIKE ? OR LOWER(product_name) LIKE ?)")
-                query_params.extend(['%paramount%', '%paramount+%'])
-            elif category == 'STACK TV':
-                where_conditions.append("(LOWER(product_name) LIKE ? OR LOWER(product_name) LIKE ?)")
-                query_params.extend(['%stacktv%', '%stack tv%'])
-            elif category == 'Video Streaming':
-                where_conditions.append("(LOWER(product_name) LIKE ? OR LOWER(product_name) LIKE ?) AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ?")
-                query_params.extend(['%video%', '%streaming%', '%prime%', '%paramount%'])
-            elif category == 'Movies':
-                where_conditions.append("(LOWER(product_name) LIKE ? OR LOWER(product_name) LIKE ?)")
-                query_params.extend(['%movie%', '%film%'])
-            elif category == 'Books & eBooks':
-                where_conditions.append("(LOWER(product_name) LIKE ? OR LOWER(product_name) LIKE ?)")
-                query_params.extend(['%book%', '%kindle%'])
-            elif category == 'Music':
-                where_conditions.append("(LOWER(product_name) LIKE ? OR LOWER(product_name) LIKE ? OR LOWER(product_name) LIKE ?)")
-                query_params.extend(['%music%', '%song%', '%album%'])
-            elif category == 'Apps & Software':
-                where_conditions.append("(LOWER(product_name) LIKE ? OR LOWER(product_name) LIKE ?)")
-                query_params.extend(['%app%', '%software%'])
-            elif category == 'Games':
-                where_conditions.append("LOWER(product_name) LIKE ?")
-                query_params.append('%game%')
-            elif category == 'Other Subscriptions':
-                where_conditions.append("(subscription_order_info IS NOT NULL AND subscription_order_info != 'Not Applicable' AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ?)")
-                query_params.extend(['%prime%', '%paramount%', '%stacktv%', '%stack tv%'])
-            elif category == 'Other Digital':
-                where_conditions.append("LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND LOWER(product_name) NOT LIKE ? AND (subscription_order_info IS NULL OR subscription_order_info = 'Not Applicable')")
-                query_params.extend(['%movie%', '%film%', '%book%', '%kindle%', '%music%', '%song%', '%album%', '%app%', '%software%', '%game%'])
-            
-            if min_price is not None:
-                where_conditions.append("our_price >= ?")
-                query_params.append(float(min_price))
-            if max_price is not None:
-                where_conditions.append("our_price <= ?")
-                query_params.append(float(max_price))
-            
-            if start_date:
-                where_conditions.append("order_date >= ?")
-                query_params.append(start_date)
-            if end_date:
-                where_conditions.append("order_date <= ?")
-                query_params.append(end_date)
+            total = self._filtered_count(cursor, 'digital_items', where_clause, query_params)
             
-            where_clause = " AND ".join(where_conditions)
-            
-            sort_column_map = {
-                'order_date': 'order_date',
-                'product_name': 'product_name',
-                'our_price': 'our_price',
-                'quantity': 'quantity_ordered',
-                'order_id': 'order_id'
-            }
-            sort_column = sort_column_map.get(sort_by, 'order_date')
-            sort_dir = 'DESC' if sort_order == 'desc' else 'ASC'
-            
-            cursor.execute(f'''
-                SELECT COUNT(*) as count
-                FROM digital_items
-                WHERE {where_clause}
-            ''', query_params)
-            total = cursor.fetchone()['count']
-            
-            offset = (page - 1) * limit
-            cursor.execute(f'''
-                SELECT 
-                    order_id, order_date, product_name, our_price as total, quantity_ordered as quantity,
-                    subscription_order_info
-                FROM digital_items
-                WHERE {where_clause}
-                ORDER BY {sort_column} {sort_dir}
-                LIMIT ? OFFSET ?
-            ''', query_params + [limit, offset])
-            
-            for row in cursor.fetchall():
-                orders.append({
-                    'orderId': row['order_id'] or '',
-                    'date': row['order_date'] or '',
-                    'productName': row['product_name'] or '',
-                    'total': float(row['total'] or 0),
-                    'quantity': row['quantity'] or 0,
-                    'status': 'Completed',
-                    'paymentMethod': 'Digital Purchase',
-                    'subscriptionInfo': row['subscription_order_info'] or '',
-                })
+            rows, next_token = self._fetch_page(
+                cursor, 'digital_items', DIGITAL_ORDER_COLUMNS,
+                where_clause, query_params, sort_column, sort_dir, page, limit, page_token
+            )
+            orders = [self._digital_order(row) for row in rows]
         
         return {
             'orders': orders,
             'total': total,
             'page': page,
             'limit': limit,
-            'totalPages': (total + limit - 1) // limit
+            'totalPages': (total + limit - 1) // limit,
+            'nextCursor': next_token,
         }
+    
+    def export_digital_orders(self, category, min_price=None, max_price=None, start_date=None, end_date=None, sort_by='order_date', sort_order='desc'):
+        """Every digital order matching the filters, as a generator of order dicts"""
+        where_clause, query_params = self._digital_order_filters(category, min_price, max_price, start_date, end_date)
+        sort_column = DIGITAL_SORT_COLUMNS.get(sort_by, 'order_date')
+        sort_dir = 'DESC' if sort_order == 'desc' else 'ASC'
+        return self._stream_rows('digital_items', DIGITAL_ORDER_COLUMNS, where_clause, query_params,
+                                 sort_column, sort_dir, self._digital_order)
 
-    def get_retail_breakdown(self):
+    def get_retail_breakdown(self, cursor=None):
         """Get retail-specific breakdowns"""
         breakdown = {
             'categories': [],
@@ -435,150 +597,84 @@ class DataProcessor:
             'paymentMethods': []
         }
         
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            # Categories (reuse existing logic but filter for retail only)
-            category_keywords = {
-                'Electronics': ['battery', 'charger', 'headphone', 'earbud', 'cable', 'wireless', 'led', 'display', 'screen', 
-                               'monitor', 'keyboard', 'mouse', 'router', 'wifi', 'ethernet', 'speaker', 'amplifier', 
-                               'kindle', 'e-reader', 'chromebook', 'laptop', 'computer', 'hard drive', 'external drive',
-                               'smart lock', 'smart home', 'security camera', 'nvr', 'camera system'],
-                'Mobile Devices': ['iphone', 'ipad', 'smartphone', 'tablet', 'apple watch', 'smartwatch', 
-                                  'smart watch', 'huawei watch', 'samsung phone', 'google pixel', 'oura ring'],
-                'Photography': ['lens', 'canon ef', 'canon ef-', 'canon ef-m', 'sigma', 'photography', 
-                               'dslr', 'mirrorless', 'camcorder', 'vixia', 'powershot', 'eos', 
-                               'viewfinder', 'camera lens'],
-                'Gaming': ['playstation', 'nintendo', 'xbox', 'switch', 'ps4', 'ps5', 'wii', 'game console', 
-                          'gamepad', 'controller', 'video game', 'gaming'],
-                'Clothing': ['shirt', 'jacket', 'hoodie', 'pants', 'dress', 'shoes', 'socks', 'clothing', 'apparel',
-                            'slipper', 'boot', 'sunglasses', 'glasses', 'rain jacket', 'raincoat'],
-                'Home & Kitchen': ['cabinet', 'organizer', 'storage', 'container', 'mattress', 'bedding', 
-                                  'curtain', 'drape', 'coffee maker', 'coffee brewer', 'nespresso', 
-                                  'moccamaster', 'blender', 'vitamix', 'pasta maker', 'smoker', 
-                                  'air conditioner', 'vacuum', 'roomba', 'dyson', 'air purifier', 
-                                  'hepa', 'popcorn machine', 'aerogarden', 'chicken coop door'],
-                'Tools & Garden': ['lawn mower', 'lawn sweepr', 'string trimmer', 'chipper', 'shredder', 
-                                  'fence', 'mesh', 'generator', 'tool', 'garden', 'yard', 'landscaping', 
-                                  'arborist', 'utility cart', 'garden cart'],
-                'Pet Supplies': ['dog food', 'cat food', 'pet food', 'chicken feed', 'layer pellets', 'layer pellet',
-                                'mixed grains scratch', 'goat feed', 'goat snax', 'pet treat', 'bully stick', 
-                                'dog chew', 'dog treat', 'animal feed', 'feed for', 'dog chews'],
-                'Food & Groceries': ['pancake mix', 'food', 'grocery', 'ingredient', 'spice', 'seasoning'],
-                'Fitness Equipment': ['elliptical', 'treadmill', 'walking pad', 'exercise', 'fitness', 'gym',
-                                     'weights', 'yoga', 'workout', 'dumbbell'],
-                'Beauty & Personal Care': ['makeup', 'cosmetic', 'beauty', 'skincare', 'shampoo', 'soap',
-                                           'hair mask', 'hair growth', 'toothbrush', 'sonicare', 'oral-b',
-                                           'laser hair', 'jewelry polisher'],
-                'Sports & Outdoors': ['sport', 'outdoor', 'camping', 'hiking', 'tent', 'backpack', 'paddle',
-                                     'sup', 'paddleboard', 'volleyball', 'badminton', 'trampoline'],
-                'Toys & Games': ['toy', 'game', 'lego', 'puzzle', 'board game', 'building kit', 'playset'],
-                'Health & Wellness': ['vitamin', 'supplement', 'health', 'wellness', 'fitness', 'electrolyte',
-                                     'multivitamin', 'gummy vitamin', 'dna test', '23andme', 'protein'],
-                'Baby & Kids': ['car seat', 'booster seat', 'booster', 'baby', 'infant', 'toddler', 'stroller', 'diaper'],
-                'Automotive': ['truck', 'vehicle', 'automotive', 'auto tire', 'auto oil', 'car tire', 'car oil'],
-                'Services': ['hire', 'service', 'arborist']
-            }
-            
-            categories = defaultdict(float)
-            cursor.execute('''
-                SELECT product_name, SUM(total_owed) as spending
-                FROM retail_orders
-                WHERE order_status != 'Cancelled'
-                  AND total_owed IS NOT NULL
-                  AND total_owed > 0
-                  AND product_name IS NOT NULL
-                GROUP BY product_name
-            ''')
+        with self._cursor(cursor) as cursor:
             
-            category_order = [
-                'Baby & Kids', 'Pet Supplies', 'Mobile Devices', 'Photography', 'Gaming', 
-                'Fitness Equipment', 'Tools & Garden', 'Food & Groceries', 'Services', 'Automotive',
-                'Electronics', 'Home & Kitchen', 'Clothing', 'Beauty & Personal Care',
-                'Sports & Outdoors', 'Toys & Games', 'Health & Wellness', 'Books & Media'
-            ]
-            
-            for row in cursor.fetchall():
-                product_name = (row['product_name'] or '').lower()
-                category_found = False
-                
-                for category in category_order:
-                    if category in category_keywords:
-                        keywords = category_keywords[category]
-                        if any(keyword in product_name for keyword in keywords):
-                            categories[category] += float(row['spending'] or 0)
-                            category_found = True
-                            break
-                
-                if not category_found:
-                    for category, keywords in category_keywords.items():
-                        if category not in category_order:
-                            if any(keyword in product_name for keyword in keywords):
-                                categories[category] += float(row['spending'] or 0)
-                                category_found = True
-                                break
-                
-                if not category_found:
-                    categories['Other'] += float(row['spending'] or 0)
-            
-            breakdown['categories'] = [{'name': k, 'spending': v} for k, v in sorted(categories.items(), key=lambda x: x[1], reverse=True)]
+            # Categories, classified once per row at import time
+            if self._rollups_ready(cursor):
+                cursor.execute('''
+                    SELECT category, SUM(spending) as spending
+                    FROM monthly_rollup
+                    WHERE channel = 'retail'
+                      AND status != 'Cancelled'
+                      AND category IS NOT NULL
+                    GROUP BY category
+                    ORDER BY spending DESC
+                ''')
+            else:
+                cursor.execute('''
+                    SELECT category, SUM(total_owed) as spending
+                    FROM retail_orders
+                    WHERE order_status != 'Cancelled'
+                      AND total_owed IS NOT NULL
+                      AND total_owed > 0
+                      AND product_name IS NOT NULL
+                    GROUP BY category
+                    ORDER BY spending DESC
+                ''')
+            breakdown['categories'] = [{'name': row['category'], 'spending': float(row['spending'] or 0)}
+                                       for row in cursor.fetchall()]
             
             # Top products
-            cursor.execute('''
-                SELECT 
-                    product_name as name,
-                    SUM(quantity) as total_quantity,
-                    SUM(total_owed) as total_spending,
-                    COUNT(DISTINCT order_id) as order_count
-                FROM retail_orders
-                WHERE order_status != 'Cancelled'
-                  AND total_owed IS NOT NULL
-                  AND total_owed > 0
-                  AND product_name IS NOT NULL
-                GROUP BY product_name
-                ORDER BY total_spending DESC
-                LIMIT 15
-            ''')
-            
-            for row in cursor.fetchall():
-                breakdown['topProducts'].append({
-                    'name': row['name'] or 'Unknown',
-                    'quantity': row['total_quantity'] or 0,
-                    'spending': float(row['total_spending'] or 0),
-                    'orders': row['order_count'] or 0
-                })
+            breakdown['topProducts'] = self._top_product_rows(cursor, 'retail', 15)
             
             # Spending over time (monthly)
-            cursor.execute('''
-                SELECT 
-                    strftime('%Y-%m', order_date) as period,
-                    SUM(total_owed) as spending
-                FROM retail_orders
-                WHERE order_status != 'Cancelled'
-                  AND total_owed IS NOT NULL
-                  AND total_owed > 0
-                  AND order_date IS NOT NULL
-                GROUP BY period
-                ORDER BY period
-            ''')
+            if self._rollups_ready(cursor):
+                rows = self._rollup_periods(cursor, 'retail', 'month')
+            else:
+                cursor.execute('''
+                    SELECT 
+                        printf('%04d-%02d', order_month / 100, order_month % 100) as period,
+                        SUM(total_owed) as spending
+                    FROM retail_orders
+                    WHERE order_status != 'Cancelled'
+                      AND total_owed IS NOT NULL
+                      AND total_owed > 0
+                      AND order_month IS NOT NULL
+                    GROUP BY order_month
+                    ORDER BY order_month
+                ''')
+                rows = cursor.fetchall()
             
-            for row in cursor.fetchall():
+            for row in rows:
                 breakdown['spendingOverTime']['labels'].append(row['period'])
                 breakdown['spendingOverTime']['values'].append(float(row['spending'] or 0))
             
             # Payment methods
-            cursor.execute('''
-                SELECT 
-                    payment_instrument_type as method,
-                    SUM(total_owed) as spending
-                FROM retail_orders
-                WHERE order_status != 'Cancelled'
-                  AND total_owed IS NOT NULL
-                  AND total_owed > 0
-                  AND payment_instrument_type IS NOT NULL
-                GROUP BY payment_instrument_type
-                ORDER BY spending DESC
-            ''')
+            if self._rollups_ready(cursor):
+                cursor.execute('''
+                    SELECT 
+                        payment_method as method,
+                        SUM(spending) as spending
+                    FROM monthly_rollup
+                    WHERE channel = 'retail'
+                      AND status != 'Cancelled'
+                      AND payment_method IS NOT NULL
+                    GROUP BY payment_method
+                    ORDER BY spending DESC
+                ''')
+            else:
+                cursor.execute('''
+                    SELECT 
+                        payment_instrument_type as method,
+                        SUM(total_owed) as spending
+                    FROM retail_orders
+                    WHERE order_status != 'Cancelled'
+                      AND total_owed IS NOT NULL
+                      AND total_owed > 0
+                      AND payment_instrument_type IS NOT NULL
+                    GROUP BY payment_instrument_type
+                    ORDER BY spending DESC
+                ''')
             
             for row in cursor.fetchall():
                 breakdown['paymentMethods'].append({
@@ -588,7 +684,7 @@ class DataProcessor:
         
         return breakdown
     
-    def get_digital_breakdown(self):
+    def get_digital_breakdown(self, cursor=None):
         """Get digital-specific breakdowns"""
         breakdown = {
             'categories': [],
@@ -597,90 +693,52 @@ class DataProcessor:
             'subscriptions': []
         }
         
-        with get_db() as conn:
-            cursor = conn.cursor()
+        with self._cursor(cursor) as cursor:
             
-            # Digital categories
-            digital_categories = defaultdict(float)
-            cursor.execute('''
-                SELECT product_name, SUM(our_price) as spending, subscription_order_info
-                FROM digital_items
-                WHERE our_price IS NOT NULL
-                  AND our_price > 0
-                  AND product_name IS NOT NULL
-                GROUP BY product_name, subscription_order_info
-            ''')
-            
-            for row in cursor.fetchall():
-                product_name = (row['product_name'] or '').lower()
-                subscription_info = row['subscription_order_info'] or ''
-                spending = float(row['spending'] or 0)
-                
-                # Categorize digital items
-                if 'subscription' in subscription_info.lower() or 'subscription' in product_name:
-                    if 'prime' in product_name:
-                        digital_categories['Prime Membership'] += spending
-                    elif 'paramount' in product_name or 'paramount+' in product_name:
-                        digital_categories['Paramount+'] += spending
-                    elif 'stacktv' in product_name or 'stack tv' in product_name:
-                        digital_categories['STACK TV'] += spending
-                    elif 'video' in product_name or 'streaming' in product_name:
-                        digital_categories['Video Streaming'] += spending
-                    else:
-                        digital_categories['Other Subscriptions'] += spending
-                elif 'movie' in product_name or 'film' in product_name:
-                    digital_categories['Movies'] += spending
-                elif 'book' in product_name or 'kindle' in product_name:
-                    digital_categories['Books & eBooks'] += spending
-                elif 'music' in product_name or 'song' in product_name or 'album' in product_name:
-                    digital_categories['Music'] += spending
-                elif 'app' in product_name or 'software' in product_name:
-                    digital_categories['Apps & Software'] += spending
-                elif 'game' in product_name:
-                    digital_categories['Games'] += spending
-                else:
-                    digital_categories['Other Digital'] += spending
-            
-            breakdown['categories'] = [{'name': k, 'spending': v} for k, v in sorted(digital_categories.items(), key=lambda x: x[1], reverse=True)]
+            # Digital categories, classified once per row at import time
+            if self._rollups_ready(cursor):
+                cursor.execute('''
+                    SELECT category, SUM(spending) as spending
+                    FROM monthly_rollup
+                    WHERE channel = 'digital'
+                      AND category IS NOT NULL
+                    GROUP BY category
+                    ORDER BY spending DESC
+                ''')
+            else:
+                cursor.execute('''
+                    SELECT category, SUM(our_price) as spending
+                    FROM digital_items
+                    WHERE our_price IS NOT NULL
+                      AND our_price > 0
+                      AND product_name IS NOT NULL
+                    GROUP BY category
+                    ORDER BY spending DESC
+                ''')
+            breakdown['categories'] = [{'name': row['category'], 'spending': float(row['spending'] or 0)}
+                                       for row in cursor.fetchall()]
             
             # Top products
-            cursor.execute('''
-                SELECT 
-                    product_name as name,
-                    SUM(quantity_ordered) as total_quantity,
-                    SUM(our_price) as total_spending,
-                    COUNT(DISTINCT order_id) as order_count
-                FROM digital_items
-                WHERE our_price IS NOT NULL
-                  AND our_price > 0
-                  AND product_name IS NOT NULL
-                GROUP BY product_name
-                ORDER BY total_spending DESC
-                LIMIT 15
-            ''')
-            
-            for row in cursor.fetchall():
-                breakdown['topProducts'].append({
-                    'name': row['name'] or 'Unknown',
-                    'quantity': row['total_quantity'] or 0,
-                    'spending': float(row['total_spending'] or 0),
-                    'orders': row['order_count'] or 0
-                })
+            breakdown['topProducts'] = self._top_product_rows(cursor, 'digital', 15)
             
             # Spending over time (monthly)
-            cursor.execute('''
-                SELECT 
-                    strftime('%Y-%m', order_date) as period,
-                    SUM(our_price) as spending
-                FROM digital_items
-                WHERE our_price IS NOT NULL
-                  AND our_price > 0
-                  AND order_date IS NOT NULL
-                GROUP BY period
-                ORDER BY period
-            ''')
+            if self._rollups_ready(cursor):
+                rows = self._rollup_periods(cursor, 'digital', 'month')
+            else:
+                cursor.execute('''
+                    SELECT 
+                        printf('%04d-%02d', order_month / 100, order_month % 100) as period,
+                        SUM(our_price) as spending
+                    FROM digital_items
+                    WHERE our_price IS NOT NULL
+                      AND our_price > 0
+                      AND order_month IS NOT NULL
+                    GROUP BY order_month
+                    ORDER BY order_month
+                ''')
+                rows = cursor.fetchall()
             
-            for row in cursor.fetchall():
+            for row in rows:
                 breakdown['spendingOverTime']['labels'].append(row['period'])
                 breakdown['spendingOverTime']['values'].append(float(row['spending'] or 0))
             
@@ -711,141 +769,195 @@ class DataProcessor:
         
         return breakdown
     
-    def get_orders_by_category(self, category, min_price=None, max_price=None, start_date=None, end_date=None, page=1, limit=100, sort_by='order_date', sort_order='desc'):
-        """Get orders filtered by category with price and date filters"""
-        orders = []
+    def _dashboard_batch(self, sections, period):
+        """Some dashboard sections from one connection, sharing the rollup reads they have in common"""
+        with get_read_db() as conn:
+            cursor = conn.cursor(SharedCursor)
+            compute = {
+                'summary': lambda: self.get_summary(cursor),
+                'spendingOverTime': lambda: self.get_spending_over_time(period, cursor),
+                'returns': lambda: self.get_return_stats(cursor),
+                'digitalVsRetail': lambda: self.get_digital_vs_retail(cursor),
+                'retailBreakdown': lambda: self.get_retail_breakdown(cursor),
+                'digitalBreakdown': lambda: self.get_digital_breakdown(cursor),
+            }
+            return {section: compute[section]() for section in sections}
+    
+    def get_dashboard(self, period='monthly'):
+        """Every dashboard payload, with the batches in DASHBOARD_BATCHES queried concurrently"""
+        futures = [dashboard_pool.submit(self._dashboard_batch, sections, period) for sections in DASHBOARD_BATCHES]
+        dashboard = {}
+        for future in futures:
+            dashboard.update(future.result())
+        return dashboard
+    
+    def _retail_order_filters(self, category, min_price, max_price, start_date, end_date):
+        """WHERE clause and parameters for the retail order filters"""
+        where_conditions = [
+            "order_status != 'Cancelled'",
+            "total_owed IS NOT NULL",
+            "total_owed > 0",
+            "product_name IS NOT NULL"
+        ]
         
-        # Map category to keywords
-        category_keywords = {
-            'Electronics': ['battery', 'charger', 'headphone', 'earbud', 'cable', 'wireless', 'led', 'display', 'screen', 
-                           'monitor', 'keyboard', 'mouse', 'router', 'wifi', 'ethernet', 'speaker', 'amplifier', 
-                           'kindle', 'e-reader', 'chromebook', 'laptop', 'computer', 'hard drive', 'external drive',
-                           'smart lock', 'smart home', 'security camera', 'nvr', 'camera system'],
-            'Mobile Devices': ['iphone', 'ipad', 'smartphone', 'tablet', 'apple watch', 'smartwatch', 
-                              'smart watch', 'huawei watch', 'samsung phone', 'google pixel', 'oura ring'],
-            'Photography': ['lens', 'canon ef', 'canon ef-', 'canon ef-m', 'sigma', 'photography', 
-                           'dslr', 'mirrorless', 'camcorder', 'vixia', 'powershot', 'eos', 
-                           'viewfinder', 'camera lens'],
-            'Gaming': ['playstation', 'nintendo', 'xbox', 'switch', 'ps4', 'ps5', 'wii', 'game console', 
-                      'gamepad', 'controller', 'video game', 'gaming'],
-            'Clothing': ['shirt', 'jacket', 'hoodie', 'pants', 'dress', 'shoes', 'socks', 'clothing', 'apparel',
-                        'slipper', 'boot', 'sunglasses', 'glasses', 'rain jacket', 'raincoat'],
-            'Home & Kitchen': ['cabinet', 'organizer', 'storage', 'container', 'mattress', 'bedding', 
-                              'curtain', 'drape', 'coffee maker', 'coffee brewer', 'nespresso', 
-                              'moccamaster', 'blender', 'vitamix', 'pasta maker', 'smoker', 
-                              'air conditioner', 'vacuum', 'roomba', 'dyson', 'air purifier', 
-                              'hepa', 'popcorn machine', 'aerogarden', 'chicken coop door'],
-            'Tools & Garden': ['lawn mower', 'lawn sweepr', 'string trimmer', 'chipper', 'shredder', 
-                              'fence', 'mesh', 'generator', 'tool', 'garden', 'yard', 'landscaping', 
-                              'arborist', 'utility cart', 'garden cart'],
-            'Pet Supplies': ['dog food', 'cat food', 'pet food', 'chicken feed', 'layer pellets', 'layer pellet',
-                            'mixed grains scratch', 'goat feed', 'goat snax', 'pet treat', 'bully stick', 
-                            'dog chew', 'dog treat', 'animal feed', 'feed for', 'dog chews'],
-            'Food & Groceries': ['pancake mix', 'food', 'grocery', 'ingredient', 'spice', 'seasoning'],
-            'Fitness Equipment': ['elliptical', 'treadmill', 'walking pad', 'exercise', 'fitness', 'gym',
-                                 'weights', 'yoga', 'workout', 'dumbbell'],
-            'Beauty & Personal Care': ['makeup', 'cosmetic', 'beauty', 'skincare', 'shampoo', 'soap',
-                                       'hair mask', 'hair growth', 'toothbrush', 'sonicare', 'oral-b',
-                                       'laser hair', 'jewelry polisher'],
-            'Sports & Outdoors': ['sport', 'outdoor', 'camping', 'hiking', 'tent', 'backpack', 'paddle',
-                                 'sup', 'paddleboard', 'volleyball', 'badminton', 'trampoline'],
-            'Toys & Games': ['toy', 'game', 'lego', 'puzzle', 'board game', 'building kit', 'playset'],
-            'Health & Wellness': ['vitamin', 'supplement', 'health', 'wellness', 'fitness', 'electrolyte',
-                                 'multivitamin', 'gummy vitamin', 'dna test', '23andme', 'protein'],
-            'Baby & Kids': ['car seat', 'booster seat', 'booster', 'baby', 'infant', 'toddler', 'stroller', 'diaper'],
-            'Automotive': ['truck', 'vehicle', 'automotive', 'auto tire', 'auto oil', 'car tire', 'car oil'],
-            'Services': ['hire', 'service', 'arborist']
-        }
+        # Category filter, matching the category stored at import time
+        query_params = []
+        if category in RETAIL_CATEGORIES:
+            where_conditions.append("category = ?")
+            query_params.append(category)
         
-        keywords = category_keywords.get(category, [])
+        # Price filters
+        if min_price is not None:
+            where_conditions.append("total_owed >= ?")
+            query_params.append(float(min_price))
+        if max_price is not None:
+            where_conditions.append("total_owed <= ?")
+            query_params.append(float(max_price))
         
-        with get_db() as conn:
+        # Date filters
+        if start_date:
+            where_conditions.append("order_date >= ?")
+            query_params.append(start_date)
+        if end_date:
+            where_conditions.append("order_date <= ?")
+            query_params.append(end_date)
+        
+        return " AND ".join(where_conditions), query_params
+    
+    def _retail_order(self, row):
+        """API representation of a retail order row"""
+        return {
+            'orderId': row['order_id'] or '',
+            'date': row['order_date'] or '',
+            'productName': row['product_name'] or '',
+            'total': float(row['total_owed'] or 0),
+            'quantity': row['quantity'] or 0,
+            'status': row['order_status'] or '',
+            'paymentMethod': row['payment_instrument_type'] or '',
+            'asin': row['asin'] or '',
+        }
+    
+    def get_orders_by_category(self, category, min_price=None, max_price=None, start_date=None, end_date=None, page=1, limit=100, sort_by='order_date', sort_order='desc', page_token=None):
+        """Get orders filtered by category with price and date filters"""
+        where_clause, query_params = self._retail_order_filters(category, min_price, max_price, start_date, end_date)
+        sort_column = RETAIL_SORT_COLUMNS.get(sort_by, 'order_date')
+        sort_dir = 'DESC' if sort_order == 'desc' else 'ASC'
+        
+        with get_read_db() as conn:
             cursor = conn.cursor()
             
-            # Build WHERE clause
-            where_conditions = [
-                "order_status != 'Cancelled'",
-                "total_owed IS NOT NULL",
-                "total_owed > 0",
-                "product_name IS NOT NULL"
-            ]
-            
-            # Category filter - build LIKE conditions for keywords
-            query_params = []
-            if keywords:
-                # Build parameterized query for keywords
-                keyword_placeholders = " OR ".join([f"LOWER(product_name) LIKE ?" for _ in keywords])
-                where_conditions.append(f"({keyword_placeholders})")
-                query_params.extend([f"%{keyword}%" for keyword in keywords])
-            elif category == 'Other':
-                # For "Other", exclude all known categories
-                all_keywords = []
-                for cats in category_keywords.values():
-                    all_keywords.extend(cats)
-                keyword_placeholders = " AND ".join([f"LOWER(product_name) NOT LIKE ?" for _ in all_keywords])
-                where_conditions.append(f"({keyword_placeholders})")
-                query_params.extend([f"%{keyword}%" for keyword in all_keywords])
-            
-            # Price filters
-            if min_price is not None:
-                where_conditions.append("total_owed >= ?")
-                query_params.append(float(min_price))
-            if max_price is not None:
-                where_conditions.append("total_owed <= ?")
-                query_params.append(float(max_price))
-            
-            # Date filters
-            if start_date:
-                where_conditions.append("order_date >= ?")
-                query_params.append(start_date)
-            if end_date:
-                where_conditions.append("order_date <= ?")
-                query_params.append(end_date)
-            
-            where_clause = " AND ".join(where_conditions)
-            
-            # Sort column mapping
-            sort_column_map = {
-                'order_date': 'order_date',
-                'product_name': 'product_name',
-                'total_owed': 'total_owed',
-                'quantity': 'quantity',
-                'order_id': 'order_id'
-            }
-            sort_column = sort_column_map.get(sort_by, 'order_date')
-            sort_dir = 'DESC' if sort_order == 'desc' else 'ASC'
-            
             # Get total count
-            cursor.execute(f'''
-                SELECT COUNT(*) as count
-                FROM retail_orders
-                WHERE {where_clause}
-            ''', query_params)
-            total = cursor.fetchone()['count']
+            total = self._filtered_count(cursor, 'retail_orders', where_clause, query_params)
             
             # Get paginated orders
-            offset = (page - 1) * limit
-            # Note: sort_column and sort_dir are safe because they're validated against a whitelist
-            cursor.execute(f'''
-                SELECT 
-                    order_id, order_date, product_name, total_owed, quantity,
-                    order_status, payment_instrument_type, asin
-                FROM retail_orders
-                WHERE {where_clause}
-                ORDER BY {sort_column} {sort_dir}
-                LIMIT ? OFFSET ?
-            ''', query_params + [limit, offset])
-            
-            for row in cursor.fetchall():
+            rows, next_token = self._fetch_page(
+                cursor, 'retail_orders', RETAIL_ORDER_COLUMNS,
+                where_clause, query_params, sort_column, sort_dir, page, limit, page_token
+            )
+            orders = [self._retail_order(row) for row in rows]
+        
+        return {
+            'orders': orders,
+            'total': total,
+            'page': page,
+            'limit': limit,
+            'totalPages': (total + limit - 1) // limit,
+            'nextCursor': next_token,
+        }
+    
+    def export_orders(self, category, min_price=None, max_price=None, start_date=None, end_date=None, sort_by='order_date', sort_order='desc'):
+        """Every retail order matching the filters, as a generator of order dicts"""
+        where_clause, query_params = self._retail_order_filters(category, min_price, max_price, start_date, end_date)
+        sort_column = RETAIL_SORT_COLUMNS.get(sort_by, 'order_date')
+        sort_dir = 'DESC' if sort_order == 'desc' else 'ASC'
+        return self._stream_rows('retail_orders', RETAIL_ORDER_COLUMNS, where_clause, query_params,
+                                 sort_column, sort_dir, self._retail_order)
+    
+    def search_orders(self, text, channel='all', min_price=None, max_price=None, start_date=None, end_date=None, page=1, limit=100, sort_by='relevance', sort_order='desc', page_token=None):
+        """Search retail and digital line items by product name, best matches first by default"""
+        orders = []
+        
+        # Each channel's counted line items whose product name matched; ids
+        # are made unique across the two tables for keyset paging
+        branches = {
+            'retail': f'''
+                SELECT r.id * 2 as id, 'retail' as channel, m.score, r.order_id, r.order_date, r.product_name,
+                       r.total_owed as total, r.quantity, r.order_status as status,
+                       r.payment_instrument_type as payment_method, r.asin, NULL as subscription_info
+                FROM matches m JOIN retail_orders r ON r.product_name = m.product_name
+                WHERE m.channel = 'retail' AND {VALID_RETAIL_ORDER}
+            ''',
+            'digital': f'''
+                SELECT d.id * 2 + 1 as id, 'digital' as channel, m.score, d.order_id, d.order_date, d.product_name,
+                       d.our_price as total, d.quantity_ordered as quantity, 'Completed' as status,
+                       'Digital Purchase' as payment_method, NULL as asin, d.subscription_order_info as subscription_info
+                FROM matches m JOIN digital_items d ON d.product_name = m.product_name
+                WHERE m.channel = 'digital' AND {VALID_DIGITAL_ITEM}
+            ''',
+        }
+        if channel in branches:
+            branches = {channel: branches[channel]}
+        # bm25() is lower for better matches; negate it so DESC means most relevant first
+        source = f'''(
+            WITH matches AS (
+                SELECT product_name, channel, -bm25(product_search) as score
+                FROM product_search
+                WHERE product_search MATCH ?
+            )
+            {' UNION ALL '.join(branches.values())}
+        )'''
+        
+        where_conditions = ["1"]
+        query_params = [fts_query(text)]
+        if min_price is not None:
+            where_conditions.append("total >= ?")
+            query_params.append(float(min_price))
+        if max_price is not None:
+            where_conditions.append("total <= ?")
+            query_params.append(float(max_price))
+        if start_date:
+            where_conditions.append("order_date >= ?")
+            query_params.append(start_date)
+        if end_date:
+            where_conditions.append("order_date <= ?")
+            query_params.append(end_date)
+        where_clause = " AND ".join(where_conditions)
+        
+        sort_column_map = {
+            'relevance': 'score',
+            'order_date': 'order_date',
+            'product_name': 'product_name',
+            'total': 'total',
+            'total_owed': 'total',
+            'our_price': 'total',
+            'quantity': 'quantity',
+            'order_id': 'order_id'
+        }
+        sort_column = sort_column_map.get(sort_by, 'score')
+        sort_dir = 'DESC' if sort_order == 'desc' else 'ASC'
+        
+        with get_read_db() as conn:
+            cursor = conn.cursor()
+            total = self._filtered_count(cursor, source, where_clause, query_params)
+            rows, next_token = self._fetch_page(
+                cursor, source,
+                'channel, order_id, order_date, product_name, total, quantity, status, payment_method, '
+                'asin, subscription_info',
+                where_clause, query_params, sort_column, sort_dir, page, limit, page_token
+            )
+            
+            for row in rows:
                 orders.append({
+                    'channel': row['channel'],
                     'orderId': row['order_id'] or '',
                     'date': row['order_date'] or '',
                     'productName': row['product_name'] or '',
-                    'total': float(row['total_owed'] or 0),
+                    'total': float(row['total'] or 0),
                     'quantity': row['quantity'] or 0,
-                    'status': row['order_status'] or '',
-                    'paymentMethod': row['payment_instrument_type'] or '',
+                    'status': row['status'] or '',
+                    'paymentMethod': row['payment_method'] or '',
                     'asin': row['asin'] or '',
+                    'subscriptionInfo': row['subscription_info'] or '',
                 })
         
         return {
@@ -853,5 +965,6 @@ class DataProcessor:
             'total': total,
             'page': page,
             'limit': limit,
-            'totalPages': (total + limit - 1) // limit
+            'totalPages': (total + limit - 1) // limit,
+            'nextCursor': next_token,
         }
@@ -1,13 +1,194 @@
 import sqlite3
 import os
+import queue
+import threading
 from contextlib import contextmanager
+from urllib.parse import quote
+from categories import classify_retail_many, classify_digital_many
+from profiling import ProfiledConnection
 
 DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'amazon_data.db')
 
+# Line items the dashboard counts. Partial indexes below are built on exactly
+# these predicates, and SQLite only uses them for queries that repeat every term.
+VALID_RETAIL_ORDER = "order_status != 'Cancelled' AND total_owed IS NOT NULL AND total_owed > 0"
+VALID_DIGITAL_ITEM = "our_price IS NOT NULL AND our_price > 0"
+
+# Secondary indexes, keyed by name: (table, column list) or, for partial indexes,
+# (table, column list, WHERE predicate). Kept in one place so the bulk importer
+# can drop them before a load and rebuild them afterwards.
+INDEXES = {
+    'idx_retail_orders_order_id': ('retail_orders', '(order_id)'),
+    'idx_retail_orders_order_date': ('retail_orders', '(order_date)'),
+    'idx_retail_orders_order_status': ('retail_orders', '(order_status)'),
+    'idx_retail_orders_natural_key': ('retail_orders', '(order_id, asin)'),
+    'idx_retail_orders_order_month': ('retail_orders', '(order_month)'),
+    'idx_retail_orders_order_year': ('retail_orders', '(order_year)'),
+    'idx_retail_orders_order_day': ('retail_orders', '(order_day)'),
+    'idx_retail_orders_category': ('retail_orders', '(category, order_date)'),
+    'idx_digital_items_order_id': ('digital_items', '(order_id)'),
+    'idx_digital_items_order_date': ('digital_items', '(order_date)'),
+    'idx_digital_items_natural_key': ('digital_items', '(digital_order_item_id)'),
+    'idx_digital_items_order_month': ('digital_items', '(order_month)'),
+    'idx_digital_items_order_year': ('digital_items', '(order_year)'),
+    'idx_digital_items_order_day': ('digital_items', '(order_day)'),
+    'idx_digital_items_category': ('digital_items', '(category, order_date)'),
+    'idx_returns_order_id': ('returns', '(order_id)'),
+    'idx_returns_return_creation_date': ('returns', '(return_creation_date)'),
+    'idx_returns_natural_key': ('returns', '(return_authorization_id)'),
+    'idx_returns_return_month': ('returns', '(return_month)'),
+    # Covering indexes over the counted rows only, so the hot aggregations
+    # read a narrow index instead of the table. order_status is carried along
+    # because SQLite only treats an index as covering if it holds every column
+    # the query mentions, including those in the predicate.
+    'idx_retail_valid_order_date': ('retail_orders', '(order_date, total_owed, order_id, order_status)',
+                                    VALID_RETAIL_ORDER),
+    'idx_retail_valid_order_month': ('retail_orders', '(order_month, total_owed, order_id, order_status)',
+                                     VALID_RETAIL_ORDER),
+    'idx_retail_valid_product_id': ('retail_orders', '(product_id, quantity, total_owed, order_id, order_status)',
+                                    VALID_RETAIL_ORDER),
+    'idx_retail_valid_payment': ('retail_orders', '(payment_instrument_type, total_owed, order_status)',
+                                 VALID_RETAIL_ORDER),
+    'idx_digital_valid_order_month': ('digital_items', '(order_month, our_price, order_id)', VALID_DIGITAL_ITEM),
+    'idx_digital_valid_product_id': ('digital_items', '(product_id, quantity_ordered, our_price, order_id)',
+                                     VALID_DIGITAL_ITEM),
+    # Product search joins its FTS matches back to the counted line items by name
+    'idx_retail_valid_product_name': ('retail_orders', '(product_name)', VALID_RETAIL_ORDER),
+    'idx_digital_valid_product_name': ('digital_items', '(product_name)', VALID_DIGITAL_ITEM),
+}
+
+# Indexes replaced by newer ones, dropped from existing databases by init_database
+OBSOLETE_INDEXES = ['idx_retail_valid_product', 'idx_digital_valid_product']
+
+# Representative dashboard queries and the covering index each one should be
+# served from, checked with EXPLAIN QUERY PLAN by `python database.py --check-plans`.
+# A name prefix accepts any matching index, for whole-table aggregates the
+# planner may answer from whichever covering index is narrowest.
+PLAN_CHECKS = [
+    ('retail summary', 'idx_retail_valid_order_date', f'''
+        SELECT COUNT(*), SUM(total_owed), MIN(order_date), MAX(order_date)
+        FROM retail_orders WHERE {VALID_RETAIL_ORDER}
+    '''),
+    ('retail orders and spending', 'idx_retail_valid_', f'''
+        SELECT COUNT(DISTINCT order_id), SUM(total_owed) FROM retail_orders WHERE {VALID_RETAIL_ORDER}
+    '''),
+    ('retail spending by month', 'idx_retail_valid_order_month', f'''
+        SELECT order_month, SUM(total_owed), COUNT(DISTINCT order_id) FROM retail_orders
+        WHERE {VALID_RETAIL_ORDER} AND order_month IS NOT NULL
+        GROUP BY order_month ORDER BY order_month
+    '''),
+    ('retail top products', 'idx_retail_valid_product_id', f'''
+        SELECT product_id, SUM(quantity), SUM(total_owed), COUNT(DISTINCT order_id) FROM retail_orders
+        WHERE {VALID_RETAIL_ORDER} AND product_id IS NOT NULL
+        GROUP BY product_id ORDER BY 3 DESC LIMIT 15
+    '''),
+    ('retail payment methods', 'idx_retail_valid_payment', f'''
+        SELECT payment_instrument_type, SUM(total_owed) FROM retail_orders
+        WHERE {VALID_RETAIL_ORDER} AND payment_instrument_type IS NOT NULL
+        GROUP BY payment_instrument_type ORDER BY 2 DESC
+    '''),
+    ('digital summary', 'idx_digital_valid_', f'''
+        SELECT COUNT(*), SUM(our_price) FROM digital_items WHERE {VALID_DIGITAL_ITEM}
+    '''),
+    ('digital spending by month', 'idx_digital_valid_order_month', f'''
+        SELECT order_month, SUM(our_price), COUNT(DISTINCT order_id) FROM digital_items
+        WHERE {VALID_DIGITAL_ITEM} AND order_month IS NOT NULL
+        GROUP BY order_month ORDER BY order_month
+    '''),
+    ('digital top products', 'idx_digital_valid_product_id', f'''
+        SELECT product_id, SUM(quantity_ordered), SUM(our_price), COUNT(DISTINCT order_id) FROM digital_items
+        WHERE {VALID_DIGITAL_ITEM} AND product_id IS NOT NULL
+        GROUP BY product_id ORDER BY 3 DESC LIMIT 15
+    '''),
+]
+
+# Joins that must look rows up through an index rather than scan the table,
+# checked alongside PLAN_CHECKS: (name, index, query)
+JOIN_PLAN_CHECKS = [
+    ('retail search join', 'idx_retail_valid_product_name', f'''
+        WITH matches AS (
+            SELECT product_name, channel FROM product_search WHERE product_search MATCH 'cable'
+        )
+        SELECT r.id, r.order_id, r.total_owed FROM matches m JOIN retail_orders r ON r.product_name = m.product_name
+        WHERE m.channel = 'retail' AND {VALID_RETAIL_ORDER}
+    '''),
+    ('digital search join', 'idx_digital_valid_product_name', f'''
+        WITH matches AS (
+            SELECT product_name, channel FROM product_search WHERE product_search MATCH 'cable'
+        )
+        SELECT d.id, d.order_id, d.our_price FROM matches m JOIN digital_items d ON d.product_name = m.product_name
+        WHERE m.channel = 'digital' AND {VALID_DIGITAL_ITEM}
+    '''),
+]
+
+# Integer date columns parsed from the text timestamps at import time, so
+# time-series queries can group on an indexed column instead of calling
+# strftime() on every row: table -> [(source column, prefix, calendar)].
+# Each source gets <prefix>_day (days since 1970-01-01, UTC); calendar sources
+# also get <prefix>_year (e.g. 2023) and <prefix>_month (e.g. 202305).
+DATE_COLUMNS = {
+    'retail_orders': [('order_date', 'order', True), ('ship_date', 'ship', False)],
+    'digital_items': [('order_date', 'order', True), ('fulfilled_date', 'fulfilled', False)],
+    'returns': [('return_creation_date', 'return', True)],
+}
+
+# Product category computed once per row at import time, so category filters
+# are an indexed equality instead of a chain of LIKE terms:
+# table -> (batch classifier, columns whose value lists are passed to it)
+CATEGORY_COLUMNS = {
+    'retail_orders': (classify_retail_many, ['product_name']),
+    'digital_items': (classify_digital_many, ['product_name', 'subscription_order_info']),
+}
+
+# Line-item tables whose rows reference the products table through product_id,
+# with the channel their products are recorded under
+PRODUCT_TABLES = {
+    'retail_orders': 'retail',
+    'digital_items': 'digital',
+}
+
+# Columns added after the original schema, applied to existing databases by
+# init_database: table -> [(column, type)]
+MIGRATED_COLUMNS = {
+    'retail_orders': [('row_hash', 'INTEGER'), ('order_day', 'INTEGER'), ('order_year', 'INTEGER'),
+                      ('order_month', 'INTEGER'), ('ship_day', 'INTEGER'), ('category', 'TEXT'),
+                      ('product_id', 'INTEGER')],
+    'digital_items': [('row_hash', 'INTEGER'), ('order_day', 'INTEGER'), ('order_year', 'INTEGER'),
+                      ('order_month', 'INTEGER'), ('fulfilled_day', 'INTEGER'), ('category', 'TEXT'),
+                      ('product_id', 'INTEGER')],
+    'returns': [('row_hash', 'INTEGER'), ('return_day', 'INTEGER'), ('return_year', 'INTEGER'),
+                ('return_month', 'INTEGER')],
+    'cart_items': [('row_hash', 'INTEGER')],
+    'monthly_rollup': [('category', 'TEXT')],
+}
+
+# Connection settings used while bulk loading. synchronous=OFF trades durability
+# for speed, which is fine because a failed import is simply re-run.
+IMPORT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'OFF',
+    'cache_size': -262144,  # negative = KiB, i.e. 256 MB
+    'temp_store': 'MEMORY',
+}
+
+# Connection settings for the API's read-only connections. They are pooled and
+# reused across requests, so the page cache and prepared statements stay warm.
+READ_PRAGMAS = {
+    'query_only': 'ON',
+    'cache_size': -65536,  # 64 MB per connection
+    'mmap_size': 268435456,  # read pages straight from a 256 MB mapping
+    'temp_store': 'MEMORY',
+}
+READ_POOL_SIZE = 8
+READ_STATEMENT_CACHE = 256
+
+_read_pools = {}
+_read_pools_lock = threading.Lock()
+
 @contextmanager
-def get_db():
-    """Context manager for database connections"""
-    conn = sqlite3.connect(DATABASE_PATH)
+def get_db(db_path=None):
+    """Context manager for read-write database connections (importer, schema setup)"""
+    conn = sqlite3.connect(db_path or DATABASE_PATH)
     conn.row_factory = sqlite3.Row
     try:
         yield conn
@@ -18,10 +199,243 @@ def get_db():
     finally:
         conn.close()
 
-def init_database():
+def open_read_connection(db_path=None):
+    """Open a read-only connection tuned for the API's queries"""
+    path = os.path.abspath(db_path or DATABASE_PATH)
+    conn = sqlite3.connect(f'file:{quote(path)}?mode=ro', uri=True, check_same_thread=False,
+                           cached_statements=READ_STATEMENT_CACHE, factory=ProfiledConnection)
+    conn.row_factory = sqlite3.Row
+    apply_pragmas(conn, READ_PRAGMAS)
+    return conn
+
+def _file_identity(path):
+    """(device, inode) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+@contextmanager
+def get_read_db(db_path=None):
+    """Context manager lending a pooled read-only connection.
+
+    Connections go back to the pool when the block exits and are never
+    committed. A connection that raised is closed instead, so a broken
+    handle is not handed to the next request, and pooled connections to a
+    database file that has since been deleted or replaced are reopened.
+    """
+    path = db_path or DATABASE_PATH
+    with _read_pools_lock:
+        pool = _read_pools.setdefault(path, queue.LifoQueue(READ_POOL_SIZE))
+    identity = _file_identity(path)
+    conn = None
+    while conn is None:
+        try:
+            conn, opened_identity = pool.get_nowait()
+        except queue.Empty:
+            conn, opened_identity = open_read_connection(path), identity
+        if opened_identity != identity:
+            conn.close()
+            conn = None
+    try:
+        yield conn
+    except Exception:
+        conn.close()
+        raise
+    except GeneratorExit:
+        # A streamed response its client stopped reading; the connection is fine
+        _release(pool, conn, opened_identity)
+        raise
+    _release(pool, conn, opened_identity)
+
+def _release(pool, conn, opened_identity):
+    """Return a read connection to its pool, or close it if the pool is full"""
+    try:
+        pool.put_nowait((conn, opened_identity))
+    except queue.Full:
+        conn.close()
+
+def close_read_connections():
+    """Close every pooled read connection"""
+    with _read_pools_lock:
+        pools = list(_read_pools.values())
+        _read_pools.clear()
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait()[0].close()
+            except queue.Empty:
+                break
+
+def apply_pragmas(conn, pragmas):
+    """Apply a dict of PRAGMA settings to a connection"""
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+def create_indexes(cursor, table=None):
+    """Create secondary indexes, optionally only those on one table"""
+    for name, (index_table, columns, *predicate) in INDEXES.items():
+        if table is None or index_table == table:
+            where = f' WHERE {predicate[0]}' if predicate else ''
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {index_table}{columns}{where}')
+
+def drop_indexes(cursor, table=None):
+    """Drop secondary indexes, optionally only those on one table"""
+    for name, (index_table, *_) in INDEXES.items():
+        if table is None or index_table == table:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+def ensure_columns(cursor, table, columns):
+    """Add any missing columns to an existing table"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    for column, column_type in columns:
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+
+def data_columns(cursor, table):
+    """Columns of a table that come from the source data (everything but id/created_at)"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    return [row[1] for row in cursor.fetchall() if row[1] not in ('id', 'created_at')]
+
+def refresh_date_columns(cursor, table=None):
+    """Fill the integer date columns of rows that were imported without them"""
+    for date_table, dates in DATE_COLUMNS.items():
+        if table is not None and date_table != table:
+            continue
+        for source, prefix, calendar in dates:
+            assignments = [f"{prefix}_day = CAST(julianday(date({source})) - 2440587.5 AS INTEGER)"]
+            if calendar:
+                assignments.append(f"{prefix}_year = CAST(strftime('%Y', {source}) AS INTEGER)")
+                assignments.append(f"{prefix}_month = CAST(strftime('%Y%m', {source}) AS INTEGER)")
+            cursor.execute(f'''
+                UPDATE {date_table} SET {', '.join(assignments)}
+                WHERE {prefix}_day IS NULL AND {source} IS NOT NULL
+            ''')
+
+def refresh_category_columns(cursor, table=None):
+    """Classify rows that were imported without a category.
+
+    Each distinct product is classified once in a single batch; the results
+    are joined back through a temporary lookup table.
+    """
+    for category_table, (classify, sources) in CATEGORY_COLUMNS.items():
+        if table is not None and category_table != table:
+            continue
+        columns = ', '.join(sources)
+        cursor.execute(f'''
+            SELECT DISTINCT {columns} FROM {category_table}
+            WHERE category IS NULL AND product_name IS NOT NULL
+        ''')
+        rows = [tuple(row) for row in cursor.fetchall()]
+        if not rows:
+            continue
+        cursor.execute('DROP TABLE IF EXISTS temp.category_map')
+        cursor.execute(f'CREATE TEMP TABLE category_map ({columns}, category TEXT)')
+        cursor.executemany(f'INSERT INTO temp.category_map VALUES ({", ".join(["?"] * (len(sources) + 1))})',
+                           [row + (category,) for row, category in zip(rows, classify(*zip(*rows)))])
+        cursor.execute(f'CREATE INDEX temp.idx_category_map ON category_map ({columns})')
+        match = ' AND '.join(f'm.{column} IS {category_table}.{column}' for column in sources)
+        cursor.execute(f'''
+            UPDATE {category_table}
+            SET category = (SELECT m.category FROM temp.category_map m WHERE {match})
+            WHERE category IS NULL AND product_name IS NOT NULL
+        ''')
+        cursor.execute('DROP TABLE temp.category_map')
+
+def refresh_product_ids(cursor, table=None):
+    """Record the products of rows that were imported without a product_id and link the rows to them.
+
+    New ASINs are added to products and known ones take the name and category
+    of their newest line item, so product_ids stay stable across imports.
+    Each product keeps the sort key of the line item its name came from, so
+    an incremental import only renames it from a row at least as new, and
+    ends up where a full import of the same files would.
+    Rows without an ASIN share a product per name, recorded with a NULL asin.
+    """
+    for product_table, channel in PRODUCT_TABLES.items():
+        if table is not None and product_table != table:
+            continue
+        # The bare columns come from the row holding the MAX: the newest
+        # line item with a name, or the newest one if none has a name
+        cursor.execute(f'''
+            INSERT INTO products (channel, asin, name, category, newest_item)
+            SELECT ?, asin, product_name, category, newest_item FROM (
+                SELECT asin, product_name, category,
+                       MAX((product_name IS NOT NULL) || COALESCE(order_date, '')) AS newest_item
+                FROM {product_table}
+                WHERE product_id IS NULL AND asin IS NOT NULL
+                GROUP BY asin
+            ) WHERE true
+            ON CONFLICT (channel, asin) DO UPDATE SET
+                name = excluded.name,
+                category = excluded.category,
+                newest_item = excluded.newest_item
+            WHERE excluded.newest_item >= COALESCE(newest_item, '')
+        ''', (channel,))
+        cursor.execute(f'''
+            UPDATE {product_table}
+            SET product_id = (SELECT p.product_id FROM products p
+                              WHERE p.channel = ? AND p.asin = {product_table}.asin)
+            WHERE product_id IS NULL AND asin IS NOT NULL
+        ''', (channel,))
+        cursor.execute(f'''
+            INSERT INTO products (channel, name, category, newest_item)
+            SELECT ?, product_name, category, newest_item FROM (
+                SELECT product_name, category, '1' || MAX(COALESCE(order_date, '')) AS newest_item
+                FROM {product_table}
+                WHERE product_id IS NULL AND asin IS NULL AND product_name IS NOT NULL
+                GROUP BY product_name
+            ) WHERE true
+            ON CONFLICT (channel, name) WHERE asin IS NULL DO UPDATE SET
+                category = excluded.category,
+                newest_item = excluded.newest_item
+            WHERE excluded.newest_item >= COALESCE(newest_item, '')
+        ''', (channel,))
+        cursor.execute(f'''
+            UPDATE {product_table}
+            SET product_id = (SELECT p.product_id FROM products p
+                              WHERE p.channel = ? AND p.asin IS NULL AND p.name = {product_table}.product_name)
+            WHERE product_id IS NULL AND asin IS NULL AND product_name IS NOT NULL
+        ''', (channel,))
+
+def refresh_derived_columns(cursor, table=None):
+    """Fill every import-time derived column that is still empty"""
+    refresh_date_columns(cursor, table)
+    refresh_category_columns(cursor, table)
+    # After the categories, which products copy
+    refresh_product_ids(cursor, table)
+
+def bump_data_generation(cursor):
+    """Mark the imported data as changed"""
+    cursor.execute('''
+        INSERT INTO meta (key, value) VALUES ('data_generation', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    ''')
+
+def read_data_generation(cursor):
+    """Generation number of the imported data, 0 before the first import"""
+    try:
+        cursor.execute("SELECT value FROM meta WHERE key = 'data_generation'")
+    except sqlite3.OperationalError:
+        # Database created before the meta table existed
+        return 0
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def get_data_generation(db_path=None):
+    """Generation number of the imported data, read through the pool"""
+    with get_read_db(db_path) as conn:
+        return read_data_generation(conn.cursor())
+
+def init_database(db_path=None):
     """Initialize database schema"""
-    with get_db() as conn:
+    with get_db(db_path) as conn:
         cursor = conn.cursor()
+        # WAL is persistent in the file and lets the API's read connections
+        # keep serving while the importer writes
+        cursor.execute('PRAGMA journal_mode = WAL')
         
         # Retail Orders table
         cursor.execute('''
@@ -55,6 +469,13 @@ def init_database():
                 gift_sender_name TEXT,
                 gift_recipient_contact TEXT,
                 item_serial_number TEXT,
+                row_hash INTEGER,
+                order_day INTEGER,
+                order_year INTEGER,
+                order_month INTEGER,
+                ship_day INTEGER,
+                category TEXT,
+                product_id INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
@@ -76,6 +497,13 @@ def init_database():
                 seller_of_record TEXT,
                 gift_item TEXT,
                 subscription_order_info TEXT,
+                row_hash INTEGER,
+                order_day INTEGER,
+                order_year INTEGER,
+                order_month INTEGER,
+                fulfilled_day INTEGER,
+                category TEXT,
+                product_id INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
@@ -90,6 +518,10 @@ def init_database():
                 order_id TEXT,
                 return_ship_option TEXT,
                 carrier_package_id TEXT,
+                row_hash INTEGER,
+                return_day INTEGER,
+                return_year INTEGER,
+                return_month INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
@@ -110,21 +542,175 @@ def init_database():
                 prime_subscription TEXT,
                 pantry TEXT,
                 add_on TEXT,
+                row_hash INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
+        # Product dimension: one row per channel and ASIN, named after the
+        # newest line item, plus one per channel and name for line items
+        # without an ASIN (asin NULL). Line items reference it through
+        # product_id, so product aggregates group on integers instead of names.
+        # newest_item is the sort key of the line item the name and category
+        # came from: '1' if it has a name, then its order date.
+        cursor.execute('PRAGMA table_info(products)')
+        columns = {row[1]: row[3] for row in cursor.fetchall()}
+        if columns and (columns['asin'] or 'newest_item' not in columns):
+            # Created when every product needed an ASIN, or before products
+            # recorded where their name came from; relinked from scratch
+            cursor.execute('DROP TABLE products')
+            for product_table in PRODUCT_TABLES:
+                cursor.execute(f'UPDATE {product_table} SET product_id = NULL')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS products (
+                product_id INTEGER PRIMARY KEY,
+                channel TEXT NOT NULL,
+                asin TEXT,
+                name TEXT,
+                category TEXT,
+                newest_item TEXT,
+                UNIQUE (channel, asin)
+            )
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_products_name_without_asin ON products (channel, name)
+            WHERE asin IS NULL
+        ''')
+        
+        # Source file fingerprints, used by the incremental importer to skip
+        # files that have not changed since the last import
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS source_files (
+                path TEXT PRIMARY KEY,
+                dataset TEXT,
+                content_hash TEXT,
+                row_count INTEGER,
+                imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Rollups rebuilt by the importer after every load so the dashboard does
+        # not re-aggregate the line-item tables on every request.
+        # period_rollup: exact totals per channel (retail/digital/returns) and
+        # period, where grain is 'month' (period '2023-05'), 'year' ('2023') or
+        # 'all' ('all'). Only rows the dashboard counts are included. The 'all'
+        # rows take their order counts from the orders table; for 'returns',
+        # orders is the number of retail orders with at least one return.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS period_rollup (
+                channel TEXT,
+                grain TEXT,
+                period TEXT,
+                spending REAL,
+                items INTEGER,
+                orders INTEGER,
+                first_date TEXT,
+                last_date TEXT,
+                PRIMARY KEY (channel, grain, period)
+            )
+        ''')
+        
+        # monthly_rollup: additive spend/item counts per month, category,
+        # payment method and status. orders is distinct within a cell only, so it must not be summed.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS monthly_rollup (
+                channel TEXT,
+                month INTEGER,
+                category TEXT,
+                payment_method TEXT,
+                status TEXT,
+                spending REAL,
+                items INTEGER,
+                orders INTEGER
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_monthly_rollup_channel_month ON monthly_rollup(channel, month)')
+        
+        # daily_rollup: the daily cube behind the spending series, one row per
+        # day (days since 1970-01-01) with both channels side by side. Each
+        # order is counted once, on the day of its first counted item, so
+        # orders can be summed into any coarser period.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_rollup (
+                day INTEGER PRIMARY KEY,
+                retail_spending REAL NOT NULL DEFAULT 0,
+                retail_items INTEGER NOT NULL DEFAULT 0,
+                retail_orders INTEGER NOT NULL DEFAULT 0,
+                digital_spending REAL NOT NULL DEFAULT 0,
+                digital_items INTEGER NOT NULL DEFAULT 0,
+                digital_orders INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # orders: order-level fact table rebuilt by the importer, one row per
+        # order with at least one counted line item. total and items cover the
+        # counted items only, order_date/order_day are those of the first one,
+        # and returned is 1 if the returns export lists the order. Clustered on
+        # (channel, order_id), so per-channel aggregates read one contiguous range.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS orders (
+                channel TEXT NOT NULL,
+                order_id TEXT NOT NULL,
+                order_date TEXT,
+                order_day INTEGER,
+                total REAL NOT NULL,
+                items INTEGER NOT NULL,
+                status TEXT,
+                payment_method TEXT,
+                returned INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (channel, order_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Full-text index over distinct product names, one row per channel and
+        # name; rebuilt by the importer, see search.py
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+                product_name,
+                channel UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        ''')
+        
+        # Import bookkeeping; data_generation is bumped by every import so API
+        # response caches know when their entries are stale
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            )
+        ''')
+        
+        for table, columns in MIGRATED_COLUMNS.items():
+            ensure_columns(cursor, table, columns)
+        # Backfill rows loaded before the derived columns existed
+        refresh_derived_columns(cursor)
+        
         # Create indexes for better query performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_retail_orders_order_id ON retail_orders(order_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_retail_orders_order_date ON retail_orders(order_date)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_retail_orders_order_status ON retail_orders(order_status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_digital_items_order_id ON digital_items(order_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_digital_items_order_date ON digital_items(order_date)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_returns_order_id ON returns(order_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_returns_return_creation_date ON returns(return_creation_date)')
+        for name in OBSOLETE_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        create_indexes(cursor)
         
         conn.commit()
 
+def check_query_plans(db_path=None):
+    """Print whether each PLAN_CHECKS and JOIN_PLAN_CHECKS query uses its index; returns the names of those that do not"""
+    checks = ([(name, f'COVERING INDEX {index}', index, sql) for name, index, sql in PLAN_CHECKS] +
+              [(name, f'USING INDEX {index}', index, sql) for name, index, sql in JOIN_PLAN_CHECKS])
+    failures = []
+    with get_read_db(db_path) as conn:
+        for name, expected, index, sql in checks:
+            plan = ' | '.join(row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}'))
+            if expected in plan:
+                print(f"✓ {name:28s} {plan}")
+            else:
+                failures.append(name)
+                print(f"✗ {name:28s} expected {index}: {plan}")
+    return failures
+
 if __name__ == '__main__':
+    import sys
+    if '--check-plans' in sys.argv[1:]:
+        sys.exit(1 if check_query_plans() else 0)
     init_database()
     print(f"Database initialized at {DATABASE_PATH}")
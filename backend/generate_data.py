@@ -0,0 +1,296 @@
+"""Synthetic Amazon data exports, in the CSV layout the importer reads, at any scale (for benchmarks)"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from categories import RETAIL_CATEGORY_KEYWORDS, DIGITAL_ITEM_RULES
+from import_data import DATASETS
+
+# Named scales, in retail order history rows
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Rows of the other exports per retail row
+DIGITAL_RATIO = 0.25
+RETURNS_RATIO = 0.02
+CART_RATIO = 0.1
+
+# Retail history is split into shards of this many rows, like large real exports
+SHARD_ROWS = 1_000_000
+# Rows generated and written at a time, so memory stays flat at any scale
+CHUNK_ROWS = 100_000
+
+FIRST_DAY = np.datetime64('2010-01-01T00:00:00', 's')
+LAST_DAY = np.datetime64('2025-01-01T00:00:00', 's')
+
+BRANDS = ['Anker', 'AmazonBasics', 'Logitech', 'Samsung', 'Sony', 'Philips', 'Bosch', 'Coleman', 'Lego',
+          'Hasbro', 'Purina', 'Nature Made', 'Gildan', 'Columbia', 'Oxo', 'Dewalt', 'Fisher-Price', 'Generic']
+VARIANTS = ['Black', 'White', '2-Pack', 'Large', 'Small', 'Pro', 'Mini', 'Deluxe', 'V2', '10 ft']
+FILLER_PRODUCTS = ['Assorted Item', 'Gift Set', 'Replacement Part', 'Sticker Pack', 'Travel Mug']
+PAYMENT_METHODS = (['Visa - 1234', 'MasterCard - 5678', 'Amazon.ca Rewards Mastercard', 'Gift Certificate/Card',
+                    'Not Available'], [0.45, 0.25, 0.2, 0.08, 0.02])
+ORDER_STATUSES = (['Closed', 'Cancelled', 'New', 'Authorized'], [0.93, 0.04, 0.02, 0.01])
+SUBSCRIPTION_NAMES = ['Prime Membership Fee', 'Paramount+ Monthly', 'STACK TV Monthly Subscription',
+                      'Prime Video Channels Streaming', 'Audible Membership']
+DIGITAL_ITEM_TITLES = ['The Long Road', 'Northern Lights', 'Deep Water', 'City of Glass', 'First Light']
+
+def choice(rng, options, n):
+    """n draws from (values, probabilities)"""
+    values, probabilities = options
+    return np.array(values, dtype=object)[rng.choice(len(values), size=n, p=probabilities)]
+
+def timestamps(seconds):
+    """ISO-8601 UTC strings, as in the exports, for seconds since FIRST_DAY"""
+    return np.char.add(np.datetime_as_string(FIRST_DAY + seconds.astype('timedelta64[s]')).astype(str), 'Z')
+
+def order_seconds(rng, n):
+    """Order times between FIRST_DAY and LAST_DAY, denser in later years as spending grows"""
+    span = (LAST_DAY - FIRST_DAY).astype(np.int64)
+    return (span * np.sqrt(rng.random(n))).astype(np.int64)
+
+def popular(rng, size, n):
+    """n catalog indexes skewed towards the front, so a few products are bought often"""
+    return (size * rng.random(n) ** 3).astype(np.int64)
+
+def identifiers(prefix, numbers):
+    """Amazon-style ids such as 702-1234567-1234567, derived from sequence numbers"""
+    high = (numbers * 2654435761) % 10_000_000
+    return [f'{prefix}-{a:07d}-{b:07d}' for a, b in zip(high.tolist(), (numbers % 10_000_000).tolist())]
+
+def money(values):
+    return np.char.mod('%.2f', values).astype(object)
+
+def retail_catalog(rng, size):
+    """(names, ASINs, prices) of retail products named after the category keywords"""
+    keywords = [keyword for words in RETAIL_CATEGORY_KEYWORDS.values() for keyword in words] + FILLER_PRODUCTS
+    names = [f'{BRANDS[i % len(BRANDS)]} {keywords[i % len(keywords)].title()} {VARIANTS[i // len(keywords) % len(VARIANTS)]} #{i}'
+             for i in range(size)]
+    # Shuffled, so the most popular products are not all from the first category
+    names = np.array(names, dtype=object)[rng.permutation(size)]
+    asins = np.array([f'B0{i:08X}' for i in range(size)], dtype=object)
+    prices = np.round(rng.lognormal(3.0, 1.0, size).clip(1, 2500), 2)
+    return names, asins, prices
+
+def retail_chunks(rng, rows, catalog):
+    """Frames of retail order history rows; also returns a callable giving the number of orders so far"""
+    names, asins, prices = catalog
+    state = {'orders': 0}
+
+    def chunks():
+        remaining = rows
+        while remaining:
+            n = min(CHUNK_ROWS, remaining)
+            remaining -= n
+            # Orders of 1-4 items share an order id, date and payment method
+            sizes = rng.choice(4, size=n, p=[0.6, 0.25, 0.1, 0.05]) + 1
+            sizes = sizes[np.cumsum(sizes) <= n]
+            sizes = np.append(sizes, n - sizes.sum()) if sizes.sum() < n else sizes
+            order_ids = np.array(identifiers('702', np.arange(len(sizes)) + state['orders']), dtype=object)
+            state['orders'] += len(sizes)
+
+            when = np.repeat(order_seconds(rng, len(sizes)), sizes)
+            product = popular(rng, len(names), n)
+            quantity = rng.choice(3, size=n, p=[0.85, 0.1, 0.05]) + 1
+            unit = prices[product]
+            tax = np.round(unit * 0.13, 2)
+            shipping = np.where(rng.random(n) < 0.1, 5.99, 0.0)
+            total = np.round((unit + tax) * quantity + shipping, 2)
+            status = np.repeat(choice(rng, ORDER_STATUSES, len(sizes)), sizes)
+            shipped = status != 'Cancelled'
+            ship_date = np.where(shipped, timestamps(when + rng.integers(1, 6, n) * 86400), 'Not Available')
+            total_owed = money(total)
+            # A few totals are missing or quoted, as in real exports
+            total_owed[rng.random(n) < 0.01] = 'Not Available'
+            quoted = rng.random(n) < 0.05
+            total_owed[quoted] = ["'" + value + "'" for value in total_owed[quoted]]
+
+            yield pd.DataFrame({
+                'Website': 'Amazon.ca',
+                'Order ID': np.repeat(order_ids, sizes),
+                'Order Date': timestamps(when),
+                'Purchase Order Number': 'Not Applicable',
+                'Currency': 'CAD',
+                'Unit Price': money(unit),
+                'Unit Price Tax': money(tax),
+                'Shipping Charge': money(shipping),
+                'Total Discounts': "'0'",
+                'Total Owed': total_owed,
+                'Shipment Item Subtotal': money(unit * quantity),
+                'Shipment Item Subtotal Tax': money(tax * quantity),
+                'ASIN': asins[product],
+                'Product Condition': 'New',
+                'Quantity': quantity,
+                'Payment Instrument Type': np.repeat(choice(rng, PAYMENT_METHODS, len(sizes)), sizes),
+                'Order Status': status,
+                'Shipment Status': np.where(shipped, 'Shipped', 'Not Available'),
+                'Ship Date': ship_date,
+                'Shipping Option': 'std-ca',
+                'Shipping Address': 'Jane Doe 1 Main St Toronto ON M5V 1A1 Canada',
+                'Billing Address': 'Jane Doe 1 Main St Toronto ON M5V 1A1 Canada',
+                'Carrier Name & Tracking Number': np.where(shipped, 'CANADA_POST(7001234567)', 'Not Available'),
+                'Product Name': names[product],
+                'Gift Message': 'Not Available',
+                'Gift Sender Name': 'Not Available',
+                'Gift Recipient Contact Details': 'Not Available',
+                'Item Serial Number': 'Not Available',
+            })
+
+    return chunks(), lambda: state['orders']
+
+def digital_chunks(rng, rows):
+    """Frames of digital items: one-off purchases and monthly subscription charges"""
+    titles = []
+    for _, keywords in DIGITAL_ITEM_RULES:
+        titles += [f'{title} ({keyword.title()})' for keyword in keywords for title in DIGITAL_ITEM_TITLES]
+    titles = np.array(titles, dtype=object)
+    subscriptions = np.array(SUBSCRIPTION_NAMES, dtype=object)
+    # Titles and subscription plans each have their own stable ASINs
+    title_asins = np.array([f'D0{i:08X}' for i in range(len(titles))], dtype=object)
+    plan_asins = np.array([f'DS{i:08X}' for i in range(len(subscriptions))], dtype=object)
+    done = 0
+    while done < rows:
+        n = min(CHUNK_ROWS, rows - done)
+        number = np.arange(done, done + n)
+        done += n
+        subscription = rng.random(n) < 0.3
+        pick = popular(rng, len(titles), n)
+        plan = rng.integers(0, len(subscriptions), n)
+        # Items come in orders of two, placed at the same time (chunks start on an even item)
+        when = np.repeat(order_seconds(rng, (n + 1) // 2), 2)[:n]
+        price = np.where(subscription, np.array([9.99, 14.99, 4.99, 7.99, 5.99])[plan],
+                         np.round(rng.lognormal(1.8, 0.7, n).clip(0, 60), 2))
+        price_text = money(price)
+        price_text[rng.random(n) < 0.02] = 'Not Applicable'
+        yield pd.DataFrame({
+            'ASIN': np.where(subscription, plan_asins[plan], title_asins[pick]),
+            'ProductName': np.where(subscription, subscriptions[plan], titles[pick]),
+            'OrderId': identifiers('D01', number // 2),
+            'DigitalOrderItemId': identifiers('DOI', number),
+            'OrderDate': timestamps(when),
+            'QuantityOrdered': 1,
+            'OurPrice': price_text,
+            'OurPriceCurrencyCode': 'CAD',
+            'FulfilledDate': timestamps(when + 60),
+            'IsFulfilled': 'Yes',
+            'SellerOfRecord': 'Amazon.com.ca ULC',
+            'GiftItem': 'No',
+            'SubscriptionOrderInfoList': np.where(
+                subscription, np.char.add('subscription ', plan.astype(str)).astype(object), 'Not Applicable'),
+        })
+
+def returns_chunks(rng, rows, orders):
+    """Frames of returns, each against one of the generated retail orders"""
+    done = 0
+    while done < rows:
+        n = min(CHUNK_ROWS, rows - done)
+        number = np.arange(done, done + n)
+        done += n
+        yield pd.DataFrame({
+            'Return Authorization Id': [f'D{i:011d}' for i in number.tolist()],
+            'Tracking Id': [f'TBC{i:012d}' for i in number.tolist()],
+            'Return Creation Date': timestamps(order_seconds(rng, n)),
+            'Order Id': identifiers('702', rng.integers(0, max(orders, 1), n)),
+            'Return Ship Option': choice(rng, (['UPS Drop Off', 'Canada Post', 'Pickup'], [0.5, 0.4, 0.1]), n),
+            'Carrier Package Id': 'Not Available',
+        })
+
+def cart_chunks(rng, rows, catalog):
+    """Frames of cart items added from the retail catalog"""
+    names, asins, _ = catalog
+    done = 0
+    while done < rows:
+        n = min(CHUNK_ROWS, rows - done)
+        done += n
+        product = popular(rng, len(names), n)
+        yield pd.DataFrame({
+            'DateAddedToCart': timestamps(order_seconds(rng, n)),
+            'Source': choice(rng, (['Gateway', 'Search', 'Detail Page'], [0.3, 0.4, 0.3]), n),
+            'ASIN': asins[product],
+            'ProductName': names[product],
+            'CartDomain': 'Amazon.ca',
+            'CartList': choice(rng, (['Active', 'Saved'], [0.7, 0.3]), n),
+            'Quantity': rng.integers(1, 3, n),
+            'OneClickBuyable': 'Y',
+            'ToBeGiftWrapped': 'N',
+            'PrimeSubscription': 'N',
+            'Pantry': 'N',
+            'AddOn': 'N',
+        })
+
+def write_csv(path, name, chunks):
+    """Write frames to one export file with the dataset's header; returns the row count"""
+    columns = [csv_column for _, csv_column, _ in DATASETS[name]['columns']]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        for frame in chunks:
+            frame[columns].to_csv(out, header=count == 0, index=False)
+            count += len(frame)
+        if count == 0:
+            out.write(','.join(columns) + '\n')
+    return count
+
+def shards(chunks, shard_rows):
+    """Split a stream of frames into consecutive lazy streams of shard_rows rows each"""
+    chunks = iter(chunks)
+    pending = [next(chunks, None)]
+
+    def shard():
+        left = shard_rows
+        while left and pending[0] is not None:
+            frame = pending[0]
+            if len(frame) > left:
+                frame, pending[0] = frame.iloc[:left], frame.iloc[left:]
+            else:
+                pending[0] = next(chunks, None)
+            left -= len(frame)
+            yield frame
+
+    # Each shard must be consumed before the next one is started
+    while pending[0] is not None:
+        yield shard()
+
+def generate_exports(out_dir, rows, seed=0, shard_rows=SHARD_ROWS):
+    """Write retail, digital, returns and cart exports under out_dir; returns rows written per dataset"""
+    rng = np.random.default_rng(seed)
+    catalog = retail_catalog(rng, min(max(rows // 20, 200), 200_000))
+    counts = {}
+
+    start = time.perf_counter()
+    retail, orders = retail_chunks(rng, rows, catalog)
+    counts['retail'] = 0
+    for index, frames in enumerate(shards(retail, shard_rows), 1):
+        path = os.path.join(out_dir, f'Retail.OrderHistory.{index}', f'Retail.OrderHistory.{index}.csv')
+        counts['retail'] += write_csv(path, 'retail', frames)
+    counts['digital'] = write_csv(os.path.join(out_dir, 'Digital-Ordering.1', 'Digital Items.csv'), 'digital',
+                                  digital_chunks(rng, int(rows * DIGITAL_RATIO)))
+    counts['returns'] = write_csv(
+        os.path.join(out_dir, 'Retail.CustomerReturns.1', 'Retail.CustomerReturns.1.csv'), 'returns',
+        returns_chunks(rng, int(rows * RETURNS_RATIO), orders()))
+    counts['cart'] = write_csv(os.path.join(out_dir, 'Retail.CartItems.1', 'Retail.CartItems.1.csv'), 'cart',
+                               cart_chunks(rng, int(rows * CART_RATIO), catalog))
+    print(f"Generated {sum(counts.values()):,} rows under {out_dir} in {time.perf_counter() - start:.2f}s "
+          f"({', '.join(f'{name}: {count:,}' for name, count in counts.items())})")
+    return counts
+
+def parse_rows(value):
+    """A named scale from SCALES or a plain row count"""
+    if value.lower() in SCALES:
+        return SCALES[value.lower()]
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected one of {', '.join(SCALES)} or a row count, not {value!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic Amazon CSV exports for benchmarking')
+    parser.add_argument('out_dir', help='directory to write the exports to (like data/)')
+    parser.add_argument('--scale', type=parse_rows, default=SCALES['10k'],
+                        help=f"retail rows: {', '.join(SCALES)} or a number (default 10k)")
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default 0)')
+    args = parser.parse_args()
+    generate_exports(args.out_dir, args.scale, args.seed)
+
+if __name__ == '__main__':
+    main()
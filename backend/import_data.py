@@ -1,7 +1,147 @@
 import pandas as pd
+import numpy as np
+import argparse
+import glob
+import hashlib
 import os
-from database import get_db, init_database
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from database import (
+    get_db, init_database, apply_pragmas, create_indexes, drop_indexes, data_columns,
+    refresh_derived_columns, refresh_product_ids, bump_data_generation, IMPORT_PRAGMAS, DATE_COLUMNS,
+    CATEGORY_COLUMNS,
+)
 from datetime import datetime
+from rollups import build_rollups
+from search import build_product_search
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+MISSING_VALUES = ['Not Available', 'Not Applicable']
+
+# Rows per chunk for streaming imports
+DEFAULT_CHUNK_SIZE = 50000
+
+# Column mappings used by the bulk importer: (table column, CSV column, kind)
+RETAIL_COLUMNS = [
+    ('website', 'Website', 'text'),
+    ('order_id', 'Order ID', 'text'),
+    ('order_date', 'Order Date', 'text'),
+    ('purchase_order_number', 'Purchase Order Number', 'text'),
+    ('currency', 'Currency', 'text'),
+    ('unit_price', 'Unit Price', 'numeric'),
+    ('unit_price_tax', 'Unit Price Tax', 'numeric'),
+    ('shipping_charge', 'Shipping Charge', 'numeric'),
+    ('total_discounts', 'Total Discounts', 'numeric'),
+    ('total_owed', 'Total Owed', 'numeric'),
+    ('shipment_item_subtotal', 'Shipment Item Subtotal', 'numeric'),
+    ('shipment_item_subtotal_tax', 'Shipment Item Subtotal Tax', 'numeric'),
+    ('asin', 'ASIN', 'text'),
+    ('product_condition', 'Product Condition', 'text'),
+    ('quantity', 'Quantity', 'int'),
+    ('payment_instrument_type', 'Payment Instrument Type', 'text'),
+    ('order_status', 'Order Status', 'text'),
+    ('shipment_status', 'Shipment Status', 'text'),
+    ('ship_date', 'Ship Date', 'text'),
+    ('shipping_option', 'Shipping Option', 'text'),
+    ('shipping_address', 'Shipping Address', 'text'),
+    ('billing_address', 'Billing Address', 'text'),
+    ('carrier_name_tracking', 'Carrier Name & Tracking Number', 'text'),
+    ('product_name', 'Product Name', 'text'),
+    ('gift_message', 'Gift Message', 'text'),
+    ('gift_sender_name', 'Gift Sender Name', 'text'),
+    ('gift_recipient_contact', 'Gift Recipient Contact Details', 'text'),
+    ('item_serial_number', 'Item Serial Number', 'text'),
+]
+
+DIGITAL_COLUMNS = [
+    ('asin', 'ASIN', 'text'),
+    ('product_name', 'ProductName', 'text'),
+    ('order_id', 'OrderId', 'text'),
+    ('digital_order_item_id', 'DigitalOrderItemId', 'text'),
+    ('order_date', 'OrderDate', 'text'),
+    ('quantity_ordered', 'QuantityOrdered', 'int'),
+    ('our_price', 'OurPrice', 'numeric'),
+    ('our_price_currency', 'OurPriceCurrencyCode', 'text'),
+    ('fulfilled_date', 'FulfilledDate', 'text'),
+    ('is_fulfilled', 'IsFulfilled', 'text'),
+    ('seller_of_record', 'SellerOfRecord', 'text'),
+    ('gift_item', 'GiftItem', 'text'),
+    ('subscription_order_info', 'SubscriptionOrderInfoList', 'text'),
+]
+
+RETURNS_COLUMNS = [
+    ('return_authorization_id', 'Return Authorization Id', 'text'),
+    ('tracking_id', 'Tracking Id', 'text'),
+    ('return_creation_date', 'Return Creation Date', 'text'),
+    ('order_id', 'Order Id', 'text'),
+    ('return_ship_option', 'Return Ship Option', 'text'),
+    ('carrier_package_id', 'Carrier Package Id', 'text'),
+]
+
+CART_COLUMNS = [
+    ('date_added_to_cart', 'DateAddedToCart', 'text'),
+    ('source', 'Source', 'text'),
+    ('asin', 'ASIN', 'text'),
+    ('product_name', 'ProductName', 'text'),
+    ('cart_domain', 'CartDomain', 'text'),
+    ('cart_list', 'CartList', 'text'),
+    ('quantity', 'Quantity', 'int'),
+    ('one_click_buyable', 'OneClickBuyable', 'text'),
+    ('to_be_gift_wrapped', 'ToBeGiftWrapped', 'text'),
+    ('prime_subscription', 'PrimeSubscription', 'text'),
+    ('pantry', 'Pantry', 'text'),
+    ('add_on', 'AddOn', 'text'),
+]
+
+# 'pattern' is a glob, relative to any directory under data/, matching every
+# shard (.1, .2, ...) of the export. 'key' is the natural key used by the
+# incremental importer. Cart items have no
+# stable key, so a changed cart export replaces the whole table. 'categorical'
+# lists low-cardinality CSV columns read as pandas categoricals when streaming.
+DATASETS = {
+    'retail': {
+        'table': 'retail_orders',
+        'label': 'retail orders',
+        'pattern': os.path.join('Retail.OrderHistory.*', 'Retail.OrderHistory.*.csv'),
+        'key': ['order_id', 'asin'],
+        'categorical': ['Website', 'Currency', 'Product Condition', 'Payment Instrument Type', 'Order Status',
+                        'Shipment Status', 'Shipping Option'],
+        'columns': RETAIL_COLUMNS,
+    },
+    'digital': {
+        'table': 'digital_items',
+        'label': 'digital items',
+        'pattern': os.path.join('Digital-Ordering.*', 'Digital Items.csv'),
+        'key': ['digital_order_item_id'],
+        'categorical': ['OurPriceCurrencyCode', 'IsFulfilled', 'SellerOfRecord', 'GiftItem'],
+        'columns': DIGITAL_COLUMNS,
+    },
+    'returns': {
+        'table': 'returns',
+        'label': 'returns',
+        'pattern': os.path.join('Retail.CustomerReturns.*', 'Retail.CustomerReturns.*.csv'),
+        'key': ['return_authorization_id'],
+        'categorical': ['Return Ship Option'],
+        'columns': RETURNS_COLUMNS,
+    },
+    'cart': {
+        'table': 'cart_items',
+        'label': 'cart items',
+        'pattern': os.path.join('Retail.CartItems.*', 'Retail.CartItems.*.csv'),
+        'key': None,
+        'categorical': ['Source', 'CartDomain', 'CartList', 'OneClickBuyable', 'ToBeGiftWrapped', 'PrimeSubscription',
+                        'Pantry', 'AddOn'],
+        'columns': CART_COLUMNS,
+    },
+}
 
 def clean_numeric(value):
     """Clean numeric values from CSV"""
@@ -25,15 +165,382 @@ def clean_text(value):
         return None
     return str(value).strip() if value else None
 
-def import_retail_orders(data_dir):
+def _missing_mask(series):
+    """Boolean mask of values that clean_text/clean_numeric treat as missing"""
+    return series.isna() | series.isin(MISSING_VALUES)
+
+def clean_text_column(series):
+    """Vectorized clean_text for a whole column"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Clean each distinct value once; code -1 (missing) picks the trailing None
+        categories = clean_text_column(pd.Series(series.cat.categories, dtype=object))
+        values = np.append(categories.to_numpy(), None)[series.cat.codes.to_numpy()]
+        return pd.Series(values, index=series.index, dtype=object)
+    missing = _missing_mask(series)
+    if pd.api.types.is_numeric_dtype(series):
+        # clean_text returns None for falsy values such as 0
+        missing |= series == 0
+    cleaned = series.astype(str).str.strip()
+    return cleaned.astype(object).where(~missing, None)
+
+def clean_numeric_column(series):
+    """Vectorized clean_numeric for a whole column (NaN where missing)"""
+    missing = _missing_mask(series)
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.astype(float)
+    else:
+        text = series.astype(str).str.replace("'", "", regex=False).str.strip()
+        values = pd.to_numeric(text, errors='coerce').astype(float)
+    return values.mask(missing, np.nan)
+
+def clean_frame(df, columns):
+    """Clean a raw CSV DataFrame into table columns, one column at a time"""
+    cleaned = {}
+    for column, csv_column, kind in columns:
+        if csv_column in df.columns:
+            raw = df[csv_column]
+        else:
+            raw = pd.Series(np.nan, index=df.index, dtype=object)
+        if kind == 'text':
+            cleaned[column] = clean_text_column(raw)
+        elif kind == 'numeric':
+            cleaned[column] = clean_numeric_column(raw)
+        else:
+            cleaned[column] = clean_numeric_column(raw).fillna(0).astype(np.int64)
+    return pd.DataFrame(cleaned, index=df.index)
+
+def frame_rows(frame):
+    """Yield plain Python tuples (NaN -> None) ready for executemany"""
+    values = frame.astype(object).where(frame.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+def insert_frame(cursor, table, frame):
+    """Insert a cleaned DataFrame with a single executemany call"""
+    columns = ', '.join(frame.columns)
+    placeholders = ', '.join(['?'] * len(frame.columns))
+    cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', frame_rows(frame))
+
+def read_csv_chunks(csv_path, spec, chunk_size):
+    """Read only the mapped CSV columns, chunk_size rows at a time, with explicit dtypes"""
+    wanted = {csv_column for _, csv_column, _ in spec['columns']}
+    dtypes = {column: 'category' if column in spec['categorical'] else object for column in wanted}
+    return pd.read_csv(csv_path, usecols=lambda column: column in wanted, dtype=dtypes,
+                       chunksize=chunk_size)
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MB, or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+def add_row_hashes(frame):
+    """Add a row_hash column: a 64-bit hash of every cleaned value in the row"""
+    hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    return frame.assign(row_hash=hashes.view(np.int64))
+
+def add_date_columns(frame, table):
+    """Parse the table's timestamps into integer day/year/month columns (see DATE_COLUMNS)"""
+    for source, prefix, calendar in DATE_COLUMNS.get(table, []):
+        timestamps = pd.to_datetime(frame[source], format='ISO8601', utc=True, errors='coerce')
+        days = (timestamps - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(days=1)
+        frame[f'{prefix}_day'] = days.astype('Int64')
+        if calendar:
+            frame[f'{prefix}_year'] = timestamps.dt.year.astype('Int64')
+            frame[f'{prefix}_month'] = (timestamps.dt.year * 100 + timestamps.dt.month).astype('Int64')
+    return frame
+
+def add_category_column(frame, table):
+    """Classify each distinct product once and attach the category to every row"""
+    if table not in CATEGORY_COLUMNS:
+        return frame
+    classify, sources = CATEGORY_COLUMNS[table]
+    distinct = frame[sources].drop_duplicates()
+    distinct['category'] = classify(*(distinct[column].tolist() for column in sources))
+    frame['category'] = frame[sources].merge(distinct, on=sources, how='left')['category'].to_numpy()
+    return frame
+
+def prepare_frame(df, spec):
+    """Clean a raw CSV frame, hash each row, then add the derived columns"""
+    frame = add_row_hashes(clean_frame(df, spec['columns']))
+    frame = add_date_columns(frame, spec['table'])
+    return add_category_column(frame, spec['table'])
+
+def file_fingerprint(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _natural_sort_key(path):
+    """Sort Retail.OrderHistory.2 before Retail.OrderHistory.10"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', path)]
+
+def find_dataset_files(data_dir, name):
+    """Every shard of a dataset anywhere under data_dir, in shard order"""
+    pattern = os.path.join(data_dir, '**', DATASETS[name]['pattern'])
+    return sorted(glob.glob(pattern, recursive=True), key=_natural_sort_key)
+
+def drop_shard_overlap(frames, hashes):
+    """Concatenate per-shard frames, dropping rows already seen in an earlier shard.
+
+    Overlapping re-downloads repeat rows verbatim, so a row whose hash appeared
+    in a previous shard is a duplicate. Membership is a hash-table lookup
+    against the hashes seen so far, so this is linear in the number of rows.
+    Repeats within a single shard are kept, as they are real line items.
+    """
+    seen = pd.Index([], dtype=np.int64)
+    kept = []
+    for frame, frame_hashes in zip(frames, hashes):
+        duplicate = pd.Index(frame_hashes).isin(seen)
+        kept.append(frame[~duplicate])
+        seen = seen.append(pd.Index(frame_hashes).unique())
+    dropped = sum(len(frame) for frame in frames) - sum(len(frame) for frame in kept)
+    if dropped:
+        print(f"Dropped {dropped} rows duplicated across shards")
+    return pd.concat(kept, ignore_index=True) if kept else pd.DataFrame()
+
+def load_shard(csv_path, spec):
+    """Process pool worker: read, clean and hash one shard"""
+    return prepare_frame(pd.read_csv(csv_path), spec)
+
+def load_dataset(csv_paths, spec, workers=None):
+    """Clean and hash every shard, in parallel when there are several, and de-duplicate them.
+
+    Returns the combined frame and the number of rows read from each shard.
+    """
+    if len(csv_paths) > 1 and workers != 1:
+        max_workers = workers or min(len(csv_paths), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            frames = list(pool.map(load_shard, csv_paths, [spec] * len(csv_paths)))
+    else:
+        frames = [load_shard(csv_path, spec) for csv_path in csv_paths]
+    counts = {csv_path: len(frame) for csv_path, frame in zip(csv_paths, frames)}
+    return drop_shard_overlap(frames, [frame['row_hash'] for frame in frames]), counts
+
+def read_raw_shards(csv_paths):
+    """Read and concatenate raw shards for the per-row importers, dropping cross-shard duplicates"""
+    frames = [pd.read_csv(csv_path) for csv_path in csv_paths]
+    hashes = [pd.util.hash_pandas_object(frame.astype(str), index=False) for frame in frames]
+    counts = {csv_path: len(frame) for csv_path, frame in zip(csv_paths, frames)}
+    return drop_shard_overlap(frames, hashes), counts
+
+def record_source_files(cursor, name, data_dir, counts, digests=None):
+    """Replace the stored fingerprints of a dataset with the shards just loaded"""
+    cursor.execute('DELETE FROM source_files WHERE dataset = ?', (name,))
+    for csv_path, row_count in counts.items():
+        record_source_file(cursor, name, data_dir, csv_path, row_count,
+                           digests[csv_path] if digests else None)
+
+def record_source_file(cursor, name, data_dir, csv_path, row_count, digest=None):
+    """Remember which version of a source file is loaded"""
+    cursor.execute('''
+        INSERT OR REPLACE INTO source_files (path, dataset, content_hash, row_count, imported_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', (os.path.relpath(csv_path, data_dir), name, digest or file_fingerprint(csv_path), row_count))
+
+def changed_key_mask(frame, stored, key):
+    """Mask of incoming rows whose natural key has different rows in the database.
+
+    A key can legitimately repeat (the same ASIN shipped twice in one order),
+    so keys are compared as multisets of row hashes rather than one row each.
+    Keys that are only in the database are left alone.
+    """
+    columns = key + ['row_hash']
+    incoming = frame[columns].fillna({k: '' for k in key}).groupby(columns).size()
+    existing = stored[columns].fillna({k: '' for k in key}).groupby(columns).size()
+    counts = pd.concat([incoming, existing], axis=1, keys=['incoming', 'existing']).fillna(0)
+    differs = counts.index[counts['incoming'] != counts['existing']].droplevel(-1).unique()
+    incoming_keys = frame[key].fillna('')
+    if len(key) == 1:
+        return incoming_keys[key[0]].isin(differs).to_numpy()
+    return pd.MultiIndex.from_frame(incoming_keys).isin(differs)
+
+def report_rate(label, count, elapsed):
+    """Print how many rows were imported and how fast"""
+    rate = count / elapsed if elapsed > 0 else 0
+    peak = peak_memory_mb()
+    memory = f", peak RSS {peak:,.0f} MB" if peak is not None else ''
+    print(f"Successfully imported {count} {label} in {elapsed:.2f}s ({rate:,.0f} rows/sec{memory})")
+
+def bulk_import_dataset(data_dir, name, chunk_size=None, db_path=None, build_indexes=True, workers=None):
+    """Import one dataset with vectorized cleaning and a single executemany transaction.
+
+    With chunk_size set, each shard is streamed in chunks of that many rows
+    and each chunk is written before the next is read, so memory stays flat.
+    Otherwise shards are parsed concurrently by up to `workers` processes.
+    """
+    spec = DATASETS[name]
+    csv_paths = find_dataset_files(data_dir, name)
+    if not csv_paths:
+        print(f"{spec['label'].capitalize()} CSV not found under {data_dir}")
+        return 0
+
+    start = time.perf_counter()
+    print(f"Loading {spec['label']} from {len(csv_paths)} file(s)...")
+    counts = {}
+    if chunk_size:
+        chunks = stream_dataset(csv_paths, spec, chunk_size, counts)
+    else:
+        frame, counts = load_dataset(csv_paths, spec, workers)
+        print(f"Found {len(frame)} rows")
+        chunks = [frame]
+
+    table = spec['table']
+    imported = 0
+    with get_db(db_path) as conn:
+        apply_pragmas(conn, IMPORT_PRAGMAS)
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        # Loading into an unindexed table and indexing once afterwards is much
+        # cheaper than updating every index on every insert
+        drop_indexes(cursor, table)
+        cursor.execute(f'DELETE FROM {table}')
+        for frame in chunks:
+            insert_frame(cursor, table, frame)
+            imported += len(frame)
+            if chunk_size:
+                print(f"Imported {imported} {spec['label']}...")
+        if build_indexes:
+            create_indexes(cursor, table)
+        record_source_files(cursor, name, data_dir, counts)
+        conn.commit()
+
+    report_rate(spec['label'], imported, time.perf_counter() - start)
+    return imported
+
+def stream_dataset(csv_paths, spec, chunk_size, counts):
+    """Yield cleaned, hashed chunks of every shard, skipping rows seen in earlier shards.
+
+    Fills counts with the number of rows read per shard as it goes.
+    """
+    seen = pd.Index([], dtype=np.int64)
+    dropped = 0
+    for csv_path in csv_paths:
+        shard_hashes = []
+        counts[csv_path] = 0
+        for chunk in read_csv_chunks(csv_path, spec, chunk_size):
+            frame = prepare_frame(chunk, spec)
+            counts[csv_path] += len(frame)
+            shard_hashes.append(frame['row_hash'].to_numpy())
+            duplicate = frame['row_hash'].isin(seen).to_numpy()
+            dropped += int(duplicate.sum())
+            yield frame[~duplicate]
+        if shard_hashes:
+            seen = seen.append(pd.Index(np.concatenate(shard_hashes)).unique())
+    if dropped:
+        print(f"Dropped {dropped} rows duplicated across shards")
+
+def incremental_import_dataset(data_dir, name):
+    """Re-import one dataset, skipping unchanged files and otherwise writing only changed keys"""
+    spec = DATASETS[name]
+    csv_paths = find_dataset_files(data_dir, name)
+    if not csv_paths:
+        print(f"{spec['label'].capitalize()} CSV not found under {data_dir}")
+        return 0
+
+    start = time.perf_counter()
+    digests = {csv_path: file_fingerprint(csv_path) for csv_path in csv_paths}
+    with get_db() as conn:
+        rows = conn.execute('SELECT path, content_hash FROM source_files WHERE dataset = ?', (name,)).fetchall()
+    stored = {row['path']: row['content_hash'] for row in rows}
+    if stored == {os.path.relpath(csv_path, data_dir): digest for csv_path, digest in digests.items()}:
+        print(f"{spec['label'].capitalize()} unchanged since last import, skipping")
+        return 0
+
+    # Shards overlap, so any change means re-reading all of them; only the
+    # keys that actually changed are written below
+    print(f"Loading {spec['label']} from {len(csv_paths)} file(s)...")
+    frame, counts = load_dataset(csv_paths, spec)
+    print(f"Found {len(frame)} rows")
+
+    table, key = spec['table'], spec['key']
+    with get_db() as conn:
+        apply_pragmas(conn, IMPORT_PRAGMAS)
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        if key is None:
+            cursor.execute(f'DELETE FROM {table}')
+            changed = frame
+        else:
+            stored = pd.read_sql_query(
+                f'SELECT {", ".join(key)}, COALESCE(row_hash, 0) AS row_hash FROM {table}', conn
+            )
+            changed = frame[changed_key_mask(frame, stored, key)]
+            # Replace every stored row of a changed key with the incoming rows
+            match = ' AND '.join(f'{column} IS ?' for column in key)
+            cursor.executemany(f'DELETE FROM {table} WHERE {match}',
+                               frame_rows(changed[key].drop_duplicates()))
+        insert_frame(cursor, table, changed)
+        record_source_files(cursor, name, data_dir, counts, digests)
+        conn.commit()
+
+    print(f"{len(changed)} of {len(frame)} {spec['label']} new or changed")
+    report_rate(spec['label'], len(changed), time.perf_counter() - start)
+    return len(changed)
+
+def stage_dataset(data_dir, name, staging_path, chunk_size=None):
+    """Process pool worker: bulk import one dataset into its own staging database"""
+    init_database(staging_path)
+    # Shards are parsed in this worker rather than in a nested process pool
+    return bulk_import_dataset(data_dir, name, chunk_size, db_path=staging_path, build_indexes=False,
+                               workers=1)
+
+def parallel_import(data_dir, names, chunk_size=None, workers=None):
+    """Parse and clean datasets in parallel processes, then merge them in one transaction.
+
+    Each worker writes to a private staging database so no two processes
+    contend for the SQLite write lock; the merge is a plain INSERT ... SELECT
+    per table from the ATTACHed staging files.
+    """
+    staging_dir = tempfile.mkdtemp(prefix='amazon_import_')
+    try:
+        staging = {name: os.path.join(staging_dir, f'{name}.db') for name in names}
+        with ProcessPoolExecutor(max_workers=workers or min(len(names), os.cpu_count() or 1)) as pool:
+            futures = {name: pool.submit(stage_dataset, data_dir, name, staging[name], chunk_size)
+                       for name in names}
+            counts = {name: future.result() for name, future in futures.items()}
+
+        start = time.perf_counter()
+        with get_db() as conn:
+            apply_pragmas(conn, IMPORT_PRAGMAS)
+            cursor = conn.cursor()
+            staged = [name for name in names if counts[name]]
+            for name in staged:
+                cursor.execute(f'ATTACH DATABASE ? AS stage_{name}', (staging[name],))
+            cursor.execute('BEGIN')
+            for name in staged:
+                table = DATASETS[name]['table']
+                columns = ', '.join(data_columns(cursor, table))
+                drop_indexes(cursor, table)
+                cursor.execute(f'DELETE FROM main.{table}')
+                cursor.execute(f'INSERT INTO main.{table} ({columns}) SELECT {columns} FROM stage_{name}.{table}')
+                create_indexes(cursor, table)
+                cursor.execute('DELETE FROM main.source_files WHERE dataset = ?', (name,))
+                cursor.execute(f'INSERT INTO main.source_files SELECT * FROM stage_{name}.source_files')
+            conn.commit()
+            for name in staged:
+                cursor.execute(f'DETACH DATABASE stage_{name}')
+        print(f"Merged {len(staged)} staging databases in {time.perf_counter() - start:.2f}s")
+        return counts
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+def import_retail_orders(data_dir, bulk=False):
     """Import retail orders from CSV"""
-    csv_path = os.path.join(data_dir, 'Retail.OrderHistory.1', 'Retail.OrderHistory.1.csv')
-    if not os.path.exists(csv_path):
-        print(f"Retail orders CSV not found: {csv_path}")
+    if bulk:
+        return bulk_import_dataset(data_dir, 'retail')
+    start = time.perf_counter()
+    csv_paths = find_dataset_files(data_dir, 'retail')
+    if not csv_paths:
+        print(f"Retail orders CSV not found under {data_dir}")
         return 0
     
-    print(f"Loading retail orders from {csv_path}...")
-    df = pd.read_csv(csv_path)
+    print(f"Loading retail orders from {len(csv_paths)} file(s)...")
+    df, counts = read_raw_shards(csv_paths)
     print(f"Found {len(df)} rows")
     
     with get_db() as conn:
@@ -92,19 +599,24 @@ def import_retail_orders(data_dir):
                 print(f"Error importing row: {e}")
                 continue
         
+        refresh_derived_columns(cursor, 'retail_orders')
+        record_source_files(cursor, 'retail', data_dir, counts)
         conn.commit()
-        print(f"Successfully imported {imported} retail orders")
+        report_rate('retail orders', imported, time.perf_counter() - start)
         return imported
 
-def import_digital_items(data_dir):
+def import_digital_items(data_dir, bulk=False):
     """Import digital items from CSV"""
-    csv_path = os.path.join(data_dir, 'Digital-Ordering.1', 'Digital Items.csv')
-    if not os.path.exists(csv_path):
-        print(f"Digital items CSV not found: {csv_path}")
+    if bulk:
+        return bulk_import_dataset(data_dir, 'digital')
+    start = time.perf_counter()
+    csv_paths = find_dataset_files(data_dir, 'digital')
+    if not csv_paths:
+        print(f"Digital items CSV not found under {data_dir}")
         return 0
     
-    print(f"Loading digital items from {csv_path}...")
-    df = pd.read_csv(csv_path)
+    print(f"Loading digital items from {len(csv_paths)} file(s)...")
+    df, counts = read_raw_shards(csv_paths)
     print(f"Found {len(df)} rows")
     
     with get_db() as conn:
@@ -144,19 +656,24 @@ def import_digital_items(data_dir):
                 print(f"Error importing row: {e}")
                 continue
         
+        refresh_derived_columns(cursor, 'digital_items')
+        record_source_files(cursor, 'digital', data_dir, counts)
         conn.commit()
-        print(f"Successfully imported {imported} digital items")
+        report_rate('digital items', imported, time.perf_counter() - start)
         return imported
 
-def import_returns(data_dir):
+def import_returns(data_dir, bulk=False):
     """Import returns from CSV"""
-    csv_path = os.path.join(data_dir, 'Retail.CustomerReturns.1', 'Retail.CustomerReturns.1.csv')
-    if not os.path.exists(csv_path):
-        print(f"Returns CSV not found: {csv_path}")
+    if bulk:
+        return bulk_import_dataset(data_dir, 'returns')
+    start = time.perf_counter()
+    csv_paths = find_dataset_files(data_dir, 'returns')
+    if not csv_paths:
+        print(f"Returns CSV not found under {data_dir}")
         return 0
     
-    print(f"Loading returns from {csv_path}...")
-    df = pd.read_csv(csv_path)
+    print(f"Loading returns from {len(csv_paths)} file(s)...")
+    df, counts = read_raw_shards(csv_paths)
     print(f"Found {len(df)} rows")
     
     with get_db() as conn:
@@ -185,19 +702,24 @@ def import_returns(data_dir):
                 print(f"Error importing row: {e}")
                 continue
         
+        refresh_derived_columns(cursor, 'returns')
+        record_source_files(cursor, 'returns', data_dir, counts)
         conn.commit()
-        print(f"Successfully imported {imported} returns")
+        report_rate('returns', imported, time.perf_counter() - start)
         return imported
 
-def import_cart_items(data_dir):
+def import_cart_items(data_dir, bulk=False):
     """Import cart items from CSV"""
-    csv_path = os.path.join(data_dir, 'Retail.CartItems.1', 'Retail.CartItems.1.csv')
-    if not os.path.exists(csv_path):
-        print(f"Cart items CSV not found: {csv_path}")
+    if bulk:
+        return bulk_import_dataset(data_dir, 'cart')
+    start = time.perf_counter()
+    csv_paths = find_dataset_files(data_dir, 'cart')
+    if not csv_paths:
+        print(f"Cart items CSV not found under {data_dir}")
         return 0
     
-    print(f"Loading cart items from {csv_path}...")
-    df = pd.read_csv(csv_path)
+    print(f"Loading cart items from {len(csv_paths)} file(s)...")
+    df, counts = read_raw_shards(csv_paths)
     print(f"Found {len(df)} rows")
     
     with get_db() as conn:
@@ -233,24 +755,83 @@ def import_cart_items(data_dir):
                 print(f"Error importing row: {e}")
                 continue
         
+        record_source_files(cursor, 'cart', data_dir, counts)
         conn.commit()
-        print(f"Successfully imported {imported} cart items")
+        report_rate('cart items', imported, time.perf_counter() - start)
         return imported
 
+def finalize_import(db_path=None):
+    """Link new line items to their products, then rebuild the rollups and the search index"""
+    start = time.perf_counter()
+    with get_db(db_path) as conn:
+        apply_pragmas(conn, IMPORT_PRAGMAS)
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        # Product ids are only assigned against the final database: staged
+        # and bulk-loaded rows arrive without them
+        refresh_product_ids(cursor)
+        build_rollups(cursor)
+        build_product_search(cursor)
+        bump_data_generation(cursor)
+        conn.commit()
+    print(f"Linked products, rebuilt rollup tables and search index in {time.perf_counter() - start:.2f}s")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Import Amazon CSV exports into SQLite')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--bulk', action='store_true',
+                      help='clean whole columns at once and insert with executemany in one transaction per table')
+    mode.add_argument('--incremental', action='store_true',
+                      help='skip unchanged files and only write rows whose natural key changed')
+    mode.add_argument('--stream', action='store_true',
+                      help='like --bulk, but read each CSV in fixed-size chunks to keep memory flat')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'rows per chunk for --stream (default {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--parallel', action='store_true',
+                        help='import the datasets concurrently in separate processes (implies --bulk)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes for --parallel (default: one per dataset)')
+    args = parser.parse_args()
+    if args.parallel and args.incremental:
+        parser.error('--parallel cannot be combined with --incremental')
+    return args
+
 def main():
     """Main import function"""
+    args = parse_args()
     data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
     
     print("Initializing database...")
     init_database()
     
     print("\nStarting data import...")
-    retail_count = import_retail_orders(data_dir)
-    digital_count = import_digital_items(data_dir)
-    returns_count = import_returns(data_dir)
-    cart_count = import_cart_items(data_dir)
+    start = time.perf_counter()
+    if args.parallel:
+        counts = parallel_import(data_dir, list(DATASETS), args.chunk_size if args.stream else None,
+                                 args.workers)
+        retail_count, digital_count = counts['retail'], counts['digital']
+        returns_count, cart_count = counts['returns'], counts['cart']
+    elif args.incremental:
+        retail_count = incremental_import_dataset(data_dir, 'retail')
+        digital_count = incremental_import_dataset(data_dir, 'digital')
+        returns_count = incremental_import_dataset(data_dir, 'returns')
+        cart_count = incremental_import_dataset(data_dir, 'cart')
+    elif args.stream:
+        retail_count = bulk_import_dataset(data_dir, 'retail', args.chunk_size)
+        digital_count = bulk_import_dataset(data_dir, 'digital', args.chunk_size)
+        returns_count = bulk_import_dataset(data_dir, 'returns', args.chunk_size)
+        cart_count = bulk_import_dataset(data_dir, 'cart', args.chunk_size)
+    else:
+        retail_count = import_retail_orders(data_dir, bulk=args.bulk)
+        digital_count = import_digital_items(data_dir, bulk=args.bulk)
+        returns_count = import_returns(data_dir, bulk=args.bulk)
+        cart_count = import_cart_items(data_dir, bulk=args.bulk)
+    # An incremental run that changed nothing leaves the rollups valid
+    if not args.incremental or any((retail_count, digital_count, returns_count, cart_count)):
+        finalize_import()
+    elapsed = time.perf_counter() - start
     
-    print(f"\nImport complete!")
+    print(f"\nImport complete in {elapsed:.2f}s!")
     print(f"  Retail orders: {retail_count}")
     print(f"  Digital items: {digital_count}")
     print(f"  Returns: {returns_count}")
@@ -0,0 +1,244 @@
+"""Profiling instrumentation: latency and row-count histograms per API route and per SQL statement"""
+import bisect
+import os
+import sqlite3
+import threading
+import time
+
+# Upper bounds of the histogram buckets; anything larger lands in '+Inf'
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+COUNT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# SQLite calls the progress handler every VM_STEP_INTERVAL virtual machine
+# instructions; the step counts it yields stand in for rows scanned
+VM_STEP_INTERVAL = 1000
+
+# Distinct statements tracked before the rest are pooled under OTHER_STATEMENT
+MAX_STATEMENTS = 500
+OTHER_STATEMENT = '(other)'
+
+# With AMAZON_DATA_PROFILE_PLANS=1, EXPLAIN QUERY PLAN is captured for the
+# SLOWEST_STATEMENTS slowest statement runs seen
+CAPTURE_PLANS = os.environ.get('AMAZON_DATA_PROFILE_PLANS', '') not in ('', '0')
+SLOWEST_STATEMENTS = 10
+
+class Histogram:
+    """Counts of observations per bucket, with their count, sum and maximum"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (the maximum for the last bucket)"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts) if count}
+        if self.counts[-1]:
+            buckets['+Inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'mean': round(self.total / self.count, 3) if self.count else 0,
+            'max': round(self.max, 3),
+            'p50': round(self.quantile(0.5), 3),
+            'p95': round(self.quantile(0.95), 3),
+            'p99': round(self.quantile(0.99), 3),
+            'buckets': buckets,
+        }
+
+class Profiler:
+    """Thread-safe registry of the histograms behind /api/debug/metrics"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+            self.serialization = {}
+            self.statements = {}
+            self.slowest = []
+
+    def observe_route(self, route, elapsed_ms):
+        with self.lock:
+            self._histogram(self.routes, route, LATENCY_BUCKETS_MS).observe(elapsed_ms)
+
+    def observe_serialization(self, route, elapsed_ms):
+        with self.lock:
+            self._histogram(self.serialization, route, LATENCY_BUCKETS_MS).observe(elapsed_ms)
+
+    def observe_statement(self, sql, elapsed_ms, rows_returned, vm_steps):
+        """Record one statement run; returns whether it ranks among the slowest seen"""
+        with self.lock:
+            if sql not in self.statements and len(self.statements) >= MAX_STATEMENTS:
+                sql = OTHER_STATEMENT
+            stats = self.statements.get(sql)
+            if stats is None:
+                stats = self.statements[sql] = {
+                    'timeMs': Histogram(LATENCY_BUCKETS_MS),
+                    'rowsReturned': Histogram(COUNT_BUCKETS),
+                    'vmSteps': Histogram(COUNT_BUCKETS),
+                }
+            stats['timeMs'].observe(elapsed_ms)
+            stats['rowsReturned'].observe(rows_returned)
+            stats['vmSteps'].observe(vm_steps)
+            return len(self.slowest) < SLOWEST_STATEMENTS or elapsed_ms > self.slowest[-1]['timeMs']
+
+    def record_slow(self, sql, elapsed_ms, plan):
+        """Keep a statement run and its query plan if it is still among the slowest"""
+        with self.lock:
+            self.slowest.append({'sql': sql, 'timeMs': round(elapsed_ms, 3), 'plan': plan})
+            self.slowest.sort(key=lambda run: -run['timeMs'])
+            del self.slowest[SLOWEST_STATEMENTS:]
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'routes': {route: h.to_dict() for route, h in sorted(self.routes.items())},
+                'serialization': {route: h.to_dict() for route, h in sorted(self.serialization.items())},
+                # Most total time first
+                'statements': [
+                    {'sql': sql, **{name: h.to_dict() for name, h in stats.items()}}
+                    for sql, stats in sorted(self.statements.items(), key=lambda item: -item[1]['timeMs'].total)
+                ],
+                'slowest': list(self.slowest),
+                'capturePlans': CAPTURE_PLANS,
+            }
+
+    def _histogram(self, histograms, key, bounds):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(bounds)
+        return histogram
+
+profiler = Profiler()
+
+def normalize_sql(sql):
+    """Statement text with whitespace collapsed, the key it is recorded under"""
+    return ' '.join(sql.split())
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors record every statement they run with the profiler"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vm_steps = 0
+        self.set_progress_handler(self._count_steps, VM_STEP_INTERVAL)
+
+    def _count_steps(self):
+        self.vm_steps += VM_STEP_INTERVAL
+        return 0
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or ProfiledCursor)
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor timing the SQLite work of each statement, from execute to its last row.
+
+    Only time spent inside execute and the fetch calls counts, so a consumer
+    that streams rows slowly does not inflate a statement's time. A run is
+    recorded when its rows are exhausted, on the next execute, or on close.
+    """
+
+    _statement = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        steps = getattr(self.connection, 'vm_steps', 0)
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            # [sql, parameters, seconds in SQLite, rows returned, VM steps at execute]
+            self._statement = [sql, parameters, time.perf_counter() - start, 0, steps]
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._count(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if rows:
+            self._count(len(rows))
+        else:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._count(len(rows))
+        self._finish()
+        return rows
+
+    def __next__(self):
+        # Runs once per streamed row, so the bookkeeping is inlined
+        statement = self._statement
+        start = time.perf_counter()
+        try:
+            row = sqlite3.Cursor.__next__(self)
+        except StopIteration:
+            self._finish()
+            raise
+        if statement is not None:
+            statement[2] += time.perf_counter() - start
+            statement[3] += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _timed(self, call, *args):
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            if self._statement is not None:
+                self._statement[2] += time.perf_counter() - start
+
+    def _count(self, rows):
+        if self._statement is not None:
+            self._statement[3] += rows
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is None:
+            return
+        sql, parameters, elapsed, rows, steps = statement
+        sql = normalize_sql(sql)
+        elapsed_ms = elapsed * 1000
+        vm_steps = getattr(self.connection, 'vm_steps', 0) - steps
+        slow = profiler.observe_statement(sql, elapsed_ms, rows, vm_steps)
+        if slow and CAPTURE_PLANS and sql.upper().startswith(('SELECT', 'WITH')):
+            profiler.record_slow(sql, elapsed_ms, self._query_plan(sql, parameters))
+
+    def _query_plan(self, sql, parameters):
+        """EXPLAIN QUERY PLAN lines for a statement, on an unprofiled cursor of the same connection"""
+        try:
+            plan = sqlite3.Cursor(self.connection).execute(f'EXPLAIN QUERY PLAN {sql}', parameters)
+            return [row[3] for row in plan.fetchall()]
+        except sqlite3.Error as e:
+            return [f'unavailable: {e}']
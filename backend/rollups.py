@@ -0,0 +1,137 @@
+"""Rollup tables derived from the line-item tables at the end of an import"""
+from database import VALID_RETAIL_ORDER, VALID_DIGITAL_ITEM
+
+# Line items the dashboard counts, per channel: (table, amount column, filter)
+ROLLUP_SOURCES = {
+    'retail': ('retail_orders', 'total_owed', VALID_RETAIL_ORDER),
+    'digital': ('digital_items', 'our_price', VALID_DIGITAL_ITEM),
+}
+
+# Order-level columns of each channel's line items: (status, payment method)
+ORDER_ATTRIBUTES = {
+    'retail': ('order_status', 'payment_instrument_type'),
+    'digital': ('NULL', 'NULL'),
+}
+
+MONTH_LABEL = "printf('%04d-%02d', {column} / 100, {column} % 100)"
+
+def build_orders(cursor):
+    """Rebuild orders: one row per order of the counted line items, flagged if it was returned"""
+    cursor.execute('DELETE FROM orders')
+    for channel, (table, amount, valid) in ROLLUP_SOURCES.items():
+        status, payment_method = ORDER_ATTRIBUTES[channel]
+        # Items of one order share its status and payment method in the
+        # exports; MAX picks one if they ever differ
+        cursor.execute(f'''
+            INSERT INTO orders (channel, order_id, order_date, order_day, total, items, status,
+                                payment_method, returned)
+            SELECT ?, order_id, MIN(order_date), MIN(order_day), SUM({amount}), COUNT(*), MAX({status}),
+                   MAX({payment_method}), order_id IN (SELECT order_id FROM returns)
+            FROM {table}
+            WHERE {valid} AND order_id IS NOT NULL
+            GROUP BY order_id
+        ''', (channel,))
+
+def build_period_rollup(cursor):
+    """Rebuild period_rollup: exact totals per channel for every month, year and overall"""
+    cursor.execute('DELETE FROM period_rollup')
+    for channel, (table, amount, valid) in ROLLUP_SOURCES.items():
+        grains = [
+            ('month', MONTH_LABEL.format(column='order_month'), 'order_month'),
+            ('year', 'CAST(order_year AS TEXT)', 'order_year'),
+        ]
+        for grain, label, column in grains:
+            cursor.execute(f'''
+                INSERT INTO period_rollup (channel, grain, period, spending, items, orders, first_date, last_date)
+                SELECT ?, ?, {label}, SUM({amount}), COUNT(*), COUNT(DISTINCT order_id),
+                       MIN(order_date), MAX(order_date)
+                FROM {table}
+                WHERE {valid} AND {column} IS NOT NULL
+                GROUP BY {column}
+            ''', (channel, grain))
+        cursor.execute(f'''
+            INSERT INTO period_rollup (channel, grain, period, spending, items, orders, first_date, last_date)
+            SELECT ?, 'all', 'all', SUM({amount}), COUNT(*), (SELECT COUNT(*) FROM orders WHERE channel = ?),
+                   MIN(order_date), MAX(order_date)
+            FROM {table}
+            WHERE {valid}
+        ''', (channel, channel))
+
+    # Returns are counted, not summed
+    cursor.execute(f'''
+        INSERT INTO period_rollup (channel, grain, period, items, first_date, last_date)
+        SELECT 'returns', 'month', {MONTH_LABEL.format(column='return_month')}, COUNT(*),
+               MIN(return_creation_date), MAX(return_creation_date)
+        FROM returns
+        WHERE return_month IS NOT NULL
+        GROUP BY return_month
+    ''')
+    cursor.execute('''
+        INSERT INTO period_rollup (channel, grain, period, items, orders, first_date, last_date)
+        SELECT 'returns', 'all', 'all', COUNT(*),
+               (SELECT COUNT(*) FROM orders WHERE channel = 'retail' AND returned),
+               MIN(return_creation_date), MAX(return_creation_date)
+        FROM returns
+    ''')
+
+def build_monthly_rollup(cursor):
+    """Rebuild monthly_rollup: spend and item counts per month, category, payment method and status"""
+    cursor.execute('DELETE FROM monthly_rollup')
+    # Status is kept as a dimension so callers can apply the cancelled filter
+    cursor.execute('''
+        INSERT INTO monthly_rollup (channel, month, category, payment_method, status, spending, items, orders)
+        SELECT 'retail', order_month, category, payment_instrument_type, order_status,
+               SUM(total_owed), COUNT(*), COUNT(DISTINCT order_id)
+        FROM retail_orders
+        WHERE total_owed IS NOT NULL AND total_owed > 0
+        GROUP BY order_month, category, payment_instrument_type, order_status
+    ''')
+    cursor.execute('''
+        INSERT INTO monthly_rollup (channel, month, category, spending, items, orders)
+        SELECT 'digital', order_month, category, SUM(our_price), COUNT(*), COUNT(DISTINCT order_id)
+        FROM digital_items
+        WHERE our_price IS NOT NULL AND our_price > 0
+        GROUP BY order_month, category
+    ''')
+
+def daily_rollup_query(channel):
+    """SELECT of (day, spending, items, orders) per day for one channel, each order counted on its first day"""
+    table, amount, valid = ROLLUP_SOURCES[channel]
+    # The line items and each order's first day are stacked and summed in one
+    # GROUP BY; joining the two grouped subqueries instead is quadratic in days
+    return f'''
+        WITH counted AS (
+            SELECT order_day, order_id, {amount} AS amount FROM {table}
+            WHERE {valid} AND order_day IS NOT NULL
+        )
+        SELECT day, SUM(spending) AS spending, SUM(items) AS items, SUM(orders) AS orders
+        FROM (
+            SELECT order_day AS day, amount AS spending, 1 AS items, 0 AS orders FROM counted
+            UNION ALL
+            SELECT MIN(order_day), 0, 0, 1 FROM counted WHERE order_id IS NOT NULL GROUP BY order_id
+        )
+        GROUP BY day
+        ORDER BY day
+    '''
+
+def build_daily_rollup(cursor):
+    """Rebuild daily_rollup: spending, items and orders per day with retail and digital side by side"""
+    cursor.execute('DELETE FROM daily_rollup')
+    for channel in ROLLUP_SOURCES:
+        # WHERE true keeps SQLite from reading ON CONFLICT as a join constraint
+        cursor.execute(f'''
+            INSERT INTO daily_rollup (day, {channel}_spending, {channel}_items, {channel}_orders)
+            SELECT * FROM ({daily_rollup_query(channel)}) WHERE true
+            ON CONFLICT(day) DO UPDATE SET
+                {channel}_spending = excluded.{channel}_spending,
+                {channel}_items = excluded.{channel}_items,
+                {channel}_orders = excluded.{channel}_orders
+        ''')
+
+def build_rollups(cursor):
+    """Rebuild every rollup table from the current line items"""
+    # period_rollup reads its order counts from orders
+    build_orders(cursor)
+    build_period_rollup(cursor)
+    build_monthly_rollup(cursor)
+    build_daily_rollup(cursor)
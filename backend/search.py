@@ -0,0 +1,36 @@
+"""Full-text product search: the FTS5 index the importer rebuilds and the query syntax it accepts"""
+import re
+
+from database import VALID_RETAIL_ORDER, VALID_DIGITAL_ITEM
+
+# Distinct product names per channel, indexed: (channel, table, counted-row filter)
+SEARCH_SOURCES = [
+    ('retail', 'retail_orders', VALID_RETAIL_ORDER),
+    ('digital', 'digital_items', VALID_DIGITAL_ITEM),
+]
+
+def build_product_search(cursor):
+    """Rebuild product_search from the product names of the counted line items"""
+    cursor.execute('DELETE FROM product_search')
+    for channel, table, valid in SEARCH_SOURCES:
+        cursor.execute(f'''
+            INSERT INTO product_search (product_name, channel)
+            SELECT DISTINCT product_name, ?
+            FROM {table}
+            WHERE {valid} AND product_name IS NOT NULL
+        ''', (channel,))
+    # Merge the b-tree segments written by the inserts into one
+    cursor.execute("INSERT INTO product_search (product_search) VALUES ('optimize')")
+
+def fts_query(text):
+    """FTS5 MATCH expression for free text: every word must appear, the last one as a prefix.
+
+    Words are quoted, so punctuation and FTS operators typed by the user are
+    never interpreted as query syntax.
+    """
+    words = re.findall(r'\w+', text or '')
+    if not words:
+        raise ValueError('Search text must contain at least one word')
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' AND '.join(terms)
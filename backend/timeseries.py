@@ -0,0 +1,153 @@
+"""Daily spending cube and the time series re-bucketed from it at any granularity"""
+import numpy as np
+
+CUBE_CHANNELS = ('retail', 'digital')
+
+# Granularities of the spending series; weeks start on Monday and are
+# labelled with that date, quarters as '2023-Q2'
+PERIODS = ('daily', 'weekly', 'monthly', 'quarterly', 'yearly')
+
+# Trailing windows, in months, of the averages in the spending trends
+ROLLING_WINDOWS = (3, 12)
+
+def day_number(date):
+    """Days since 1970-01-01 of an ISO date or timestamp string, or None"""
+    if not date:
+        return None
+    try:
+        return int(np.datetime64(date[:10], 'D').astype(np.int64))
+    except ValueError:
+        raise ValueError(f'Invalid date {date!r}, expected YYYY-MM-DD')
+
+def bucket_keys(days, period):
+    """Integer period of each day number, ascending when the days are"""
+    if period == 'daily':
+        return days
+    if period == 'weekly':
+        # 1970-01-01 was a Thursday
+        return days - (days + 3) % 7
+    if period == 'yearly':
+        return days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64)
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    return months if period == 'monthly' else months // 3
+
+def bucket_labels(keys, period):
+    """Labels of integer periods from bucket_keys"""
+    if period in ('daily', 'weekly'):
+        return np.datetime_as_string(keys.astype('datetime64[D]')).tolist()
+    if period == 'monthly':
+        return np.datetime_as_string(keys.astype('datetime64[M]')).tolist()
+    if period == 'quarterly':
+        return [f'{1970 + key // 4:04d}-Q{key % 4 + 1}' for key in keys.tolist()]
+    return [f'{1970 + key:04d}' for key in keys.tolist()]
+
+def nullable(values):
+    """List of an array's values with NaN as None"""
+    return [None if value != value else value for value in values.tolist()]
+
+def window_metrics(spending):
+    """Running total, trailing averages and year-over-year change of a gapless monthly spending array"""
+    metrics = {'cumulative': np.cumsum(spending)}
+    for window in ROLLING_WINDOWS:
+        # Undefined until the window is full
+        rolling = np.full(len(spending), np.nan)
+        if len(spending) >= window:
+            rolling[window - 1:] = np.lib.stride_tricks.sliding_window_view(spending, window).mean(axis=1)
+        metrics[f'rolling{window}'] = rolling
+    previous = np.full(len(spending), np.nan)
+    previous[12:] = spending[:-12]
+    metrics['yoyChange'] = spending - previous
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics['yoyPercent'] = np.where(previous > 0, metrics['yoyChange'] / previous * 100, np.nan)
+    return metrics
+
+class DailyCube:
+    """Spending, items and orders per day for each channel, aligned on one ascending axis of days.
+
+    Series at any granularity are sums over consecutive days, so a request
+    is two binary searches for the date range and one reduceat per measure.
+    """
+
+    def __init__(self, days, channels):
+        # channels: channel -> {'spending', 'items', 'orders'} arrays parallel to days
+        self.days = days
+        self.channels = channels
+        self.spending = sum(channel['spending'] for channel in channels.values())
+        self.orders = sum(channel['orders'] for channel in channels.values())
+        # (months, spending, orders, window metrics), computed on first use
+        self._monthly = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Cube from daily_rollup rows: (day, then spending, items, orders per channel in CUBE_CHANNELS)"""
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 1 + 3 * len(CUBE_CHANNELS))
+        channels = {}
+        for index, channel in enumerate(CUBE_CHANNELS):
+            spending, items, orders = columns[:, 1 + 3 * index:4 + 3 * index].T
+            channels[channel] = {'spending': spending, 'items': items.astype(np.int64),
+                                 'orders': orders.astype(np.int64)}
+        return cls(columns[:, 0].astype(np.int64), channels)
+
+    @classmethod
+    def from_channel_rows(cls, channel_rows):
+        """Cube from per-channel (day, spending, items, orders) rows, aligned here on the union of their days"""
+        tables = {channel: np.array(channel_rows.get(channel, []), dtype=np.float64).reshape(-1, 4)
+                  for channel in CUBE_CHANNELS}
+        days = np.unique(np.concatenate([rows[:, 0] for rows in tables.values()])).astype(np.int64)
+        channels = {}
+        for channel, rows in tables.items():
+            position = np.searchsorted(days, rows[:, 0].astype(np.int64))
+            measures = {}
+            for column, name in enumerate(('spending', 'items', 'orders'), 1):
+                values = np.zeros(len(days))
+                values[position] = rows[:, column]
+                measures[name] = values if name == 'spending' else values.astype(np.int64)
+            channels[channel] = measures
+        return cls(days, channels)
+
+    def series(self, period='monthly', start_day=None, end_day=None):
+        """{'labels', 'values', 'orderCounts'} of both channels per period, for days in [start_day, end_day]"""
+        low = 0 if start_day is None else np.searchsorted(self.days, start_day, 'left')
+        high = len(self.days) if end_day is None else np.searchsorted(self.days, end_day, 'right')
+        if low >= high:
+            return {'labels': [], 'values': [], 'orderCounts': []}
+        keys = bucket_keys(self.days[low:high], period)
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        return {
+            'labels': bucket_labels(keys[starts], period),
+            'values': np.add.reduceat(self.spending[low:high], starts).tolist(),
+            'orderCounts': np.add.reduceat(self.orders[low:high], starts).tolist(),
+        }
+
+    def trends(self, start_day=None, end_day=None):
+        """Monthly spending with window_metrics for the months of days in [start_day, end_day].
+
+        Every month from the first to the last purchase is present, and the
+        windows reach back before start_day, so they do not depend on the range.
+        """
+        if self._monthly is None:
+            self._monthly = self._monthly_metrics()
+        months, spending, orders, metrics = self._monthly
+        low = 0 if start_day is None else np.searchsorted(months, bucket_keys(np.int64(start_day), 'monthly'), 'left')
+        high = len(months) if end_day is None else np.searchsorted(months, bucket_keys(np.int64(end_day), 'monthly'), 'right')
+        window = slice(low, max(low, high))
+        trends = {
+            'labels': bucket_labels(months[window], 'monthly'),
+            'values': spending[window].tolist(),
+            'orderCounts': orders[window].tolist(),
+        }
+        for name, values in metrics.items():
+            trends[name] = nullable(values[window])
+        return trends
+
+    def _monthly_metrics(self):
+        """Gapless monthly spending and orders with their window_metrics"""
+        if not len(self.days):
+            empty = np.zeros(0)
+            return empty.astype(np.int64), empty, empty.astype(np.int64), window_metrics(empty)
+        keys = bucket_keys(self.days, 'monthly')
+        offsets = keys - keys[0]
+        months = np.arange(keys[0], keys[-1] + 1)
+        spending = np.bincount(offsets, weights=self.spending, minlength=len(months))
+        orders = np.bincount(offsets, weights=self.orders, minlength=len(months)).astype(np.int64)
+        return months, spending, orders, window_metrics(spending)
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { getSummary, SummaryStats } from './api';
+import { getDashboard, Dashboard } from './api';
 import SummaryCard from './components/SummaryCard';
 import SpendingOverTimeChart from './components/SpendingOverTimeChart';
 import ReturnStatsCard from './components/ReturnStatsCard';
@@ -8,23 +8,26 @@ import RetailBreakdown from './components/RetailBreakdown';
 import DigitalBreakdown from './components/DigitalBreakdown';
 
 function App() {
-  const [summary, setSummary] = useState<SummaryStats | null>(null);
+  const [dashboard, setDashboard] = useState<Dashboard | null>(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    const loadSummary = async () => {
+    // One request for every panel; a panel whose data is missing loads its own
+    const loadDashboard = async () => {
       try {
-        const data = await getSummary();
-        setSummary(data);
+        const data = await getDashboard();
+        setDashboard(data);
       } catch (error) {
-        console.error('Error loading summary:', error);
+        console.error('Error loading dashboard:', error);
       } finally {
         setLoading(false);
       }
     };
-    loadSummary();
+    loadDashboard();
   }, []);
 
+  const summary = dashboard?.summary;
+
   if (loading) {
     return (
       <div className="min-h-screen bg-gray-100 flex items-center justify-center">
@@ -76,26 +79,26 @@ function App() {
 
         <div className="grid grid-cols-1 lg:grid-cols-2 gap-6 mb-8">
           <div className="bg-white rounded-lg shadow p-6">
-            <SpendingOverTimeChart />
+            <SpendingOverTimeChart initialData={dashboard?.spendingOverTime} />
           </div>
           <div className="bg-white rounded-lg shadow p-6">
-            <DigitalVsRetailChart />
+            <DigitalVsRetailChart initialData={dashboard?.digitalVsRetail} />
           </div>
         </div>
 
         {/* Retail Breakdown Section */}
         <div className="mt-12 bg-gray-50 rounded-lg p-8 mb-8">
-          <RetailBreakdown />
+          <RetailBreakdown initialData={dashboard?.retailBreakdown} />
         </div>
 
         {/* Digital Breakdown Section */}
         <div className="mt-12 bg-gray-50 rounded-lg p-8 mb-8">
-          <DigitalBreakdown />
+          <DigitalBreakdown initialData={dashboard?.digitalBreakdown} />
         </div>
 
         {/* Returns Section */}
         <div className="bg-white rounded-lg shadow p-6">
-          <ReturnStatsCard />
+          <ReturnStatsCard initialData={dashboard?.returns} />
         </div>
       </main>
     </div>
@@ -22,6 +22,30 @@ const api = axios.create({
   baseURL: API_BASE_URL,
 });
 
+// Chart payloads are requested with shape=columnar: every list of records
+// arrives as one array per field, with amounts rounded to cents
+type Columns<T> = { [K in keyof T]: T[K][] };
+
+// Rebuild the records of a columnar list (an empty list arrives as [])
+const fromColumns = <T>(columns: Columns<T> | T[]): T[] => {
+  if (Array.isArray(columns)) {
+    return columns;
+  }
+  const fields = Object.keys(columns) as (keyof T)[];
+  const length = fields.length > 0 ? columns[fields[0]].length : 0;
+  const records: T[] = [];
+  for (let i = 0; i < length; i++) {
+    const record = {} as T;
+    fields.forEach(field => {
+      record[field] = columns[field][i];
+    });
+    records.push(record);
+  }
+  return records;
+};
+
+const COLUMNAR = { shape: 'columnar' };
+
 export interface SummaryStats {
   totalRetailOrders: number;
   totalRetailSpending: number;
@@ -39,6 +63,15 @@ export interface SpendingOverTime {
   orderCounts: number[];
 }
 
+// Monthly series with window metrics; null where a window is not yet full
+export interface SpendingTrends extends SpendingOverTime {
+  cumulative: number[];
+  rolling3: (number | null)[];
+  rolling12: (number | null)[];
+  yoyChange: (number | null)[];
+  yoyPercent: (number | null)[];
+}
+
 // Category and TopProduct are used in breakdown interfaces
 export interface Category {
   name: string;
@@ -73,8 +106,29 @@ export const getSummary = async (): Promise<SummaryStats> => {
   return response.data;
 };
 
-export const getSpendingOverTime = async (period: 'monthly' | 'yearly'): Promise<SpendingOverTime> => {
-  const response = await api.get('/stats/spending-over-time', { params: { period } });
+// Weeks are labelled with their Monday, quarters as '2023-Q2'
+export type Period = 'daily' | 'weekly' | 'monthly' | 'quarterly' | 'yearly';
+
+export const getSpendingOverTime = async (
+  period: Period,
+  startDate?: string,
+  endDate?: string
+): Promise<SpendingOverTime> => {
+  const params: any = { period, ...COLUMNAR };
+  if (startDate) params.start_date = startDate;
+  if (endDate) params.end_date = endDate;
+  const response = await api.get('/stats/spending-over-time', { params });
+  return response.data;
+};
+
+export const getSpendingTrends = async (
+  startDate?: string,
+  endDate?: string
+): Promise<SpendingTrends> => {
+  const params: any = { ...COLUMNAR };
+  if (startDate) params.start_date = startDate;
+  if (endDate) params.end_date = endDate;
+  const response = await api.get('/stats/spending-trends', { params });
   return response.data;
 };
 
@@ -95,26 +149,61 @@ export interface RetailBreakdown {
   paymentMethods: PaymentMethod[];
 }
 
+export interface Subscription {
+  name: string;
+  subscriptionId: string;
+  spending: number;
+  count: number;
+}
+
 export interface DigitalBreakdown {
   categories: Category[];
   topProducts: TopProduct[];
   spendingOverTime: SpendingOverTime;
-  subscriptions: Array<{
-    name: string;
-    subscriptionId: string;
-    spending: number;
-    count: number;
-  }>;
+  subscriptions: Subscription[];
 }
 
+const decodeRetailBreakdown = (data: any): RetailBreakdown => ({
+  ...data,
+  categories: fromColumns<Category>(data.categories),
+  topProducts: fromColumns<TopProduct>(data.topProducts),
+  paymentMethods: fromColumns<PaymentMethod>(data.paymentMethods),
+});
+
+const decodeDigitalBreakdown = (data: any): DigitalBreakdown => ({
+  ...data,
+  categories: fromColumns<Category>(data.categories),
+  topProducts: fromColumns<TopProduct>(data.topProducts),
+  subscriptions: fromColumns<Subscription>(data.subscriptions),
+});
+
 export const getRetailBreakdown = async (): Promise<RetailBreakdown> => {
-  const response = await api.get('/stats/retail-breakdown');
-  return response.data;
+  const response = await api.get('/stats/retail-breakdown', { params: COLUMNAR });
+  return decodeRetailBreakdown(response.data);
 };
 
 export const getDigitalBreakdown = async (): Promise<DigitalBreakdown> => {
-  const response = await api.get('/stats/digital-breakdown');
-  return response.data;
+  const response = await api.get('/stats/digital-breakdown', { params: COLUMNAR });
+  return decodeDigitalBreakdown(response.data);
+};
+
+export interface Dashboard {
+  summary: SummaryStats;
+  spendingOverTime: SpendingOverTime;
+  returns: ReturnStats;
+  digitalVsRetail: DigitalVsRetail;
+  retailBreakdown: RetailBreakdown;
+  digitalBreakdown: DigitalBreakdown;
+}
+
+// Every dashboard payload in one request, for the first paint
+export const getDashboard = async (period: Period = 'monthly'): Promise<Dashboard> => {
+  const response = await api.get('/stats/dashboard', { params: { period, ...COLUMNAR } });
+  return {
+    ...response.data,
+    retailBreakdown: decodeRetailBreakdown(response.data.retailBreakdown),
+    digitalBreakdown: decodeDigitalBreakdown(response.data.digitalBreakdown),
+  };
 };
 
 export interface Order {
@@ -135,6 +224,7 @@ export interface OrdersByCategory {
   page: number;
   limit: number;
   totalPages: number;
+  nextCursor: string | null;
 }
 
 export const getOrdersByCategory = async (
@@ -146,9 +236,11 @@ export const getOrdersByCategory = async (
   page: number = 1,
   limit: number = 100,
   sortBy: string = 'order_date',
-  sortOrder: 'asc' | 'desc' = 'desc'
+  sortOrder: 'asc' | 'desc' = 'desc',
+  cursor?: string
 ): Promise<OrdersByCategory> => {
   const params: any = { category, page, limit, sort_by: sortBy, sort_order: sortOrder };
+  if (cursor) params.cursor = cursor;
   if (minPrice !== undefined) params.min_price = minPrice;
   if (maxPrice !== undefined) params.max_price = maxPrice;
   if (startDate) params.start_date = startDate;
@@ -167,9 +259,11 @@ export const getDigitalOrdersByCategory = async (
   page: number = 1,
   limit: number = 100,
   sortBy: string = 'order_date',
-  sortOrder: 'asc' | 'desc' = 'desc'
+  sortOrder: 'asc' | 'desc' = 'desc',
+  cursor?: string
 ): Promise<OrdersByCategory> => {
   const params: any = { category, page, limit, sort_by: sortBy, sort_order: sortOrder };
+  if (cursor) params.cursor = cursor;
   if (minPrice !== undefined) params.min_price = minPrice;
   if (maxPrice !== undefined) params.max_price = maxPrice;
   if (startDate) params.start_date = startDate;
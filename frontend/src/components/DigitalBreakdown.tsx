@@ -5,12 +5,20 @@ import DigitalOrderTable from './DigitalOrderTable';
 
 const COLORS = ['#3B82F6', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6', '#EC4899', '#06B6D4', '#84CC16'];
 
-const DigitalBreakdownComponent: React.FC = () => {
-  const [data, setData] = useState<DigitalBreakdown | null>(null);
-  const [loading, setLoading] = useState(true);
+interface DigitalBreakdownComponentProps {
+  // Preloaded by App from /stats/dashboard; fetched here when absent
+  initialData?: DigitalBreakdown;
+}
+
+const DigitalBreakdownComponent: React.FC<DigitalBreakdownComponentProps> = ({ initialData }) => {
+  const [data, setData] = useState<DigitalBreakdown | null>(initialData ?? null);
+  const [loading, setLoading] = useState(!initialData);
   const [selectedCategory, setSelectedCategory] = useState<string | null>(null);
 
   useEffect(() => {
+    if (initialData) {
+      return;
+    }
     const loadData = async () => {
       setLoading(true);
       try {
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { getDigitalOrdersByCategory, Order } from '../api';
 
 interface DigitalOrderTableProps {
@@ -14,6 +14,8 @@ const DigitalOrderTable: React.FC<DigitalOrderTableProps> = ({ category, onClose
   const [loading, setLoading] = useState(true);
   const [page, setPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
+  // cursors[i] is the continuation token that loads page i + 1
+  const [cursors, setCursors] = useState<(string | undefined)[]>([undefined]);
   const [total, setTotal] = useState(0);
   const [sortBy, setSortBy] = useState<SortColumn>('order_date');
   const [sortOrder, setSortOrder] = useState<SortOrder>('desc');
@@ -24,7 +26,11 @@ const DigitalOrderTable: React.FC<DigitalOrderTableProps> = ({ category, onClose
   const [startDate, setStartDate] = useState<string>('');
   const [endDate, setEndDate] = useState<string>('');
 
-  const loadOrders = async () => {
+  // Only the latest request may update the table; older responses are dropped
+  const latestRequest = useRef(0);
+
+  const loadOrders = async (pageToLoad: number, cursor: string | undefined) => {
+    const request = ++latestRequest.current;
     setLoading(true);
     try {
       const result = await getDigitalOrdersByCategory(
@@ -33,29 +39,37 @@ const DigitalOrderTable: React.FC<DigitalOrderTableProps> = ({ category, onClose
         maxPrice ? parseFloat(maxPrice) : undefined,
         startDate || undefined,
         endDate || undefined,
-        page,
+        pageToLoad,
         100,
         sortBy,
-        sortOrder
+        sortOrder,
+        cursor
       );
+      if (request !== latestRequest.current) return;
       setOrders(result.orders);
+      setCursors(prev => [...prev.slice(0, pageToLoad), result.nextCursor ?? undefined]);
       setTotalPages(result.totalPages);
       setTotal(result.total);
     } catch (error) {
       console.error('Error loading digital orders:', error);
     } finally {
-      setLoading(false);
+      if (request === latestRequest.current) setLoading(false);
     }
   };
 
   useEffect(() => {
-    loadOrders();
+    loadOrders(page, cursors[page - 1]);
   }, [category, page, sortBy, sortOrder]);
 
   useEffect(() => {
-    // Reset to page 1 when filters change
-    setPage(1);
-    loadOrders();
+    // Reset to page 1 when filters change; the old filters' cursors do not apply.
+    // Off page 1, the page effect loads page 1 once the reset has rendered.
+    setCursors([undefined]);
+    if (page === 1) {
+      loadOrders(1, undefined);
+    } else {
+      setPage(1);
+    }
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [minPrice, maxPrice, startDate, endDate]);
 
@@ -67,6 +81,7 @@ const DigitalOrderTable: React.FC<DigitalOrderTableProps> = ({ category, onClose
       setSortOrder('desc');
     }
     setPage(1);
+    setCursors([undefined]);
   };
 
   const handleFilter = () => {
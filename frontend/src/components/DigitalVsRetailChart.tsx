@@ -2,12 +2,20 @@ import React, { useState, useEffect } from 'react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import { getDigitalVsRetail, DigitalVsRetail } from '../api';
 
-const DigitalVsRetailChart: React.FC = () => {
-  const [data, setData] = useState<DigitalVsRetail | null>(null);
-  const [loading, setLoading] = useState(true);
+interface DigitalVsRetailChartProps {
+  // Preloaded by App from /stats/dashboard; fetched here when absent
+  initialData?: DigitalVsRetail;
+}
+
+const DigitalVsRetailChart: React.FC<DigitalVsRetailChartProps> = ({ initialData }) => {
+  const [data, setData] = useState<DigitalVsRetail | null>(initialData ?? null);
+  const [loading, setLoading] = useState(!initialData);
   const [view, setView] = useState<'orders' | 'spending'>('spending');
 
   useEffect(() => {
+    if (initialData) {
+      return;
+    }
     const loadData = async () => {
       setLoading(true);
       try {
@@ -5,12 +5,20 @@ import CategoryOrderTable from './CategoryOrderTable';
 
 const COLORS = ['#3B82F6', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6', '#EC4899', '#06B6D4', '#84CC16'];
 
-const RetailBreakdownComponent: React.FC = () => {
-  const [data, setData] = useState<RetailBreakdown | null>(null);
-  const [loading, setLoading] = useState(true);
+interface RetailBreakdownComponentProps {
+  // Preloaded by App from /stats/dashboard; fetched here when absent
+  initialData?: RetailBreakdown;
+}
+
+const RetailBreakdownComponent: React.FC<RetailBreakdownComponentProps> = ({ initialData }) => {
+  const [data, setData] = useState<RetailBreakdown | null>(initialData ?? null);
+  const [loading, setLoading] = useState(!initialData);
   const [selectedCategory, setSelectedCategory] = useState<string | null>(null);
 
   useEffect(() => {
+    if (initialData) {
+      return;
+    }
     const loadData = async () => {
       setLoading(true);
       try {
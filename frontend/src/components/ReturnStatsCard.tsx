@@ -2,11 +2,19 @@ import React, { useState, useEffect } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import { getReturns, ReturnStats } from '../api';
 
-const ReturnStatsCard: React.FC = () => {
-  const [stats, setStats] = useState<ReturnStats | null>(null);
-  const [loading, setLoading] = useState(true);
+interface ReturnStatsCardProps {
+  // Preloaded by App from /stats/dashboard; fetched here when absent
+  initialData?: ReturnStats;
+}
+
+const ReturnStatsCard: React.FC<ReturnStatsCardProps> = ({ initialData }) => {
+  const [stats, setStats] = useState<ReturnStats | null>(initialData ?? null);
+  const [loading, setLoading] = useState(!initialData);
 
   useEffect(() => {
+    if (initialData) {
+      return;
+    }
     const loadData = async () => {
       setLoading(true);
       try {
@@ -1,17 +1,37 @@
 import React, { useState, useEffect } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
-import { getSpendingOverTime, SpendingOverTime } from '../api';
+import { getSpendingOverTime, getSpendingTrends, Period, SpendingOverTime, SpendingTrends } from '../api';
 
-const SpendingOverTimeChart: React.FC = () => {
-  const [data, setData] = useState<SpendingOverTime | null>(null);
-  const [period, setPeriod] = useState<'monthly' | 'yearly'>('monthly');
-  const [loading, setLoading] = useState(true);
+const PERIODS: { value: Period; label: string }[] = [
+  { value: 'daily', label: 'Daily' },
+  { value: 'weekly', label: 'Weekly' },
+  { value: 'monthly', label: 'Monthly' },
+  { value: 'quarterly', label: 'Quarterly' },
+  { value: 'yearly', label: 'Yearly' },
+];
+
+interface SpendingOverTimeChartProps {
+  // Preloaded by App from /stats/dashboard; fetched here when absent
+  initialData?: SpendingOverTime;
+}
+
+const SpendingOverTimeChart: React.FC<SpendingOverTimeChartProps> = ({ initialData }) => {
+  const [data, setData] = useState<SpendingOverTime | null>(initialData ?? null);
+  const [period, setPeriod] = useState<Period>('monthly');
+  const [startDate, setStartDate] = useState('');
+  const [endDate, setEndDate] = useState('');
+  const [trends, setTrends] = useState<SpendingTrends | null>(null);
+  const [loading, setLoading] = useState(!initialData);
 
   useEffect(() => {
+    // The preloaded series is monthly over the whole history
+    if (initialData && period === 'monthly' && !startDate && !endDate && data === initialData) {
+      return;
+    }
     const loadData = async () => {
       setLoading(true);
       try {
-        const result = await getSpendingOverTime(period);
+        const result = await getSpendingOverTime(period, startDate || undefined, endDate || undefined);
         setData(result);
       } catch (error) {
         console.error('Error loading spending over time:', error);
@@ -20,7 +40,18 @@ const SpendingOverTimeChart: React.FC = () => {
       }
     };
     loadData();
-  }, [period]);
+  }, [period, startDate, endDate]);
+
+  useEffect(() => {
+    // Rolling averages and year-over-year change are monthly only
+    if (period !== 'monthly') {
+      setTrends(null);
+      return;
+    }
+    getSpendingTrends(startDate || undefined, endDate || undefined)
+      .then(setTrends)
+      .catch((error) => console.error('Error loading spending trends:', error));
+  }, [period, startDate, endDate]);
 
   if (loading) {
     return <div className="text-center py-8 text-gray-500">Loading...</div>;
@@ -30,37 +61,58 @@ const SpendingOverTimeChart: React.FC = () => {
     return <div className="text-center py-8 text-gray-500">No data available</div>;
   }
 
-  const chartData = data.labels.map((label, index) => ({
-    period: label,
-    spending: data.values[index],
-    orders: data.orderCounts[index],
-  }));
+  const trendIndex = new Map((trends?.labels ?? []).map((label, index) => [label, index]));
+  const chartData = data.labels.map((label, index) => {
+    const trend = trendIndex.get(label);
+    return {
+      period: label,
+      spending: data.values[index],
+      orders: data.orderCounts[index],
+      rolling3: trend === undefined ? null : trends!.rolling3[trend],
+      rolling12: trend === undefined ? null : trends!.rolling12[trend],
+    };
+  });
+  const latestYoy = trends && trends.yoyPercent.length > 0 ? trends.yoyPercent[trends.yoyPercent.length - 1] : null;
 
   return (
     <div>
       <div className="flex justify-between items-center mb-4">
-        <h2 className="text-xl font-semibold text-gray-900">Spending Over Time</h2>
-        <div className="flex gap-2">
-          <button
-            onClick={() => setPeriod('monthly')}
-            className={`px-4 py-2 rounded text-sm font-medium ${
-              period === 'monthly'
-                ? 'bg-blue-600 text-white'
-                : 'bg-gray-200 text-gray-700 hover:bg-gray-300'
-            }`}
-          >
-            Monthly
-          </button>
-          <button
-            onClick={() => setPeriod('yearly')}
-            className={`px-4 py-2 rounded text-sm font-medium ${
-              period === 'yearly'
-                ? 'bg-blue-600 text-white'
-                : 'bg-gray-200 text-gray-700 hover:bg-gray-300'
-            }`}
-          >
-            Yearly
-          </button>
+        <div>
+          <h2 className="text-xl font-semibold text-gray-900">Spending Over Time</h2>
+          {latestYoy !== null && (
+            <p className={`text-sm ${latestYoy >= 0 ? 'text-red-600' : 'text-green-600'}`}>
+              {latestYoy >= 0 ? '+' : ''}{latestYoy.toFixed(1)}% vs. same month last year ({trends!.labels[trends!.labels.length - 1]})
+            </p>
+          )}
+        </div>
+        <div className="flex gap-2 items-center">
+          <input
+            type="date"
+            value={startDate}
+            onChange={(e) => setStartDate(e.target.value)}
+            aria-label="Start date"
+            className="px-2 py-1 border border-gray-300 rounded-md text-sm"
+          />
+          <input
+            type="date"
+            value={endDate}
+            onChange={(e) => setEndDate(e.target.value)}
+            aria-label="End date"
+            className="px-2 py-1 border border-gray-300 rounded-md text-sm"
+          />
+          {PERIODS.map(({ value, label }) => (
+            <button
+              key={value}
+              onClick={() => setPeriod(value)}
+              className={`px-4 py-2 rounded text-sm font-medium ${
+                period === value
+                  ? 'bg-blue-600 text-white'
+                  : 'bg-gray-200 text-gray-700 hover:bg-gray-300'
+              }`}
+            >
+              {label}
+            </button>
+          ))}
         </div>
       </div>
       <ResponsiveContainer width="100%" height={300}>
@@ -89,6 +141,28 @@ const SpendingOverTimeChart: React.FC = () => {
             name="Spending"
             dot={{ r: 3 }}
           />
+          {trends && (
+            <Line
+              type="monotone"
+              dataKey="rolling3"
+              stroke="#F59E0B"
+              strokeDasharray="5 5"
+              dot={false}
+              name="3-month average"
+              connectNulls
+            />
+          )}
+          {trends && (
+            <Line
+              type="monotone"
+              dataKey="rolling12"
+              stroke="#10B981"
+              strokeDasharray="5 5"
+              dot={false}
+              name="12-month average"
+              connectNulls
+            />
+          )}
         </LineChart>
       </ResponsiveContainer>
     </div>